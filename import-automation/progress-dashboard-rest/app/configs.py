@@ -16,7 +16,23 @@
 Configurations for the dashboard API.
 """
 
+import os
+
 # ID of the Google Cloud project that enables Datastore
 PROJECT_ID = 'datcom-data'
 # Google Cloud Datastore namespace in which import attempts are stored
 DASHBOARD_NAMESPACE = 'import-progress-dashboard'
+# Number of seconds entities read from Datastore are cached for
+CACHE_TTL_SECONDS = float(os.environ.get('DASHBOARD_CACHE_TTL_SECONDS', 10))
+# Maximum number of entities cached by each worker process
+CACHE_MAX_ENTRIES = int(os.environ.get('DASHBOARD_CACHE_MAX_ENTRIES', 10000))
+# URL of a Redis server to cache entities in, e.g. 'redis://localhost:6379/0',
+# instead of in each worker process
+CACHE_REDIS_URL = os.environ.get('DASHBOARD_CACHE_REDIS_URL')
+# Where entities are stored: 'datastore' for Google Cloud Datastore, or the
+# emulator if DATASTORE_EMULATOR_HOST is set, or 'memory' to keep them in the
+# memory of each process, e.g. for tests and local runs
+DATASTORE_BACKEND = os.environ.get('DASHBOARD_DATASTORE_BACKEND', 'datastore')
+# Maximum number of requests tailing logs each worker process serves at once.
+# Each holds one of the DASHBOARD_THREADS threads of the worker until it ends.
+MAX_TAILS = int(os.environ.get('DASHBOARD_MAX_TAILS', 4))
@@ -15,7 +15,8 @@
 """
 Entry point of the API.
 When deployed on App Engine, gunicorn will serve the FLASK_APP variable,
-which is a Flask object.
+which is a Flask object, with threaded workers configured by
+gunicorn.conf.py.
 """
 
 import os
@@ -23,7 +24,9 @@ import os
 import flask
 import flask_restful
 
-from app.resource import import_attempt, import_log
+from app import metrics
+from app.resource import cache_stats, import_attempt, import_log
+from app.resource import import_stats, system_run
 from app import utils
 
 
@@ -35,7 +38,10 @@ def create_app(logging=True):
     """
     if logging:
         utils.setup_logging()
-    return flask.Flask(__name__)
+    app = flask.Flask(__name__)
+    app.teardown_appcontext(utils.release_datastore_client)
+    metrics.init_app(app)
+    return app
 
 
 def create_api(app):
@@ -47,6 +53,18 @@ def create_api(app):
                      '/imports')
     api.add_resource(import_log.ImportLog,
                      '/import/<string:attempt_id>/logs')
+    api.add_resource(import_log.ImportLogBatch,
+                     '/import/<string:attempt_id>/logs/batch')
+    api.add_resource(import_log.ImportLogTail,
+                     '/import/<string:attempt_id>/logs/tail')
+    api.add_resource(system_run.SystemRunByID,
+                     '/system_runs/<string:run_id>')
+    api.add_resource(system_run.SystemRunImportAttempts,
+                     '/system_runs/<string:run_id>/import_attempts')
+    api.add_resource(import_stats.SystemRunStats, '/stats/system_runs')
+    api.add_resource(import_stats.ImportStats, '/stats/imports',
+                     '/stats/imports/<string:import_name>')
+    api.add_resource(cache_stats.CacheStats, '/metrics/cache')
     return api
 
 
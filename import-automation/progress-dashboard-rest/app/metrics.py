@@ -0,0 +1,337 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Metrics of the requests served by a worker process and of the Datastore
+calls they make, exposed in the Prometheus text format at '/metrics'.
+
+The metrics are kept in memory by each worker process. Each worker reports
+its own metrics, which Prometheus sums across the instances it scrapes.
+
+Recorded metrics:
+    dashboard_request_duration_seconds: Latency of the requests by endpoint,
+        method, and status, until the response starts.
+    dashboard_request_size_bytes: Size of the request bodies by endpoint.
+    dashboard_response_size_bytes: Size of the response bodies by endpoint,
+        except for streamed responses.
+    dashboard_datastore_rpcs_per_request: Number of Datastore calls made by
+        a request by endpoint. Many calls for one request is the sign of an
+        N+1 pattern.
+    dashboard_datastore_rpc_duration_seconds: Latency of the Datastore calls
+        by method.
+    dashboard_transaction_conflicts_total: Number of commits to Datastore
+        aborted by a conflict with another transaction, by endpoint.
+    dashboard_transaction_retries_total: Number of transactions retried
+        after such a conflict by app.utils.run_in_transaction, by endpoint.
+        Conflicts not retried fail the request.
+    dashboard_cache_*: Statistics of the cache, see app.service.cache.
+"""
+
+import bisect
+import collections
+import threading
+import time
+
+import flask
+from google.api_core import exceptions
+from google.cloud import datastore
+
+from app.service import cache
+
+# Upper bounds of the buckets of the latency histograms in seconds.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Upper bounds of the buckets of the size histograms in bytes.
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+# Upper bounds of the buckets of the histogram of Datastore calls per request.
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Methods of the Datastore API, each a remote call.
+_RPC_METHODS = frozenset([
+    'lookup', 'run_query', 'run_aggregation_query', 'begin_transaction',
+    'commit', 'rollback', 'allocate_ids', 'reserve_ids'
+])
+
+PROMETHEUS_MIMETYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_labels(names, values):
+    """Returns the labels of a sample in the Prometheus text format."""
+    if not names:
+        return ''
+    labels = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"')
+        labels.append('{}="{}"'.format(name, value))
+    return '{' + ','.join(labels) + '}'
+
+
+class Counter:
+    """Counter of events by a set of labels.
+
+    Attributes:
+        name: Name of the metric as a string.
+        description: Description of the metric as a string.
+        label_names: Names of the labels of the metric as a tuple.
+    """
+    def __init__(self, name, description, label_names=()):
+        """Constructs a Counter. See Counter."""
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values = collections.defaultdict(float)
+
+    def inc(self, *label_values, amount=1):
+        """Adds amount to the counter of the label values."""
+        with self._lock:
+            self._values[label_values] += amount
+
+    def value(self, *label_values):
+        """Returns the counter of the label values."""
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+    def render(self):
+        """Returns the metric in the Prometheus text format as a list of
+        lines."""
+        lines = [
+            '# HELP {} {}'.format(self.name, self.description),
+            '# TYPE {} counter'.format(self.name)
+        ]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append('{}{} {}'.format(
+                    self.name, _format_labels(self.label_names, label_values),
+                    value))
+        return lines
+
+
+class Histogram:
+    """Histogram of observations by a set of labels.
+
+    Attributes:
+        name: Name of the metric as a string.
+        description: Description of the metric as a string.
+        buckets: Upper bounds of the buckets in increasing order as a tuple.
+        label_names: Names of the labels of the metric as a tuple.
+    """
+    def __init__(self, name, description, buckets, label_names=()):
+        """Constructs a Histogram. See Histogram."""
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        # Maps label values to [bucket counts, sum, count]. The last bucket
+        # counts the observations above all the upper bounds.
+        self._values = {}
+
+    def observe(self, value, *label_values):
+        """Records an observation of value for the label values."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = [[0] * (len(self.buckets) + 1), 0, 0]
+                self._values[label_values] = entry
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, *label_values):
+        """Returns the number of observations for the label values."""
+        with self._lock:
+            entry = self._values.get(label_values)
+            return entry[2] if entry else 0
+
+    def render(self):
+        """Returns the metric in the Prometheus text format as a list of
+        lines."""
+        lines = [
+            '# HELP {} {}'.format(self.name, self.description),
+            '# TYPE {} histogram'.format(self.name)
+        ]
+        label_names = self.label_names + ('le',)
+        with self._lock:
+            for label_values, entry in sorted(self._values.items()):
+                counts, total, count = entry
+                cumulative = 0
+                bounds = self.buckets + ('+Inf',)
+                for bound, bucket_count in zip(bounds, counts):
+                    cumulative += bucket_count
+                    lines.append('{}_bucket{} {}'.format(
+                        self.name,
+                        _format_labels(label_names, label_values + (bound,)),
+                        cumulative))
+                labels = _format_labels(self.label_names, label_values)
+                lines.append('{}_sum{} {}'.format(self.name, labels, total))
+                lines.append('{}_count{} {}'.format(self.name, labels, count))
+        return lines
+
+
+REQUEST_DURATION = Histogram('dashboard_request_duration_seconds',
+                             'Latency of the requests until the response '
+                             'starts.', LATENCY_BUCKETS,
+                             ('endpoint', 'method', 'status'))
+REQUEST_SIZE = Histogram('dashboard_request_size_bytes',
+                         'Size of the request bodies.', SIZE_BUCKETS,
+                         ('endpoint',))
+RESPONSE_SIZE = Histogram('dashboard_response_size_bytes',
+                          'Size of the response bodies, except streamed '
+                          'ones.', SIZE_BUCKETS, ('endpoint',))
+RPCS_PER_REQUEST = Histogram('dashboard_datastore_rpcs_per_request',
+                             'Number of Datastore calls made by a request.',
+                             COUNT_BUCKETS, ('endpoint',))
+RPC_DURATION = Histogram('dashboard_datastore_rpc_duration_seconds',
+                         'Latency of the Datastore calls.', LATENCY_BUCKETS,
+                         ('method',))
+TRANSACTION_CONFLICTS = Counter(
+    'dashboard_transaction_conflicts_total',
+    'Number of commits aborted by a conflict with another transaction.',
+    ('endpoint',))
+TRANSACTION_RETRIES = Counter(
+    'dashboard_transaction_retries_total',
+    'Number of transactions retried after a conflict with another '
+    'transaction.', ('endpoint',))
+
+_METRICS = (REQUEST_DURATION, REQUEST_SIZE, RESPONSE_SIZE, RPCS_PER_REQUEST,
+            RPC_DURATION, TRANSACTION_CONFLICTS, TRANSACTION_RETRIES)
+
+
+def _endpoint():
+    """Returns the URL rule matched by the current request, e.g.
+    '/import/<string:attempt_id>', or None outside of a request. The rule
+    rather than the path is used, so that there is one series per
+    endpoint."""
+    if not flask.has_request_context():
+        return None
+    rule = flask.request.url_rule
+    return rule.rule if rule else 'unmatched'
+
+
+def record_rpc(method, seconds, exception=None):
+    """Records a Datastore call.
+
+    Args:
+        method: Name of the method of the Datastore API called, e.g.
+            'lookup'.
+        seconds: Duration of the call as a float.
+        exception: Exception raised by the call, if any.
+    """
+    RPC_DURATION.observe(seconds, method)
+    if flask.has_app_context():
+        flask.g.metrics_rpcs = flask.g.get('metrics_rpcs', 0) + 1
+    if method == 'commit' and isinstance(
+            exception, (exceptions.Aborted, exceptions.Conflict)):
+        TRANSACTION_CONFLICTS.inc(_endpoint() or 'none')
+
+
+def record_transaction_retry():
+    """Records a transaction retried after a conflict."""
+    TRANSACTION_RETRIES.inc(_endpoint() or 'none')
+
+
+class _InstrumentedAPI:
+    """Proxy of the Datastore API of a client that records its calls."""
+    def __init__(self, api):
+        self._api = api
+
+    def __getattr__(self, name):
+        attr = getattr(self._api, name)
+        if name not in _RPC_METHODS:
+            return attr
+
+        def call(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = attr(*args, **kwargs)
+            except Exception as exception:
+                record_rpc(name, time.perf_counter() - start, exception)
+                raise
+            record_rpc(name, time.perf_counter() - start)
+            return result
+
+        return call
+
+
+class InstrumentedClient(datastore.Client):
+    """datastore Client that records the Datastore calls it makes, see
+    record_rpc.
+
+    The calls are intercepted by wrapping the private _datastore_api of the
+    client, which google-cloud-datastore 2.x creates on first use, so
+    requirements.txt pins that major version.
+    """
+    @property
+    def _datastore_api(self):
+        api = super()._datastore_api
+        if not isinstance(api, _InstrumentedAPI):
+            api = _InstrumentedAPI(api)
+            self._datastore_api_internal = api
+        return api
+
+
+def _start_request():
+    """Records the start of a request."""
+    flask.g.metrics_start = time.perf_counter()
+    flask.g.metrics_rpcs = 0
+
+
+def _end_request(response):
+    """Records the latency and sizes of a request and the number of
+    Datastore calls it made."""
+    start = flask.g.get('metrics_start')
+    if start is None:
+        return response
+    endpoint = _endpoint()
+    REQUEST_DURATION.observe(time.perf_counter() - start, endpoint,
+                             flask.request.method, response.status_code)
+    REQUEST_SIZE.observe(flask.request.content_length or 0, endpoint)
+    if not response.is_streamed:
+        RESPONSE_SIZE.observe(response.calculate_content_length() or 0,
+                              endpoint)
+    RPCS_PER_REQUEST.observe(flask.g.get('metrics_rpcs', 0), endpoint)
+    return response
+
+
+def render():
+    """Returns all the metrics in the Prometheus text format as a string."""
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    default_cache = cache.get_default_cache()
+    stats = default_cache.stats.to_dict(default_cache.size())
+    for name in ('hits', 'misses', 'evictions'):
+        lines.append('# TYPE dashboard_cache_{}_total counter'.format(name))
+        lines.append('dashboard_cache_{}_total {}'.format(name, stats[name]))
+    lines.append('# TYPE dashboard_cache_size gauge')
+    lines.append('dashboard_cache_size {}'.format(stats['size']))
+    return '\n'.join(lines) + '\n'
+
+
+def _serve_metrics():
+    """Serves the metrics of this worker process."""
+    return flask.Response(render(), content_type=PROMETHEUS_MIMETYPE)
+
+
+def init_app(app):
+    """Records the metrics of the requests served by a Flask app and serves
+    them at '/metrics'.
+
+    Args:
+        app: The Flask app.
+    """
+    app.before_request(_start_request)
+    app.after_request(_end_request)
+    app.add_url_rule('/metrics', 'metrics', _serve_metrics)
@@ -0,0 +1,41 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Data model of a log of an import attempt.
+"""
+
+
+class ImportLogModel:
+    """Data model of a log of an import attempt.
+
+    The class variables below are the fields of a log.
+
+    attempt_id: ID of the import attempt the log belongs to.
+    sequence: Position of the log among the logs of the attempt, starting
+        at 1. Logs are read in the order of their sequence.
+    level: Level of the log, see import_log.LogLevel.
+    message: Message of the log.
+    time_logged: Time the log was logged in ISO 8601 format with timezone
+        UTC+0.
+    """
+    attempt_id = 'attempt_id'
+    sequence = 'sequence'
+    level = 'level'
+    message = 'message'
+    time_logged = 'time_logged'
+
+
+FIELDS = frozenset(name for name in vars(ImportLogModel)
+                   if not name.startswith('__'))
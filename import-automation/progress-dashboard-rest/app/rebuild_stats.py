@@ -0,0 +1,41 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Rebuilds the statistics served at '/stats/system_runs' and '/stats/imports'
+from the system runs and import attempts stored in Datastore, counting
+those saved before the statistics were recorded.
+To rebuild them, run "python3 -m app.rebuild_stats" in the
+progress-dashboard-rest directory with the environment of the app, while no
+runs or attempts are saved. See ImportStatsDatabase.rebuild.
+"""
+
+from app import utils
+from app.service import import_attempt_database
+from app.service import import_stats_database
+from app.service import system_run_database
+
+
+def main():
+    """Rebuilds the statistics and prints the number of counters."""
+    client = utils.create_datastore_client()
+    stats_database = import_stats_database.ImportStatsDatabase(client)
+    num_counters = stats_database.rebuild(
+        system_run_database.SystemRunDatabase(client),
+        import_attempt_database.ImportAttemptDatabase(client))
+    print('Rebuilt {} counters'.format(num_counters))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Cache statistics resource associated with the endpoint '/metrics/cache'.
+"""
+
+import flask_restful
+
+from app.service import cache
+
+
+class CacheStats(flask_restful.Resource):
+    """API for monitoring the cache of the entities retrieved by ID,
+    associated with the endpoint '/metrics/cache'."""
+
+    def get(self):
+        """Retrieves the statistics of the cache of this worker process.
+
+        Returns:
+            A dict with the number of hits, misses, and evictions, the
+            hit_rate, and the size of the cache.
+        """
+        default_cache = cache.get_default_cache()
+        return default_cache.stats.to_dict(default_cache.size())
@@ -16,7 +16,13 @@
 Import attempt list resource associated with the endpoint '/import_attempts'.
 """
 
+import http
+
+from google.api_core import exceptions
+
+from app import utils
 from app.resource import import_attempt
+from app.service import base_database
 from app.service import system_run_database
 from app.service import validation
 from app.model import import_attempt_model
@@ -25,6 +31,67 @@ from app.model import system_run_model
 _ATTEMPT = import_attempt_model.ImportAttemptModel
 _RUN = system_run_model.SystemRunModel
 
+# Response header holding the cursor of the next page of a listing.
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+def get_page_args():
+    """Returns the pagination arguments of a listing request.
+
+    The arguments are read from the query string:
+        limit: Maximum number of entities per page, 100 by default and at
+            most 1000. Must be at least 1, see list_page.
+        cursor: Cursor of the page to return, from the NEXT_CURSOR_HEADER
+            header of the previous page. The first page if absent.
+        fields: Comma-separated names of the fields to return. All the
+            fields if absent.
+        keys_only: 'true' to return only the IDs of the entities.
+
+    Returns:
+        The arguments as a dict of keyword arguments of
+        BaseDatabase.filter_page.
+    """
+    fields = utils.get_query_arg('fields')
+    return {
+        'limit': utils.get_query_arg('limit', base_database.DEFAULT_PAGE_SIZE,
+                                     int),
+        'cursor': utils.get_query_arg('cursor'),
+        'projection': fields.split(',') if fields else None,
+        'keys_only': utils.get_query_arg('keys_only', '') == 'true'
+    }
+
+
+def list_page(database, kv_dict):
+    """Retrieves a page of the entities of a database that pass a filter.
+
+    Args:
+        database: BaseDatabase to retrieve entities from.
+        kv_dict: Key-value mappings used for filtering as a dict.
+
+    If the request asks for newline-delimited JSON, see
+    utils.wants_ndjson, all the entities from the page on are streamed
+    instead, one page of limit entities at a time.
+
+    Returns:
+        (list of entities, 200, headers) if successful, where headers holds
+        the cursor of the next page in NEXT_CURSOR_HEADER if there is one,
+        or a streamed response. Otherwise, (error message, error code),
+        e.g. BAD_REQUEST if limit is less than 1.
+    """
+    page_args = get_page_args()
+    if page_args['limit'] < 1:
+        return utils.LIMIT_ERROR, http.HTTPStatus.BAD_REQUEST
+    try:
+        if utils.wants_ndjson():
+            return utils.stream_ndjson(
+                database.iterate_pages(kv_dict, **page_args))
+        entities, next_cursor = database.filter_page(kv_dict, **page_args)
+    except exceptions.BadRequest as err:
+        return 'Invalid listing request: {}'.format(
+            err.message), http.HTTPStatus.BAD_REQUEST
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+    return entities, http.HTTPStatus.OK, headers
+
 
 class ImportAttemptList(import_attempt.ImportAttempt):
     """API for querying a list of import attempts based on some criteria
@@ -45,17 +112,25 @@ class ImportAttemptList(import_attempt.ImportAttempt):
             self.client)
 
     def get(self):
-        """Retrieves a list of import attempts that pass the filter defined by
-        the key-value mappings in the request body."""
+        """Retrieves a page of the import attempts that pass the filter
+        defined by the key-value mappings in the request body.
+
+        The page is defined by the query string, see get_page_args. The
+        cursor of the next page, if any, is returned in the
+        NEXT_CURSOR_HEADER header. With 'stream=ndjson' in the query string,
+        all the import attempts from the page on are streamed as
+        newline-delimited JSON instead, see list_page.
+        """
         args = import_attempt.ImportAttempt.parser.parse_args()
-        return self.database.filter(args)
+        return list_page(self.database, args)
 
     def post(self):
         """Creates a new import attempt with the fields provided in the
         request body.
 
         run_id must be present in the request body to link the import attempt
-        to a system run.
+        to a system run. The statistics of the import attempts are updated
+        in the same transaction.
 
         Returns:
             The created import attempt as a datastore Entity object with
@@ -76,7 +151,7 @@ class ImportAttemptList(import_attempt.ImportAttempt):
         args.pop(_ATTEMPT.logs, None)
         import_attempt.set_import_attempt_default_values(args)
 
-        with self.client.transaction():
+        with self.database.transaction():
             # The system run pointed to by this import attempt needs to
             # point back at the import attempt.
             run_id = args[_ATTEMPT.run_id]
@@ -13,20 +13,51 @@
 # limitations under the License.
 
 """
-Import log resource associated with the endpoint
-'/import/<string:attempt_id>/logs'.
+Import log resources associated with the endpoints
+'/import/<string:attempt_id>/logs',
+'/import/<string:attempt_id>/logs/batch', and
+'/import/<string:attempt_id>/logs/tail'.
 """
 
 from enum import Enum
 import http
+import json
+import threading
+import time
 
+import flask
 import flask_restful
 from flask_restful import reqparse
-from google.cloud import datastore
+from google.api_core import exceptions
 
+from app import configs
 from app import utils
+from app.model import import_attempt_model
+from app.model import import_log_model
 from app.resource import import_attempt
 from app.service import import_attempt_database
+from app.service import import_log_database
+
+_ATTEMPT = import_attempt_model.ImportAttemptModel
+_MODEL = import_log_model.ImportLogModel
+
+# Number of seconds between two checks for new logs while tailing.
+TAIL_POLL_INTERVAL = 1
+# Maximum number of seconds a tail request is held open.
+TAIL_TIMEOUT = 25
+# Error returned when the worker already serves configs.MAX_TAILS tails.
+TAILS_ERROR = 'Too many clients are tailing logs. Retry later.'
+# Number of seconds after which clients are asked to retry such tails.
+TAILS_RETRY_AFTER = 5
+# Media type of server-sent events.
+EVENT_STREAM_MIMETYPE = 'text/event-stream'
+
+# Error returned when logs cannot be appended because of too many concurrent
+# appends to the logs of the same attempt.
+CONFLICT_ERROR = ('Too many concurrent posts to the logs of the attempt. '
+                  'Retry later.')
+# Number of seconds after which clients are asked to retry such appends.
+CONFLICT_RETRY_AFTER = 1
 
 
 class LogLevel(Enum):
@@ -41,6 +72,34 @@ class LogLevel(Enum):
 
 LOG_LEVELS = set(level.value for level in LogLevel)
 
+# Tails served at once by this worker process, each holding one of its
+# threads and Datastore clients until it ends.
+_TAILS = threading.BoundedSemaphore(configs.MAX_TAILS)
+
+
+def migrate_embedded_logs(log_database, attempt_database, attempt):
+    """Moves the logs embedded in an import attempt saved before logs were
+    stored on their own, if it has any, so that they are read and numbered
+    like the others. See ImportLogDatabase.migrate_embedded_logs.
+
+    Args:
+        log_database: ImportLogDatabase storing the logs.
+        attempt_database: ImportAttemptDatabase storing the attempt.
+        attempt: The import attempt as a datastore Entity.
+    """
+    if attempt.get(_ATTEMPT.logs):
+        log_database.migrate_embedded_logs(attempt_database,
+                                           attempt[_ATTEMPT.attempt_id])
+
+
+def conflict_error():
+    """Returns (error message, error code, headers) for logs that could not
+    be appended because of too many concurrent appends to the logs of the
+    same attempt, asking the client to retry later."""
+    return (CONFLICT_ERROR, http.HTTPStatus.SERVICE_UNAVAILABLE, {
+        'Retry-After': str(CONFLICT_RETRY_AFTER)
+    })
+
 
 class ImportLog(flask_restful.Resource):
     """API for managing the logs of an attempt specified by its attempt_id
@@ -48,31 +107,55 @@ class ImportLog(flask_restful.Resource):
 
     Attributes:
         database: A database service for storing import attempts
+        log_database: A database service for storing the logs of import
+            attempts
     """
     parser = reqparse.RequestParser()
-    required_fields = [('level',), ('message',)]
-    optional_fields = [('time_logged',)]
-    utils.add_required_fields(parser, required_fields)
-    utils.add_optional_fields(parser, optional_fields)
+    required_fields = [(_MODEL.level,), (_MODEL.message,)]
+    optional_fields = [(_MODEL.time_logged,)]
+    utils.add_fields(parser, required_fields, required=True)
+    utils.add_fields(parser, optional_fields, required=False)
 
     def __init__(self):
         """Constructs an ImportLog."""
-        self.database = import_attempt_database.ImportAttemptDatabase()
+        client = utils.create_datastore_client()
+        self.database = import_attempt_database.ImportAttemptDatabase(client)
+        self.log_database = import_log_database.ImportLogDatabase(client)
 
     def get(self, attempt_id):
-        """Queries the logs of an attempt.
+        """Queries the logs of an attempt, one page at a time.
+
+        The page is defined by the 'since' and 'limit' query string
+        arguments. Only the logs whose sequence is greater than since, 0 by
+        default, are returned, at most limit of them. To read the next page,
+        set since to the sequence of the last log returned.
+
+        If the request asks for newline-delimited JSON, see
+        utils.wants_ndjson, all the logs after since are streamed instead,
+        one page of limit logs at a time.
 
         Args:
             attempt_id: ID string of the attempt
 
         Returns:
-            A list of logs of the attempt if successful. Otherwise,
-            (error message, error code).
+            A list of logs of the attempt in the order they were posted, or
+            a streamed response, if successful. Otherwise,
+            (error message, error code), e.g. BAD_REQUEST if limit is less
+            than 1.
         """
-        attempt = self.database.get_by_id(attempt_id)
+        attempt = self.database.get(attempt_id)
         if not attempt:
             return import_attempt.NOT_FOUND_ERROR, http.HTTPStatus.NOT_FOUND
-        return attempt.get('logs', [])
+        migrate_embedded_logs(self.log_database, self.database, attempt)
+        since = utils.get_query_arg('since', 0, int)
+        limit = utils.get_query_arg('limit', import_log_database.MAX_LIMIT,
+                                    int)
+        if limit < 1:
+            return utils.LIMIT_ERROR, http.HTTPStatus.BAD_REQUEST
+        if utils.wants_ndjson():
+            return utils.stream_ndjson(
+                self.log_database.iterate_pages(attempt_id, since, limit))
+        return self.log_database.list(attempt_id, since=since, limit=limit)
 
     def post(self, attempt_id):
         """Adds a new log to an existing attempt.
@@ -83,29 +166,248 @@ class ImportLog(flask_restful.Resource):
 
         level must be one of the allowed levels defined by LogLevel.
 
+        The log is stored on its own, so posting a log costs the same
+        however many logs the attempt already has. If too many logs are
+        posted to the attempt at once, some posts fail with
+        SERVICE_UNAVAILABLE and should be retried, see conflict_error.
+
         Args:
             attempt_id: ID string of the attempt
 
         Returns:
-            A list of logs of the attempt if successful. Otherwise,
-            (error message, error code).
+            The log with its attempt_id and sequence if successful.
+            Otherwise, (error message, error code).
         """
         args = ImportLog.parser.parse_args()
         if args['level'] not in LOG_LEVELS:
             return ('Log level {} is not allowed'.format(args['level']),
                     http.HTTPStatus.FORBIDDEN)
 
-        attempt = self.database.get_by_id(attempt_id)
+        attempt = self.database.get(attempt_id)
         if not attempt:
             return import_attempt.NOT_FOUND_ERROR, http.HTTPStatus.NOT_FOUND
-        if attempt_id != args.get('attempt_id', attempt_id):
+        if attempt_id != args.get(_MODEL.attempt_id, attempt_id):
             return import_attempt.ID_NOT_MATCH_ERROR, http.HTTPStatus.CONFLICT
+        migrate_embedded_logs(self.log_database, self.database, attempt)
+
+        args.setdefault(_MODEL.time_logged, utils.utctime())
+        try:
+            return self.log_database.append(attempt_id, [args])[0]
+        except exceptions.Conflict:
+            return conflict_error()
+
+
+def validate_logs(logs):
+    """Validates a list of logs posted in a batch.
+
+    Each log must be a JSON object with string fields level and message,
+    and an optional string field time_logged. level must be one of the
+    allowed levels defined by LogLevel.
 
-        args.setdefault('time_logged', utils.utctime())
-        logs = attempt.setdefault('logs', [])
-        log = datastore.Entity(exclude_from_indexes=('message',))
-        log.update(args)
-        logs.append(log)
-        self.database.save(attempt)
+    Args:
+        logs: Decoded JSON body of the request.
+
+    Returns:
+        None if the logs are valid. Otherwise, (error message, error code).
+    """
+    if not isinstance(logs, list) or not logs:
+        return ('Request body must be a non-empty JSON array of logs',
+                http.HTTPStatus.BAD_REQUEST)
+    if len(logs) > import_log_database.MAX_BATCH_SIZE:
+        return ('At most {} logs can be posted at once'.format(
+            import_log_database.MAX_BATCH_SIZE),
+                http.HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+    malformed = []
+    not_allowed = []
+    for index, log in enumerate(logs):
+        if (not isinstance(log, dict) or
+                not isinstance(log.get(_MODEL.level), str) or
+                not isinstance(log.get(_MODEL.message), str) or
+                not isinstance(log.get(_MODEL.time_logged, ''), str)):
+            malformed.append(index)
+        elif log[_MODEL.level] not in LOG_LEVELS:
+            not_allowed.append(index)
+    if malformed:
+        return ('Logs at indexes {} must have string fields level and '
+                'message'.format(malformed), http.HTTPStatus.BAD_REQUEST)
+    if not_allowed:
+        return ('Logs at indexes {} have a level that is not allowed'.format(
+            not_allowed), http.HTTPStatus.FORBIDDEN)
+    return None
+
+
+class ImportLogBatch(flask_restful.Resource):
+    """API for adding many logs to an attempt at once, associated with the
+    endpoint '/import/<string:attempt_id>/logs/batch'.
+
+    Attributes:
+        See ImportLog.
+    """
+
+    def __init__(self):
+        """Constructs an ImportLogBatch."""
+        client = utils.create_datastore_client()
+        self.database = import_attempt_database.ImportAttemptDatabase(client)
+        self.log_database = import_log_database.ImportLogDatabase(client)
+
+    def post(self, attempt_id):
+        """Adds a batch of new logs to an existing attempt.
+
+        The request body must be a JSON array of logs, each in the format
+        accepted by ImportLog.post. The logs are validated all together
+        first, and either all or none of them are added, in one write. Like
+        ImportLog.post, a batch that conflicts with too many concurrent
+        appends fails with SERVICE_UNAVAILABLE and should be retried.
+
+        Args:
+            attempt_id: ID string of the attempt
+
+        Returns:
+            The list of logs with their attempt_id and sequence if
+            successful. Otherwise, (error message, error code).
+        """
+        logs = flask.request.get_json(silent=True)
+        error = validate_logs(logs)
+        if error:
+            return error
+
+        attempt = self.database.get(attempt_id)
+        if not attempt:
+            return import_attempt.NOT_FOUND_ERROR, http.HTTPStatus.NOT_FOUND
+        migrate_embedded_logs(self.log_database, self.database, attempt)
+
+        now = utils.utctime()
+        logs = [{
+            _MODEL.level: log[_MODEL.level],
+            _MODEL.message: log[_MODEL.message],
+            _MODEL.time_logged: log.get(_MODEL.time_logged, now)
+        } for log in logs]
+        try:
+            return self.log_database.append(attempt_id, logs)
+        except exceptions.Conflict:
+            return conflict_error()
+
+
+def tail_logs(log_database, attempt_id, since, timeout, clock=time.monotonic,
+              sleep=time.sleep):
+    """Waits for the logs of an attempt posted after a sequence.
+
+    Every TAIL_POLL_INTERVAL seconds, only the log counter of the attempt is
+    looked up, and the logs are only queried when there are new ones.
+
+    Args:
+        log_database: ImportLogDatabase storing the logs.
+        attempt_id: ID string of the attempt.
+        since: Only logs whose sequence is greater than since are returned,
+            as an int.
+        timeout: Number of seconds to wait for new logs for.
+        clock: Function returning the current time in seconds.
+        sleep: Function sleeping for a number of seconds.
+
+    Yields:
+        Lists of new logs, in the order they were posted, as soon as there
+        are some, and an empty list after each check that found none, until
+        timeout seconds have passed.
+    """
+    deadline = clock() + timeout
+    while True:
+        if log_database.count(attempt_id) > since:
+            logs = log_database.list(attempt_id, since=since)
+            if logs:
+                since = logs[-1][_MODEL.sequence]
+                yield logs
+                continue
+        if clock() >= deadline:
+            return
+        yield []
+        sleep(TAIL_POLL_INTERVAL)
+
+
+def _to_events(pages):
+    """Formats pages of logs as server-sent events, one event per log whose
+    ID is its sequence, and a comment for each empty page to keep the
+    connection alive."""
+    for logs in pages:
+        if not logs:
+            yield ': keep-alive\n\n'
+        for log in logs:
+            yield 'id: {}\ndata: {}\n\n'.format(log[_MODEL.sequence],
+                                                 json.dumps(log))
+
+
+class ImportLogTail(flask_restful.Resource):
+    """API for following the logs of an attempt as they are posted,
+    associated with the endpoint '/import/<string:attempt_id>/logs/tail'.
+
+    Attributes:
+        See ImportLog.
+    """
+
+    def __init__(self):
+        """Constructs an ImportLogTail."""
+        client = utils.create_datastore_client()
+        self.database = import_attempt_database.ImportAttemptDatabase(client)
+        self.log_database = import_log_database.ImportLogDatabase(client)
+
+    def get(self, attempt_id):
+        """Returns the logs of an attempt posted after a sequence, waiting
+        for them if there are none yet.
+
+        The sequence is the 'since' query string argument, or the
+        Last-Event-ID header sent by browsers reconnecting to an event
+        stream, and 0 by default. The request is held open for at most the
+        'timeout' query string argument in seconds, capped at TAIL_TIMEOUT.
+
+        If the Accept header asks for EVENT_STREAM_MIMETYPE, the logs are
+        sent as server-sent events as they are posted until the timeout.
+        Otherwise, the request is a long poll: the first new logs are
+        returned as soon as there are some, or an empty list at the timeout.
+        Either way, the client continues from the sequence of the last log
+        it received.
+
+        Each tail holds a thread of the worker until it ends, so a worker
+        serves at most configs.MAX_TAILS tails at once. Past that, the
+        request fails with SERVICE_UNAVAILABLE and a Retry-After header.
+
+        Args:
+            attempt_id: ID string of the attempt
+
+        Returns:
+            A streamed response of events, or a list of logs, if successful.
+            Otherwise, (error message, error code[, headers]).
+        """
+        since = utils.get_query_arg(
+            'since', flask.request.headers.get('Last-Event-ID', 0, type=int),
+            int)
+        timeout = min(utils.get_query_arg('timeout', TAIL_TIMEOUT, float),
+                      TAIL_TIMEOUT)
+        attempt = self.database.get(attempt_id)
+        if not attempt:
+            return import_attempt.NOT_FOUND_ERROR, http.HTTPStatus.NOT_FOUND
+        migrate_embedded_logs(self.log_database, self.database, attempt)
 
-        return logs
+        if not _TAILS.acquire(blocking=False):
+            return (TAILS_ERROR, http.HTTPStatus.SERVICE_UNAVAILABLE, {
+                'Retry-After': str(TAILS_RETRY_AFTER)
+            })
+        release = True
+        try:
+            pages = tail_logs(self.log_database, attempt_id, since, timeout)
+            best = flask.request.accept_mimetypes.best_match(
+                ['application/json', EVENT_STREAM_MIMETYPE])
+            if best == EVENT_STREAM_MIMETYPE:
+                events = flask.stream_with_context(_to_events(pages))
+                response = flask.Response(events,
+                                          mimetype=EVENT_STREAM_MIMETYPE,
+                                          headers={'Cache-Control': 'no-cache'})
+                # The tail ends when the server closes the stream.
+                response.call_on_close(_TAILS.release)
+                release = False
+                return response
+            for logs in pages:
+                if logs:
+                    return logs
+            return []
+        finally:
+            if release:
+                _TAILS.release()
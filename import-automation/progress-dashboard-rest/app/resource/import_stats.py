@@ -0,0 +1,77 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Statistics resources associated with the endpoints '/stats/system_runs',
+'/stats/imports', and '/stats/imports/<string:import_name>'.
+"""
+
+import flask_restful
+
+from app import utils
+from app.service import import_stats_database
+
+
+class Stats(flask_restful.Resource):
+    """Base class for a statistics resource.
+
+    Attributes:
+        stats_database: ImportStatsDatabase object for querying statistics
+    """
+
+    def __init__(self):
+        """Constructs a Stats."""
+        self.stats_database = import_stats_database.ImportStatsDatabase(
+            utils.create_datastore_client())
+
+
+class SystemRunStats(Stats):
+    """API for the statistics of the system runs associated with the
+    endpoint '/stats/system_runs'.
+
+    See Stats.
+    """
+
+    def get(self):
+        """Retrieves the number of system runs with each status.
+
+        Returns:
+            A dict with the number of system runs with each status under
+            'statuses'.
+        """
+        return self.stats_database.get_system_run_stats()
+
+
+class ImportStats(Stats):
+    """API for the statistics of the import attempts associated with the
+    endpoints '/stats/imports' and '/stats/imports/<string:import_name>'.
+
+    See Stats.
+    """
+
+    def get(self, import_name=None):
+        """Retrieves the statistics of all the import attempts, or of the
+        attempts of an import.
+
+        Args:
+            import_name: Name of the import as a string, or None for all the
+                imports.
+
+        Returns:
+            A dict with the number of attempts with each status under
+            'statuses', including the failed ones, the number of completed
+            attempts under 'completed', and their average duration in
+            seconds under 'average_duration_seconds'.
+        """
+        return self.stats_database.get_import_stats(import_name)
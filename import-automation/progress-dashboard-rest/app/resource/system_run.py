@@ -13,8 +13,9 @@
 # limitations under the License.
 
 """
-System run resource associated with the endpoint
-'/system_runs/<string:run_id>'.
+System run resources associated with the endpoints
+'/system_runs/<string:run_id>' and
+'/system_runs/<string:run_id>/import_attempts'.
 """
 
 import enum
@@ -23,6 +24,7 @@ import flask_restful
 from flask_restful import reqparse
 
 from app.model import system_run_model
+from app.service import import_attempt_database
 from app.service import system_run_database
 from app.service import validation
 from app import utils
@@ -119,7 +121,8 @@ class SystemRunByID(SystemRun):
         """Modifies the value of a field of an existing system run.
 
         The run_id and import_attempts of an existing system run are
-        forbidden to be patched.
+        forbidden to be patched. The statistics of the system runs are
+        updated in the same transaction.
 
         Args:
             run_id: ID of the system run as a string
@@ -137,9 +140,47 @@ class SystemRunByID(SystemRun):
         if not valid:
             return err, code
 
-        with self.client.transaction():
+        with self.database.transaction():
             run = self.database.get(run_id)
             if not run:
                 return validation.get_not_found_error(_MODEL.run_id, run_id)
             run.update(args)
             return self.database.save(run)
+
+
+class SystemRunImportAttempts(SystemRun):
+    """API for retrieving the import attempts of a system run associated
+    with the endpoint '/system_runs/<string:run_id>/import_attempts'.
+
+    Attributes:
+        See SystemRun.
+        attempt_database: ImportAttemptDatabase object for querying import
+            attempts using the client
+    """
+    def __init__(self):
+        """Constructs a SystemRunImportAttempts."""
+        super().__init__()
+        self.attempt_database = (
+            import_attempt_database.ImportAttemptDatabase(self.client))
+
+    def get(self, run_id):
+        """Retrieves the import attempts of a system run by its run_id.
+
+        The import attempts are retrieved all at once with a batch lookup,
+        rather than one request per attempt_id.
+
+        Args:
+            run_id: ID of the system run as a string
+
+        Returns:
+            The list of import attempts of the system run, in the order of
+            its import_attempts, if successful. Otherwise,
+            (error message, error code), where the error message is a string
+            and the error code is an int.
+        """
+        run = self.database.get(run_id)
+        if not run:
+            return validation.get_not_found_error(_MODEL.run_id, run_id)
+        attempts = self.attempt_database.get_multi(
+            run.get(_MODEL.import_attempts, []))
+        return [attempt for attempt in attempts if attempt]
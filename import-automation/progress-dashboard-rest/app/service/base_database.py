@@ -20,6 +20,19 @@ Google Cloud Datastore for storage.
 from google.cloud import datastore
 
 from app import utils
+from app.service import cache as cache_lib
+
+# Number of entities returned by filter_page by default.
+DEFAULT_PAGE_SIZE = 100
+# Maximum number of entities returned by filter_page.
+MAX_PAGE_SIZE = 1000
+# Maximum number of keys Datastore looks up in one get_multi call.
+_MAX_GET_BATCH_SIZE = 1000
+# Maximum number of entities Datastore writes in one put_multi call.
+_MAX_PUT_BATCH_SIZE = 500
+# Default value of the cache argument of BaseDatabase, standing for the cache
+# shared by the process, so that None can stand for no cache.
+_DEFAULT_CACHE = object()
 
 
 class BaseDatabase:
@@ -32,11 +45,19 @@ class BaseDatabase:
     host environment. See
     https://cloud.google.com/docs/authentication/production#finding_credentials_automatically.
 
+    Entities retrieved by ID with get are cached, see app.service.cache.
+    Saving an entity invalidates its cache entry. Entities are never read
+    from or written to the cache within a transaction, so that transactions
+    see the state of Datastore.
+
     Attributes:
         kind: Kind of entities to store as a string
         client: datastore Client object to communicate with Datastore
+        cache: Cache of the entities retrieved by ID, or None to disable
+            caching
     """
-    def __init__(self, kind, client=None, id_field=None):
+    def __init__(self, kind, client=None, id_field=None,
+                 cache=_DEFAULT_CACHE):
         """Constructs an BaseDatabase.
 
         Args:
@@ -46,12 +67,18 @@ class BaseDatabase:
                 Every operation checks if id_field is not already a field in the
                 entity. If not, it will be added to the entity with the value of
                 the key name.
+            cache: Cache of the entities retrieved by ID, or None to disable
+                caching. Defaults to the cache shared by the process, see
+                cache.get_default_cache.
         """
         if not client:
             client = utils.create_datastore_client()
+        if cache is _DEFAULT_CACHE:
+            cache = cache_lib.get_default_cache()
         self.kind = kind
         self.client = client
         self.id_field = id_field
+        self.cache = cache
 
     def get(self, entity_id=None, make_new=False):
         """Retrieves an entity from Datastore given its entity_id.
@@ -74,7 +101,7 @@ class BaseDatabase:
         if not entity_id:
             entity = datastore.Entity(self._get_key(utils.get_id()))
         else:
-            entity = self.client.get(self._get_key(entity_id))
+            entity = self._get_cached(entity_id)
             if not entity:
                 if make_new:
                     entity = datastore.Entity(self._get_key(utils.get_id()))
@@ -83,6 +110,111 @@ class BaseDatabase:
         entity[self.id_field] = entity.key.name
         return entity
 
+    def get_multi(self, entity_ids):
+        """Retrieves entities from Datastore given their entity_ids, in as
+        few round trips as possible.
+
+        Entities found in the cache are not retrieved again. The others are
+        retrieved with a batch lookup per _MAX_GET_BATCH_SIZE entities.
+
+        Args:
+            entity_ids: List of IDs of the entities, each as a string.
+
+        Returns:
+            List of the entities in the order of entity_ids, each as a
+            datastore Entity, or None if the entity_id does not exist. An
+            entity_id repeated in entity_ids maps to the same Entity object.
+        """
+        use_cache = self._use_cache()
+        unique_ids = list(dict.fromkeys(entity_ids))
+        found = {}
+        if use_cache:
+            for entity_id in unique_ids:
+                entity = self.cache.get(self._cache_key(entity_id))
+                if entity is not None:
+                    found[entity_id] = entity
+        missing = [
+            self._get_key(entity_id)
+            for entity_id in unique_ids
+            if entity_id not in found
+        ]
+        for start in range(0, len(missing), _MAX_GET_BATCH_SIZE):
+            for entity in self.client.get_multi(
+                    missing[start:start + _MAX_GET_BATCH_SIZE]):
+                if use_cache:
+                    self.cache.set(self._cache_key(entity.key.name), entity)
+                found[entity.key.name] = entity
+        if self.id_field:
+            for entity in found.values():
+                entity[self.id_field] = entity.key.name
+        return [found.get(entity_id) for entity_id in entity_ids]
+
+    def _get_cached(self, entity_id):
+        """Retrieves an entity by its entity_id from the cache, or from
+        Datastore and caches it. Returns None if it does not exist."""
+        if not self._use_cache():
+            return self.client.get(self._get_key(entity_id))
+        cache_key = self._cache_key(entity_id)
+        entity = self.cache.get(cache_key)
+        if entity is None:
+            entity = self.client.get(self._get_key(entity_id))
+            if entity is not None:
+                self.cache.set(cache_key, entity)
+        return entity
+
+    def _use_cache(self):
+        """Returns whether the cache can be used, which it cannot within a
+        transaction."""
+        return (self.cache is not None and
+                self.client.current_transaction is None)
+
+    def _cache_key(self, entity_id):
+        """Returns the cache key of the entity with the entity_id."""
+        return '{}/{}'.format(self.kind, entity_id)
+
+    def invalidate(self, entity_id):
+        """Removes the entity with the entity_id from the cache.
+
+        Within a transaction started by transaction() or
+        utils.run_in_transaction, the entity is removed again once the
+        transaction is committed, so that a concurrent request cannot cache
+        the entity as it was before the transaction.
+
+        Args:
+            entity_id: ID of the entity as a string.
+        """
+        if self.cache is None:
+            return
+        cache_key = self._cache_key(entity_id)
+        self.cache.delete(cache_key)
+        if self.client.current_transaction:
+            utils.delete_after_commit(self.cache, cache_key)
+
+    def transaction(self):
+        """Runs the body of a with statement in a Datastore transaction.
+
+        The transaction is committed when the body completes and rolled
+        back if it raises. Once it is committed, the cache entries of the
+        entities saved in it, by this or any other database, are
+        invalidated. See utils.transaction.
+        """
+        return utils.transaction(self.client)
+
+    def _in_transaction(self, function):
+        """Calls function within the current transaction, if any, or within
+        a new transaction retried on conflicts, see
+        utils.run_in_transaction, and returns what it returns."""
+        if self.client.current_transaction is not None:
+            return function()
+        return utils.run_in_transaction(self.client, function)
+
+    def _get_stored(self, entity):
+        """Returns the entity as stored in Datastore, bypassing the cache,
+        or None if it is not stored yet."""
+        if not entity.key or not entity.key.name:
+            return None
+        return self.client.get(entity.key)
+
     def _get_key(self, entity_id):
         """Creates a datastore Key for an entity that has the entity_id.
 
@@ -110,10 +242,79 @@ class BaseDatabase:
         Returns:
             A list of entities that pass the filter each as a datastore Entity.
         """
+        return list(self._make_query(kv_dict).fetch())
+
+    def filter_page(self, kv_dict, limit=DEFAULT_PAGE_SIZE, cursor=None,
+                    projection=None, keys_only=False):
+        """Retrieves a page of the entities that pass a filter.
+
+        See filter. Unlike filter, the number of entities retrieved at once
+        is bounded, and only some of their fields can be retrieved.
+
+        Args:
+            kv_dict: Key-value mappings used for filtering as a dict.
+            limit: Maximum number of entities to retrieve as an int, capped
+                at MAX_PAGE_SIZE.
+            cursor: Cursor string returned with the previous page, or None
+                to retrieve the first page.
+            projection: List of names of the fields to retrieve, or None to
+                retrieve all the fields. The fields must be indexed and
+                cannot be lists.
+            keys_only: Whether to retrieve only the keys of the entities, as
+                a boolean. Takes precedence over projection.
+
+        Returns:
+            Tuple of the list of entities, each as a datastore Entity with
+            id_field set, and the cursor string of the next page, or None if
+            there is no next page.
+        """
+        query = self._make_query(kv_dict)
+        if keys_only:
+            query.keys_only()
+        elif projection:
+            query.projection = projection
+        iterator = query.fetch(limit=min(limit, MAX_PAGE_SIZE),
+                               start_cursor=cursor)
+        entities = list(next(iterator.pages, []))
+        if self.id_field:
+            for entity in entities:
+                entity[self.id_field] = entity.key.name
+        next_cursor = iterator.next_page_token
+        if isinstance(next_cursor, bytes):
+            next_cursor = next_cursor.decode('ascii')
+        return entities, next_cursor
+
+    def iterate_pages(self, kv_dict, limit=DEFAULT_PAGE_SIZE, cursor=None,
+                      projection=None, keys_only=False):
+        """Iterates over the pages of the entities that pass a filter.
+
+        See filter_page. Pages are retrieved one at a time as the iteration
+        proceeds, so only one page is held in memory at once.
+
+        Args:
+            See filter_page. limit is the number of entities per page.
+
+        Yields:
+            Lists of entities, each as a datastore Entity with id_field set.
+        """
+        while True:
+            entities, cursor = self.filter_page(kv_dict,
+                                                limit=limit,
+                                                cursor=cursor,
+                                                projection=projection,
+                                                keys_only=keys_only)
+            if entities:
+                yield entities
+            if not cursor or not entities:
+                return
+
+    def _make_query(self, kv_dict):
+        """Creates a query for the entities whose fields are equal to the
+        values in kv_dict."""
         query = self.client.query(kind=self.kind)
         for key, value in kv_dict.items():
             query.add_filter(key, '=', value)
-        return list(query.fetch())
+        return query
 
     def save(self, entity):
         """Saves the entity to Datastore.
@@ -133,4 +334,34 @@ class BaseDatabase:
         if self.id_field and self.id_field not in entity:
             entity[self.id_field] = entity.key.name
         self.client.put(entity)
+        self.invalidate(entity.key.name)
         return entity
+
+    def save_multi(self, entities):
+        """Saves entities to Datastore with a batch write per
+        _MAX_PUT_BATCH_SIZE entities.
+
+        Within a transaction, all the entities are written when it commits.
+
+        Args:
+            entities: List of entities to save to Datastore, each as a
+                datastore Entity with a complete key.
+
+        Returns:
+            The saved entities as a list.
+
+        Raises:
+            ValueError: Key of an entity is not set or is partial. No
+                entity is saved.
+        """
+        for entity in entities:
+            if not entity.key or not entity.key.name:
+                raise ValueError('Key of the entity is not set or is partial.')
+        for entity in entities:
+            if self.id_field and self.id_field not in entity:
+                entity[self.id_field] = entity.key.name
+        for start in range(0, len(entities), _MAX_PUT_BATCH_SIZE):
+            self.client.put_multi(entities[start:start + _MAX_PUT_BATCH_SIZE])
+        for entity in entities:
+            self.invalidate(entity.key.name)
+        return entities
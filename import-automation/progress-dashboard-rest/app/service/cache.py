@@ -0,0 +1,220 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Caches of entities read from Datastore, used by BaseDatabase.
+
+Two implementations are provided:
+    LRUCache: In-process cache, the default.
+    RedisCache: Cache in a Redis server, e.g. one running locally, shared by
+        all the worker processes of an instance. Requires the redis package.
+
+Both expire entries after a time to live and count their hits and misses,
+reported by stats().
+"""
+
+import collections
+import copy
+import pickle
+import threading
+import time
+
+from app import configs
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class CacheStats:
+    """Hit and miss counters of a cache, safe to update from any thread."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def record(self, hit):
+        """Counts a lookup as a hit if hit is True, and as a miss otherwise."""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def record_eviction(self):
+        """Counts an entry evicted to make room for another."""
+        with self._lock:
+            self.evictions += 1
+
+    def to_dict(self, size):
+        """Returns the counters and the hit rate as a dict.
+
+        Args:
+            size: Number of entries in the cache as an int.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': size
+            }
+
+
+class LRUCache:
+    """In-process cache with a time to live and a maximum number of
+    entries, evicting the least recently used entries when full.
+
+    Values are copied when set and when got, so that callers can modify
+    them freely.
+
+    Attributes:
+        max_size: Maximum number of entries as an int.
+        ttl: Number of seconds an entry is kept for as a float.
+        stats: CacheStats of the cache.
+    """
+    def __init__(self, max_size, ttl, clock=time.monotonic):
+        """Constructs an LRUCache.
+
+        Args:
+            max_size: See LRUCache.
+            ttl: See LRUCache.
+            clock: Function returning the current time in seconds.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Maps keys to (expiration time, value), least recently used first.
+        self._entries = collections.OrderedDict()
+
+    def get(self, key):
+        """Returns a copy of the value of key, or None if it is absent or
+        expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] <= self._clock():
+                del self._entries[key]
+                entry = None
+            if entry:
+                self._entries.move_to_end(key)
+        self.stats.record(entry is not None)
+        return copy.deepcopy(entry[1]) if entry else None
+
+    def set(self, key, value):
+        """Sets the value of key to a copy of value."""
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats.record_eviction()
+
+    def delete(self, key):
+        """Removes key from the cache if present."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Removes all the entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        """Returns the number of entries, including expired ones not yet
+        removed."""
+        with self._lock:
+            return len(self._entries)
+
+
+class RedisCache:
+    """Cache in a Redis server with a time to live. Redis evicts entries
+    when full according to its maxmemory-policy, e.g. allkeys-lru.
+
+    Attributes:
+        ttl: Number of seconds an entry is kept for as a float.
+        stats: CacheStats of the lookups made by this process.
+    """
+    def __init__(self, url, ttl, prefix=configs.DASHBOARD_NAMESPACE):
+        """Constructs a RedisCache.
+
+        Args:
+            url: URL of the Redis server, e.g. 'redis://localhost:6379/0'.
+            ttl: See RedisCache.
+            prefix: Prefix of the keys of the entries in Redis.
+
+        Raises:
+            ImportError: The redis package is not installed.
+        """
+        if redis is None:
+            raise ImportError('The redis package is required by RedisCache')
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix + ':'
+
+    def get(self, key):
+        """Returns the value of key, or None if it is absent or expired."""
+        data = self._client.get(self._prefix + key)
+        self.stats.record(data is not None)
+        return pickle.loads(data) if data is not None else None
+
+    def set(self, key, value):
+        """Sets the value of key."""
+        self._client.set(self._prefix + key, pickle.dumps(value),
+                         px=int(self.ttl * 1000))
+
+    def delete(self, key):
+        """Removes key from the cache if present."""
+        self._client.delete(self._prefix + key)
+
+    def clear(self):
+        """Removes all the entries with the prefix of the cache."""
+        keys = list(self._client.scan_iter(self._prefix + '*'))
+        if keys:
+            self._client.delete(*keys)
+
+    def size(self):
+        """Returns the number of entries with the prefix of the cache, not
+        counting the other keys of the Redis database."""
+        return sum(1 for _ in self._client.scan_iter(self._prefix + '*'))
+
+
+_DEFAULT_CACHE = None
+_DEFAULT_CACHE_LOCK = threading.Lock()
+
+
+def get_default_cache():
+    """Returns the cache shared by the databases of this process, creating it
+    on first use.
+
+    It is a RedisCache if configs.CACHE_REDIS_URL is set, and an LRUCache
+    otherwise.
+    """
+    global _DEFAULT_CACHE
+    with _DEFAULT_CACHE_LOCK:
+        if not _DEFAULT_CACHE:
+            if configs.CACHE_REDIS_URL:
+                _DEFAULT_CACHE = RedisCache(configs.CACHE_REDIS_URL,
+                                            configs.CACHE_TTL_SECONDS)
+            else:
+                _DEFAULT_CACHE = LRUCache(configs.CACHE_MAX_ENTRIES,
+                                          configs.CACHE_TTL_SECONDS)
+        return _DEFAULT_CACHE
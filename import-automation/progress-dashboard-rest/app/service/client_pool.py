@@ -0,0 +1,66 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Pool of datastore Client objects shared by the threads of a worker.
+"""
+
+import queue
+
+
+class ClientPool:
+    """Thread-safe pool of datastore Client objects.
+
+    When the API is served by threaded workers, each request checks a client
+    out of the pool for its whole duration and returns it when the request
+    ends. Clients are created on demand, so a worker never holds more
+    clients than it has concurrent requests, and reused afterwards, so that
+    requests do not pay for constructing a client and discovering
+    credentials.
+
+    Attributes:
+        factory: Function with no arguments that creates a new client.
+        max_idle: Maximum number of idle clients kept in the pool as an int.
+            Clients returned to a full pool are dropped.
+    """
+    def __init__(self, factory, max_idle=32):
+        """Constructs a ClientPool.
+
+        Args:
+            factory: See ClientPool.
+            max_idle: See ClientPool.
+        """
+        self.factory = factory
+        self.max_idle = max_idle
+        # Last in, first out, so that the most recently used clients, whose
+        # connections are most likely still open, are reused first.
+        self._idle = queue.LifoQueue(maxsize=max_idle)
+
+    def acquire(self):
+        """Returns an idle client, or a new one if there is none."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self.factory()
+
+    def release(self, client):
+        """Returns a client acquired from the pool to the pool."""
+        try:
+            self._idle.put_nowait(client)
+        except queue.Full:
+            pass
+
+    def idle_count(self):
+        """Returns the number of idle clients in the pool."""
+        return self._idle.qsize()
@@ -18,6 +18,7 @@ storage.
 """
 
 from app.service import base_database
+from app.service import import_stats_database
 from app.model import import_attempt_model
 
 _MODEL = import_attempt_model.ImportAttemptModel
@@ -27,7 +28,14 @@ class ImportAttemptDatabase(base_database.BaseDatabase):
     """Database service for storing import attempts using Google Cloud Datastore
     for storage.
 
-    See BaseDatabase.
+    Saving an import attempt records its creation or modification in the
+    statistics of the import attempts, in the same transaction. See
+    BaseDatabase and ImportStatsDatabase.
+
+    Attributes:
+        See BaseDatabase.
+        stats_database: ImportStatsDatabase object for updating the
+            statistics of the import attempts using the client
     """
     kind = 'import-attempt'
 
@@ -37,3 +45,19 @@ class ImportAttemptDatabase(base_database.BaseDatabase):
         See BaseDatabase.
         """
         super().__init__(ImportAttemptDatabase.kind, client, _MODEL.attempt_id)
+        self.stats_database = import_stats_database.ImportStatsDatabase(
+            self.client)
+
+    def save(self, entity):
+        """Saves the import attempt and records it in the statistics of the
+        import attempts, within the current transaction if any, or a new one.
+
+        See BaseDatabase.save.
+        """
+        def save():
+            old_attempt = self._get_stored(entity)
+            base_database.BaseDatabase.save(self, entity)
+            self.stats_database.record_attempt(old_attempt, entity)
+            return entity
+
+        return self._in_transaction(save)
@@ -0,0 +1,244 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Database service for storing the logs of import attempts using Google Cloud
+Datastore for storage.
+"""
+
+from google.cloud import datastore
+
+from app import utils
+from app.model import import_attempt_model
+from app.model import import_log_model
+from app.service import import_attempt_database
+
+_ATTEMPT = import_attempt_model.ImportAttemptModel
+_MODEL = import_log_model.ImportLogModel
+# Kind of the import attempts, the parents of their logs. Read once, so that
+# the keys of the logs do not depend on the database the attempts are
+# stored with, e.g. a fake one in tests.
+_ATTEMPT_KIND = import_attempt_database.ImportAttemptDatabase.kind
+
+# Maximum number of logs returned by a single read.
+MAX_LIMIT = 1000
+# Maximum number of logs appended at once. A Datastore commit writes at most
+# 500 entities, one of which is the counter.
+MAX_BATCH_SIZE = 499
+
+
+class ImportLogDatabase:
+    """Database service for storing the logs of import attempts using Google
+    Cloud Datastore for storage.
+
+    Each log is stored as its own entity, a child of the key of its import
+    attempt whose ID is the sequence of the log. Appending a log therefore
+    writes a constant amount of data however many logs the attempt has,
+    instead of rewriting the attempt with all its logs. The number of logs
+    of each attempt is kept in a counter entity, also a child of the key of
+    the attempt, from which sequences are allocated.
+
+    Concurrent appends to the logs of an attempt conflict on its counter.
+    The transaction of an append is retried when it conflicts, see
+    utils.run_in_transaction.
+
+    Attempts saved before logs were stored on their own hold their logs in
+    their logs field. Those logs are moved to log entities by
+    migrate_embedded_logs.
+
+    Attributes:
+        client: datastore Client object to communicate with Datastore
+    """
+    kind = 'import-log'
+    counter_kind = 'import-log-counter'
+    # Field of a counter entity holding the number of logs of its attempt.
+    count_field = 'count'
+
+    def __init__(self, client=None):
+        """Constructs an ImportLogDatabase.
+
+        Args:
+            client: Client to communicate with Datastore.
+        """
+        if not client:
+            client = utils.create_datastore_client()
+        self.client = client
+
+    def _attempt_key(self, attempt_id):
+        """Returns the key of the import attempt with the attempt_id."""
+        return self.client.key(_ATTEMPT_KIND, attempt_id)
+
+    def _counter_key(self, attempt_id):
+        """Returns the key of the counter of the logs of an attempt."""
+        return self.client.key(ImportLogDatabase.counter_kind,
+                               attempt_id,
+                               parent=self._attempt_key(attempt_id))
+
+    def _log_key(self, attempt_id, sequence):
+        """Returns the key of the log of an attempt with the sequence."""
+        return self.client.key(ImportLogDatabase.kind, sequence,
+                               parent=self._attempt_key(attempt_id))
+
+    def append(self, attempt_id, logs):
+        """Appends logs to the logs of an attempt in a single transaction,
+        retried if it conflicts with concurrent appends.
+
+        Args:
+            attempt_id: ID of the import attempt as a string.
+            logs: List of logs to append, each a dict with the fields of
+                ImportLogModel other than attempt_id and sequence.
+
+        Returns:
+            The appended logs as a list of datastore Entity objects, with
+            attempt_id and sequence set.
+
+        Raises:
+            ValueError: There are more than MAX_BATCH_SIZE logs.
+            google.api_core.exceptions.Conflict: The append still conflicted
+                with concurrent appends after utils.TRANSACTION_ATTEMPTS
+                attempts.
+        """
+        if len(logs) > MAX_BATCH_SIZE:
+            raise ValueError('Cannot append more than {} logs at once'.format(
+                MAX_BATCH_SIZE))
+        return utils.run_in_transaction(
+            self.client, lambda: self._append(attempt_id, logs))
+
+    def _append(self, attempt_id, logs):
+        """Appends logs to the logs of an attempt within the current
+        transaction. See append."""
+        counter_key = self._counter_key(attempt_id)
+        counter = self.client.get(counter_key)
+        if not counter:
+            counter = datastore.Entity(counter_key)
+        count = counter.get(ImportLogDatabase.count_field, 0)
+        entities = []
+        for log in logs:
+            count += 1
+            entity = datastore.Entity(self._log_key(attempt_id, count),
+                                      exclude_from_indexes=(_MODEL.message,))
+            entity.update(log)
+            entity[_MODEL.attempt_id] = attempt_id
+            entity[_MODEL.sequence] = count
+            entities.append(entity)
+        counter[ImportLogDatabase.count_field] = count
+        self.client.put_multi(entities + [counter])
+        return entities
+
+    def migrate_embedded_logs(self, attempt_database, attempt_id):
+        """Moves the logs embedded in the logs field of an import attempt to
+        log entities, appended in their order.
+
+        The logs are moved MAX_BATCH_SIZE - 1 at a time, each batch in a
+        transaction that also removes them from the attempt, so that no log
+        is lost or moved twice, however many logs the attempt holds.
+
+        Args:
+            attempt_database: ImportAttemptDatabase storing the attempt.
+            attempt_id: ID of the import attempt as a string.
+
+        Returns:
+            Number of logs moved.
+        """
+        def move_batch():
+            attempt = attempt_database.get(attempt_id)
+            embedded = attempt.get(_ATTEMPT.logs) if attempt else None
+            if not embedded:
+                return 0
+            # The attempt and the counter are written along with the logs.
+            batch = embedded[:MAX_BATCH_SIZE - 1]
+            self._append(attempt_id, [dict(log) for log in batch])
+            attempt[_ATTEMPT.logs] = embedded[len(batch):]
+            attempt_database.save(attempt)
+            return len(batch)
+
+        num_moved = 0
+        while True:
+            num_batch = utils.run_in_transaction(self.client, move_batch)
+            if not num_batch:
+                break
+            num_moved += num_batch
+        if num_moved:
+            attempt_database.invalidate(attempt_id)
+        return num_moved
+
+    def count(self, attempt_id):
+        """Returns the number of logs of an attempt, which is also the
+        sequence of its last log.
+
+        Only the counter of the attempt is looked up, which is cheaper than
+        querying its logs, e.g. to check whether there are new logs.
+
+        Args:
+            attempt_id: ID of the import attempt as a string.
+        """
+        counter = self.client.get(self._counter_key(attempt_id))
+        return counter.get(ImportLogDatabase.count_field, 0) if counter else 0
+
+    def list(self, attempt_id, since=0, limit=MAX_LIMIT):
+        """Retrieves the logs of an attempt in the order they were appended.
+
+        Args:
+            attempt_id: ID of the import attempt as a string.
+            since: Only logs with a sequence greater than since are returned,
+                as an int. To page through the logs, pass the sequence of the
+                last log of the previous page.
+            limit: Maximum number of logs to return as an int, at least 1
+                and capped at MAX_LIMIT.
+
+        Returns:
+            A list of logs each as a datastore Entity.
+
+        Raises:
+            ValueError: limit is less than 1.
+        """
+        if limit < 1:
+            raise ValueError('limit must be at least 1, got {}'.format(limit))
+        query = self.client.query(kind=ImportLogDatabase.kind,
+                                  ancestor=self._attempt_key(attempt_id))
+        if since > 0:
+            query.add_filter('__key__', '>', self._log_key(attempt_id, since))
+        query.order = ['__key__']
+        return list(query.fetch(limit=min(limit, MAX_LIMIT)))
+
+    def iterate_pages(self, attempt_id, since=0, limit=MAX_LIMIT):
+        """Iterates over the pages of the logs of an attempt in the order
+        they were appended.
+
+        See list. Pages are retrieved one at a time as the iteration
+        proceeds, so only one page is held in memory at once.
+
+        Args:
+            attempt_id: ID of the import attempt as a string.
+            since: Only logs with a sequence greater than since are
+                returned, as an int.
+            limit: Number of logs per page as an int, at least 1 and capped
+                at MAX_LIMIT.
+
+        Yields:
+            Lists of logs each as a datastore Entity.
+
+        Raises:
+            ValueError: limit is less than 1.
+        """
+        if limit < 1:
+            raise ValueError('limit must be at least 1, got {}'.format(limit))
+        limit = min(limit, MAX_LIMIT)
+        while True:
+            logs = self.list(attempt_id, since=since, limit=limit)
+            if logs:
+                yield logs
+            if len(logs) < limit:
+                return
+            since = logs[-1][_MODEL.sequence]
@@ -0,0 +1,308 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Database service for the aggregate statistics of system runs and import
+attempts using Google Cloud Datastore for storage.
+"""
+
+import collections
+import datetime
+import random
+
+from google.cloud import datastore
+
+from app import utils
+from app.model import import_attempt_model
+from app.model import system_run_model
+from app.service import base_database
+
+_ATTEMPT = import_attempt_model.ImportAttemptModel
+_RUN = system_run_model.SystemRunModel
+
+# Number of shards of each counter. Each update writes one shard picked at
+# random, so that concurrent updates of the same counter rarely contend.
+NUM_SHARDS = 10
+
+# Maximum number of entities Datastore writes or deletes in one call.
+_MAX_WRITE_BATCH_SIZE = 500
+
+# Scope of the counter of the system runs.
+SYSTEM_RUNS_SCOPE = 'system-runs'
+# Scope of the counter of all the import attempts.
+IMPORTS_SCOPE = 'imports'
+
+# Prefix of the fields of a counter shard holding the number of entities
+# with a status, e.g. 'status:failed'.
+_STATUS_PREFIX = 'status:'
+# Field of a counter shard holding the number of completed attempts.
+_COMPLETED = 'completed'
+# Field of a counter shard holding the total duration in seconds of the
+# completed attempts.
+_DURATION = 'duration_seconds'
+
+
+def _import_scope(import_name):
+    """Returns the scope of the counter of the attempts of an import."""
+    return 'import:' + import_name
+
+
+def _duration(attempt):
+    """Returns the number of seconds an attempt took to complete, or None if
+    it has not completed or its times are not in ISO 8601 format."""
+    time_created = attempt.get(_ATTEMPT.time_created)
+    time_completed = attempt.get(_ATTEMPT.time_completed)
+    if not time_created or not time_completed:
+        return None
+    try:
+        delta = (datetime.datetime.fromisoformat(time_completed) -
+                 datetime.datetime.fromisoformat(time_created))
+    except (TypeError, ValueError):
+        return None
+    return delta.total_seconds()
+
+
+def _run_counts(run):
+    """Returns what a system run adds to the counter of the system runs, as a
+    Counter from field to number."""
+    counts = collections.Counter()
+    if run and run.get(_RUN.status):
+        counts[_STATUS_PREFIX + run[_RUN.status]] += 1
+    return counts
+
+
+def _attempt_counts(attempt):
+    """Returns what an import attempt adds to the counters of the attempts,
+    as a Counter from field to number."""
+    counts = collections.Counter()
+    if not attempt:
+        return counts
+    if attempt.get(_ATTEMPT.status):
+        counts[_STATUS_PREFIX + attempt[_ATTEMPT.status]] += 1
+    duration = _duration(attempt)
+    if duration is not None:
+        counts[_COMPLETED] += 1
+        counts[_DURATION] += duration
+    return counts
+
+
+def _difference(new_counts, old_counts):
+    """Returns new_counts minus old_counts field by field, keeping negative
+    numbers unlike Counter subtraction."""
+    return {
+        field: new_counts[field] - old_counts[field]
+        for field in set(new_counts) | set(old_counts)
+    }
+
+
+class ImportStatsDatabase:
+    """Database service for the aggregate statistics of system runs and
+    import attempts using Google Cloud Datastore for storage.
+
+    The statistics are kept in counters updated whenever a system run or an
+    import attempt is created or modified, so reading them costs the same
+    however many runs and attempts there are. There is a counter for the
+    system runs, one for all the import attempts, and one for the attempts
+    of each import, identified by their scope. Each counter is split into
+    NUM_SHARDS entities, summed when read.
+
+    The record methods must be called within the transaction that saves the
+    run or attempt, so that the counters are updated if and only if it is
+    saved. SystemRunDatabase and ImportAttemptDatabase call them whenever
+    they save a run or an attempt. Runs and attempts saved before the
+    statistics were recorded are only counted once the counters are
+    rebuilt from them, see rebuild. Until then, a counter can go below zero
+    when such a run or attempt changes status, so totals are read as zero
+    at least.
+
+    Attributes:
+        client: datastore Client object to communicate with Datastore
+    """
+    kind = 'import-stats'
+
+    def __init__(self, client=None):
+        """Constructs an ImportStatsDatabase.
+
+        Args:
+            client: Client to communicate with Datastore.
+        """
+        if not client:
+            client = utils.create_datastore_client()
+        self.client = client
+
+    def _shard_key(self, scope, shard):
+        """Returns the key of a shard of the counter of a scope."""
+        return self.client.key(ImportStatsDatabase.kind,
+                               '{}#{}'.format(scope, shard))
+
+    def _add(self, scope, deltas):
+        """Adds deltas to a random shard of the counter of a scope.
+
+        Within a transaction started by utils.transaction or
+        utils.run_in_transaction, the deltas added to a shard are summed and
+        the shard is written once, when the transaction commits, since the
+        shard read within the transaction does not reflect the writes it
+        has not committed yet.
+
+        Args:
+            scope: Scope of the counter as a string.
+            deltas: Dict from field to the number to add to it.
+        """
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        key = self._shard_key(scope, random.randrange(NUM_SHARDS))
+        shard = utils.get_put_before_commit(self.client, key)
+        if shard is None:
+            shard = self.client.get(key) or datastore.Entity(key)
+        for field, delta in deltas.items():
+            shard[field] = shard.get(field, 0) + delta
+        if not utils.put_before_commit(self.client, shard):
+            self.client.put(shard)
+
+    def record_run(self, old_run, new_run):
+        """Records the creation or modification of a system run.
+
+        Args:
+            old_run: The system run before it was modified, as a dict, or
+                None if it is created.
+            new_run: The system run as saved, as a dict.
+        """
+        self._add(SYSTEM_RUNS_SCOPE,
+                  _difference(_run_counts(new_run), _run_counts(old_run)))
+
+    def record_attempt(self, old_attempt, new_attempt):
+        """Records the creation or modification of an import attempt.
+
+        The attempt counts as completed, with its duration, once it has both
+        time_created and time_completed.
+
+        Args:
+            old_attempt: The import attempt before it was modified, as a
+                dict, or None if it is created.
+            new_attempt: The import attempt as saved, as a dict.
+        """
+        old_counts = _attempt_counts(old_attempt)
+        new_counts = _attempt_counts(new_attempt)
+        self._add(IMPORTS_SCOPE, _difference(new_counts, old_counts))
+        old_name = (old_attempt or {}).get(_ATTEMPT.import_name)
+        new_name = new_attempt.get(_ATTEMPT.import_name)
+        if old_name == new_name:
+            if new_name:
+                self._add(_import_scope(new_name),
+                          _difference(new_counts, old_counts))
+            return
+        # The attempt moves from the counter of one import to another.
+        if old_name:
+            self._add(_import_scope(old_name),
+                      _difference(collections.Counter(), old_counts))
+        if new_name:
+            self._add(_import_scope(new_name), new_counts)
+
+    def rebuild(self, run_database, attempt_database):
+        """Recomputes all the counters from the system runs and import
+        attempts stored, e.g. to count those saved before the statistics
+        were recorded.
+
+        The runs and attempts are read a page at a time, then the shards
+        of all the counters are replaced. This is not a transaction, so
+        runs and attempts saved meanwhile might be miscounted. Rebuild the
+        counters while none are saved.
+
+        Args:
+            run_database: SystemRunDatabase storing the system runs.
+            attempt_database: ImportAttemptDatabase storing the attempts.
+
+        Returns:
+            The number of counters rebuilt as an int.
+        """
+        counters = collections.defaultdict(collections.Counter)
+        for page in run_database.iterate_pages(
+                {}, limit=base_database.MAX_PAGE_SIZE):
+            for run in page:
+                counters[SYSTEM_RUNS_SCOPE].update(_run_counts(run))
+        for page in attempt_database.iterate_pages(
+                {}, limit=base_database.MAX_PAGE_SIZE):
+            for attempt in page:
+                counts = _attempt_counts(attempt)
+                counters[IMPORTS_SCOPE].update(counts)
+                if attempt.get(_ATTEMPT.import_name):
+                    counters[_import_scope(
+                        attempt[_ATTEMPT.import_name])].update(counts)
+
+        query = self.client.query(kind=ImportStatsDatabase.kind)
+        query.keys_only()
+        keys = [shard.key for shard in query.fetch()]
+        for start in range(0, len(keys), _MAX_WRITE_BATCH_SIZE):
+            self.client.delete_multi(keys[start:start + _MAX_WRITE_BATCH_SIZE])
+        shards = []
+        for scope, counts in counters.items():
+            shard = datastore.Entity(self._shard_key(scope, 0))
+            shard.update(counts)
+            shards.append(shard)
+        for start in range(0, len(shards), _MAX_WRITE_BATCH_SIZE):
+            self.client.put_multi(shards[start:start + _MAX_WRITE_BATCH_SIZE])
+        return len(shards)
+
+    def _get(self, scope):
+        """Returns the sum of the shards of the counter of a scope as a
+        dict."""
+        keys = [self._shard_key(scope, shard) for shard in range(NUM_SHARDS)]
+        totals = collections.Counter()
+        for shard in self.client.get_multi(keys):
+            totals.update(shard)
+        return totals
+
+    def get_system_run_stats(self):
+        """Retrieves the statistics of the system runs.
+
+        Returns:
+            A dict with the number of system runs with each status under
+            'statuses'.
+        """
+        return {'statuses': self._statuses(self._get(SYSTEM_RUNS_SCOPE))}
+
+    def get_import_stats(self, import_name=None):
+        """Retrieves the statistics of the import attempts.
+
+        Args:
+            import_name: Name of the import to retrieve the statistics of the
+                attempts of, or None to retrieve those of all the attempts.
+
+        Returns:
+            A dict with the number of attempts with each status under
+            'statuses', the number of completed attempts under 'completed',
+            and their average duration in seconds under
+            'average_duration_seconds', None if no attempt completed.
+        """
+        scope = _import_scope(import_name) if import_name else IMPORTS_SCOPE
+        totals = self._get(scope)
+        completed = max(totals[_COMPLETED], 0)
+        return {
+            'statuses': self._statuses(totals),
+            'completed': completed,
+            'average_duration_seconds':
+                max(totals[_DURATION], 0) / completed if completed else None
+        }
+
+    @staticmethod
+    def _statuses(totals):
+        """Returns the number of entities with each status from the totals
+        of a counter, omitting the statuses no entity has, including those
+        whose total went below zero, see ImportStatsDatabase."""
+        return {
+            field[len(_STATUS_PREFIX):]: count
+            for field, count in totals.items()
+            if field.startswith(_STATUS_PREFIX) and count > 0
+        }
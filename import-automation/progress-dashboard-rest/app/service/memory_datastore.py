@@ -0,0 +1,438 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+In-memory stand-in for a datastore Client, for tests and local runs that do
+not need credentials or the Datastore emulator.
+
+MemoryClient implements the part of the datastore Client interface used by
+the database services: keys, get, put, and delete of single entities or
+batches, queries by kind and ancestor with filters, orders, projections,
+limits, and cursors, and transactions. Keys and entities are the datastore
+Key and Entity classes.
+
+Transactions have the semantics of Datastore transactions: writes are only
+visible once committed, reads see the entities as committed, and a commit
+fails with google.api_core.exceptions.Aborted if an entity read or written
+by the transaction was committed by another one in the meantime.
+
+Entities are copied in and out of the store, so that modifying an entity
+after saving it or retrieving it has no effect on the store, as with
+Datastore.
+"""
+
+import base64
+import copy
+import itertools
+import threading
+
+from google.api_core import exceptions
+from google.cloud import datastore
+
+_OPERATORS = {
+    '=': lambda a, b: a == b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+    '!=': lambda a, b: a != b,
+}
+
+
+def _key_order(key):
+    """Returns a sortable representation of a key, ordering its path
+    elements by kind, then integer IDs before names, as Datastore does."""
+    path = []
+    for element in key.path:
+        if 'id' in element:
+            path.append((element['kind'], 0, element['id'], ''))
+        else:
+            path.append((element['kind'], 1, 0, element.get('name', '')))
+    return tuple(path)
+
+
+def _store_key(key):
+    """Returns the key of an entity in the store."""
+    return key.project, key.namespace, key.flat_path
+
+
+class MemoryStore:
+    """Entities shared by MemoryClient objects, safe to use from any thread.
+
+    Attributes:
+        entities: Dict from store key to (version, Entity).
+    """
+    def __init__(self):
+        """Constructs an empty MemoryStore."""
+        self.entities = {}
+        self.lock = threading.Lock()
+        self._versions = itertools.count(1)
+        self._ids = itertools.count(1)
+
+    def next_version(self):
+        """Returns the version of the next commit. Must be called with lock
+        held."""
+        return next(self._versions)
+
+    def allocate_id(self):
+        """Returns a new integer ID for an entity with a partial key."""
+        with self.lock:
+            return next(self._ids)
+
+    def clear(self):
+        """Removes all the entities."""
+        with self.lock:
+            self.entities.clear()
+
+
+class MemoryTransaction:
+    """Transaction of a MemoryClient, used as a context manager.
+
+    Attributes:
+        client: The MemoryClient of the transaction.
+    """
+    def __init__(self, client):
+        """Constructs a MemoryTransaction."""
+        self.client = client
+        # Versions of the entities read, by store key. 0 for absent ones.
+        self._read_versions = {}
+        # Entities to write, or None to delete, by store key.
+        self._writes = {}
+        self._active = False
+
+    def begin(self):
+        """Starts the transaction."""
+        self._active = True
+        self.client._push_transaction(self)  # pylint: disable=protected-access
+
+    def record_read(self, store_key, version):
+        """Records that an entity was read at a version."""
+        self._read_versions.setdefault(store_key, version)
+
+    def put(self, entity):
+        """Writes entity when the transaction commits."""
+        store_key = self._record_write(entity.key)
+        self._writes[store_key] = copy.deepcopy(entity)
+
+    def delete(self, key):
+        """Deletes the entity with key when the transaction commits."""
+        self._writes[self._record_write(key)] = None
+
+    def _record_write(self, key):
+        """Records the version of an entity about to be written, so that
+        concurrent writes of the entity conflict, and returns its store
+        key."""
+        store_key = _store_key(key)
+        with self.client.store.lock:
+            version = self.client.store.entities.get(store_key, (0, None))[0]
+        self.record_read(store_key, version)
+        return store_key
+
+    def commit(self):
+        """Commits the writes of the transaction.
+
+        Raises:
+            google.api_core.exceptions.Aborted: An entity read or written by
+                the transaction was committed by another one since.
+        """
+        try:
+            store = self.client.store
+            with store.lock:
+                for store_key, version in self._read_versions.items():
+                    current = store.entities.get(store_key, (0, None))[0]
+                    if current != version:
+                        raise exceptions.Aborted(
+                            'Transaction aborted due to contention.')
+                commit_version = store.next_version()
+                for store_key, entity in self._writes.items():
+                    if entity is None:
+                        store.entities.pop(store_key, None)
+                    else:
+                        store.entities[store_key] = (commit_version, entity)
+        finally:
+            self._end()
+
+    def rollback(self):
+        """Discards the writes of the transaction."""
+        self._end()
+
+    def _end(self):
+        if self._active:
+            self._active = False
+            self.client._pop_transaction()  # pylint: disable=protected-access
+
+    def __enter__(self):
+        self.begin()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+
+class _Iterator:
+    """Results of a MemoryQuery, as a single page.
+
+    Attributes:
+        pages: Iterator of the pages of results, each a list of entities.
+        next_page_token: Cursor of the results after this page as bytes, or
+            None if there are none.
+    """
+    def __init__(self, entities, next_page_token):
+        self._entities = entities
+        self.pages = iter([entities])
+        self.next_page_token = next_page_token
+
+    def __iter__(self):
+        return iter(self._entities)
+
+
+class MemoryQuery:
+    """Query of a MemoryClient, see datastore Query.
+
+    Attributes:
+        kind: Kind of the entities queried.
+        ancestor: Key the entities queried must descend from, or None.
+        order: List of the names of the properties to sort by, each prefixed
+            with '-' for a descending order. Sorted by key after them.
+        projection: List of the names of the properties to return, or an
+            empty list for all of them.
+    """
+    def __init__(self, client, kind=None, ancestor=None, order=(),
+                 projection=()):
+        """Constructs a MemoryQuery. See MemoryQuery."""
+        self._client = client
+        self.kind = kind
+        self.ancestor = ancestor
+        self.order = list(order)
+        self.projection = list(projection)
+        self._filters = []
+        self._keys_only = False
+
+    def add_filter(self, property_name, operator, value):
+        """Only returns the entities whose property compares to value with
+        operator, one of '=', '<', '<=', '>', '>=', and '!='. '__key__'
+        filters by key."""
+        if operator not in _OPERATORS:
+            raise ValueError('Invalid operator {}'.format(operator))
+        self._filters.append((property_name, operator, value))
+        return self
+
+    def keys_only(self):
+        """Only returns the keys of the entities."""
+        self._keys_only = True
+
+    def _matches(self, entity):
+        if self.kind and entity.key.kind != self.kind:
+            return False
+        if self.ancestor is not None:
+            path = self.ancestor.flat_path
+            if (entity.key.flat_path[:len(path)] != path or
+                    entity.key.namespace != self.ancestor.namespace):
+                return False
+        for name, operator, value in self._filters:
+            compare = _OPERATORS[operator]
+            if name == '__key__':
+                if not compare(_key_order(entity.key), _key_order(value)):
+                    return False
+                continue
+            if name not in entity:
+                return False
+            values = entity[name]
+            if not isinstance(values, list):
+                values = [values]
+            try:
+                if not any(compare(item, value) for item in values):
+                    return False
+            except TypeError:
+                return False
+        return True
+
+    def _sort(self, entities):
+        entities.sort(key=lambda entity: _key_order(entity.key))
+        for name in reversed(self.order):
+            if name.lstrip('-') == '__key__':
+                entities.sort(key=lambda entity: _key_order(entity.key),
+                              reverse=name.startswith('-'))
+            else:
+                entities.sort(key=lambda entity: entity.get(name.lstrip('-')),
+                              reverse=name.startswith('-'))
+
+    def fetch(self, limit=None, start_cursor=None):
+        """Runs the query.
+
+        Args:
+            limit: Maximum number of entities to return, or None for all.
+            start_cursor: Cursor returned as next_page_token by a previous
+                fetch of the query, to continue from.
+
+        Returns:
+            An iterator of the entities with pages and next_page_token, like
+            the iterator returned by datastore Query.fetch.
+        """
+        if self.projection and self._keys_only:
+            raise exceptions.BadRequest(
+                'Cannot use projection with keys_only.')
+        with self._client.store.lock:
+            candidates = [
+                entity for store_key, (_, entity) in
+                self._client.store.entities.items()
+                if store_key[:2] == (self._client.project,
+                                     self._client.namespace)
+            ]
+        entities = [entity for entity in candidates if self._matches(entity)]
+        # As in Datastore, entities without a projected or sorted property
+        # are not in the results.
+        for name in self.projection + [name.lstrip('-') for name in self.order]:
+            if name != '__key__':
+                entities = [entity for entity in entities if name in entity]
+        self._sort(entities)
+        offset = 0
+        if start_cursor:
+            if isinstance(start_cursor, str):
+                start_cursor = start_cursor.encode('ascii')
+            try:
+                offset = int(base64.urlsafe_b64decode(start_cursor))
+            except ValueError:
+                raise exceptions.BadRequest('Invalid cursor.')
+        end = len(entities) if limit is None else offset + limit
+        next_page_token = None
+        if end < len(entities):
+            next_page_token = base64.urlsafe_b64encode(str(end).encode())
+        results = []
+        for entity in entities[offset:end]:
+            result = datastore.Entity(entity.key)
+            if not self._keys_only:
+                names = self.projection or entity.keys()
+                result.update(copy.deepcopy({name: entity[name]
+                                             for name in names}))
+            results.append(result)
+        return _Iterator(results, next_page_token)
+
+
+class MemoryClient:
+    """In-memory stand-in for a datastore Client.
+
+    Attributes:
+        project: Project of the keys created by the client.
+        namespace: Namespace of the keys created by the client.
+        store: MemoryStore of the entities.
+    """
+    def __init__(self, project='memory', namespace=None, store=None):
+        """Constructs a MemoryClient.
+
+        Args:
+            project: See MemoryClient.
+            namespace: See MemoryClient.
+            store: MemoryStore to use. A new one if None.
+        """
+        self.project = project
+        self.namespace = namespace
+        self.store = store if store is not None else MemoryStore()
+        # Stack of the transactions of each thread, like the batch stack of
+        # datastore Client.
+        self._local = threading.local()
+
+    def _transactions(self):
+        if not hasattr(self._local, 'transactions'):
+            self._local.transactions = []
+        return self._local.transactions
+
+    def _push_transaction(self, transaction):
+        self._transactions().append(transaction)
+
+    def _pop_transaction(self):
+        self._transactions().pop()
+
+    @property
+    def current_transaction(self):
+        """The transaction of this thread in progress, or None."""
+        transactions = self._transactions()
+        return transactions[-1] if transactions else None
+
+    def key(self, *path_args, **kwargs):
+        """Creates a datastore Key in the project and namespace of the
+        client."""
+        kwargs.setdefault('project', self.project)
+        kwargs.setdefault('namespace', self.namespace)
+        return datastore.Key(*path_args, **kwargs)
+
+    def transaction(self):
+        """Returns a new MemoryTransaction."""
+        return MemoryTransaction(self)
+
+    def query(self, **kwargs):
+        """Returns a new MemoryQuery. See MemoryQuery."""
+        return MemoryQuery(self, **kwargs)
+
+    def get(self, key):
+        """Retrieves the entity with key, or None if it does not exist."""
+        entities = self.get_multi([key])
+        return entities[0] if entities else None
+
+    def get_multi(self, keys):
+        """Retrieves the entities with keys, omitting those that do not
+        exist, in no particular order like datastore Client.get_multi."""
+        transaction = self.current_transaction
+        found = []
+        with self.store.lock:
+            for key in keys:
+                store_key = _store_key(key)
+                version, entity = self.store.entities.get(
+                    store_key, (0, None))
+                if transaction:
+                    transaction.record_read(store_key, version)
+                if entity is not None:
+                    found.append(copy.deepcopy(entity))
+        return found
+
+    def put(self, entity):
+        """Saves an entity. See put_multi."""
+        self.put_multi([entity])
+
+    def put_multi(self, entities):
+        """Saves entities, or writes them when the transaction in progress
+        commits. Entities with a partial key are given an integer ID."""
+        for entity in entities:
+            if entity.key.is_partial:
+                entity.key = entity.key.completed_key(
+                    self.store.allocate_id())
+        transaction = self.current_transaction
+        if transaction:
+            for entity in entities:
+                transaction.put(entity)
+            return
+        with self.store.lock:
+            version = self.store.next_version()
+            for entity in entities:
+                self.store.entities[_store_key(entity.key)] = (
+                    version, copy.deepcopy(entity))
+
+    def delete(self, key):
+        """Deletes the entity with key. See delete_multi."""
+        self.delete_multi([key])
+
+    def delete_multi(self, keys):
+        """Deletes the entities with keys, or when the transaction in
+        progress commits."""
+        transaction = self.current_transaction
+        if transaction:
+            for key in keys:
+                transaction.delete(key)
+            return
+        with self.store.lock:
+            for key in keys:
+                self.store.entities.pop(_store_key(key), None)
@@ -18,6 +18,7 @@ storage.
 """
 
 from app.service import base_database
+from app.service import import_stats_database
 from app.model import system_run_model
 
 _MODEL = system_run_model.SystemRunModel
@@ -27,7 +28,14 @@ class SystemRunDatabase(base_database.BaseDatabase):
     """Database service for storing system runs using Google Cloud Datastore
     for storage.
 
-    See BaseDatabase.
+    Saving a system run records its creation or modification in the
+    statistics of the system runs, in the same transaction. See BaseDatabase
+    and ImportStatsDatabase.
+
+    Attributes:
+        See BaseDatabase.
+        stats_database: ImportStatsDatabase object for updating the
+            statistics of the system runs using the client
     """
     kind = 'system-run'
 
@@ -37,3 +45,19 @@ class SystemRunDatabase(base_database.BaseDatabase):
         See BaseDatabase.
         """
         super().__init__(SystemRunDatabase.kind, client, _MODEL.run_id)
+        self.stats_database = import_stats_database.ImportStatsDatabase(
+            self.client)
+
+    def save(self, entity):
+        """Saves the system run and records it in the statistics of the
+        system runs, within the current transaction if any, or a new one.
+
+        See BaseDatabase.save.
+        """
+        def save():
+            old_run = self._get_stored(entity)
+            base_database.BaseDatabase.save(self, entity)
+            self.stats_database.record_run(old_run, entity)
+            return entity
+
+        return self._in_transaction(save)
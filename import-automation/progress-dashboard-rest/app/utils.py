@@ -16,10 +16,203 @@
 Utility functions.
 """
 
+import contextlib
 import datetime
+import functools
+import itertools
+import json
+import os
+import random
+import threading
+import time
+import uuid
 
+import flask
+from google.api_core import exceptions
+import google.auth
+from google.cloud import datastore
 import google.cloud.logging
 
+from app import configs
+from app import metrics
+from app.service import client_pool
+from app.service import memory_datastore
+
+# Media type of newline-delimited JSON responses, see stream_ndjson.
+NDJSON_MIMETYPE = 'application/x-ndjson'
+# Error returned when the limit query argument of a listing request is not
+# a positive int.
+LIMIT_ERROR = 'limit must be at least 1'
+
+# Number of times run_in_transaction attempts a transaction that conflicts
+# with concurrent ones.
+TRANSACTION_ATTEMPTS = 6
+# Upper bound in seconds of the random delay before the first retry of a
+# transaction. The bound doubles at each retry.
+TRANSACTION_RETRY_DELAY = 0.02
+
+# Pool of the Datastore clients shared by the threads of this process,
+# created on first use by get_client_pool.
+_CLIENT_POOL = None
+_CLIENT_POOL_LOCK = threading.Lock()
+
+
+def _reset_client_pool():
+    """Drops the client pool inherited from the parent of a forked process.
+
+    The clients of the parent share its connections, which must not be used
+    by the child. The lock is replaced as well, since it might have been
+    held by another thread of the parent when it forked.
+    """
+    global _CLIENT_POOL, _CLIENT_POOL_LOCK
+    _CLIENT_POOL = None
+    _CLIENT_POOL_LOCK = threading.Lock()
+
+
+# For example, gunicorn workers forked from a master that preloaded the app.
+os.register_at_fork(after_in_child=_reset_client_pool)
+
+
+def get_id():
+    """Returns a new random ID string for an entity."""
+    return uuid.uuid4().hex
+
+
+# Transaction started by transaction in the current thread, if any, as a
+# _Transaction.
+_TRANSACTION_STATE = threading.local()
+
+
+class _Transaction:
+    """What to do when a transaction started by transaction commits.
+
+    Attributes:
+        client: datastore Client running the transaction.
+        puts: Dict from key to the entity to write with it just before the
+            transaction commits. See put_before_commit.
+        cache_deletes: List of (cache, key) tuples of the cache entries to
+            delete once the transaction is committed. See
+            delete_after_commit.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.puts = {}
+        self.cache_deletes = []
+
+
+@contextlib.contextmanager
+def transaction(client):
+    """Runs the body of a with statement in a Datastore transaction.
+
+    The transaction is committed when the body completes and rolled back if
+    it raises. The entities passed to put_before_commit within the body are
+    written just before it commits, and once it is committed, the cache
+    entries passed to delete_after_commit are deleted.
+
+    Args:
+        client: datastore Client to run the transaction with.
+    """
+    previous = getattr(_TRANSACTION_STATE, 'current', None)
+    current = _Transaction(client)
+    _TRANSACTION_STATE.current = current
+    try:
+        with client.transaction():
+            yield
+            if current.puts:
+                client.put_multi(list(current.puts.values()))
+    finally:
+        _TRANSACTION_STATE.current = previous
+    for cache, cache_key in current.cache_deletes:
+        cache.delete(cache_key)
+
+
+def _current_transaction(client):
+    """Returns the _Transaction started by transaction in the current thread
+    that client is running, or None if there is none."""
+    current = getattr(_TRANSACTION_STATE, 'current', None)
+    if current is None or current.client is not client:
+        return None
+    return current
+
+
+def get_put_before_commit(client, key):
+    """Returns the entity with the key passed to put_before_commit in the
+    transaction client is running, or None if there is none."""
+    current = _current_transaction(client)
+    return current.puts.get(key) if current else None
+
+
+def put_before_commit(client, entity):
+    """Writes the entity just before the transaction started by transaction
+    or run_in_transaction that client is running commits, so that an entity
+    updated several times in the transaction is written once, as last
+    updated.
+
+    Args:
+        client: datastore Client running the transaction.
+        entity: datastore Entity with a complete key.
+
+    Returns:
+        Whether client is running such a transaction. If not, the entity is
+        not written.
+    """
+    current = _current_transaction(client)
+    if current is None:
+        return False
+    current.puts[entity.key] = entity
+    return True
+
+
+def delete_after_commit(cache, cache_key):
+    """Deletes the cache_key from the cache once the transaction started by
+    transaction or run_in_transaction in the current thread, if any, is
+    committed.
+
+    Args:
+        cache: Cache to delete the entry from, see app.service.cache.
+        cache_key: Key of the entry as a string.
+    """
+    current = getattr(_TRANSACTION_STATE, 'current', None)
+    if current is not None:
+        current.cache_deletes.append((cache, cache_key))
+
+
+def run_in_transaction(client, function, attempts=TRANSACTION_ATTEMPTS,
+                       sleep=time.sleep):
+    """Calls function in a Datastore transaction and returns its result.
+
+    If the commit is aborted by a conflict with a concurrent transaction,
+    function is called again in a new transaction, after a random delay so
+    that the conflicting transactions do not retry in lockstep. function
+    must therefore only have effects through the transaction. Must not be
+    called within another transaction, which could not be retried. Each
+    retry is counted by metrics.TRANSACTION_RETRIES. As with transaction,
+    the entities passed to put_before_commit are written just before the
+    transaction commits, and the cache entries passed to delete_after_commit
+    are deleted once it is committed.
+
+    Args:
+        client: datastore Client to run the transaction with.
+        function: Function called without arguments within the transaction.
+        attempts: Maximum number of transactions to run as an int.
+        sleep: Function sleeping for a number of seconds.
+
+    Raises:
+        google.api_core.exceptions.Conflict: The last transaction still
+            conflicted. Aborted is a subclass of Conflict.
+    """
+    for attempt in range(attempts):
+        try:
+            with transaction(client):
+                return function()
+        except exceptions.Conflict:
+            if attempt == attempts - 1:
+                raise
+            metrics.record_transaction_retry()
+            sleep(random.uniform(0, TRANSACTION_RETRY_DELAY * 2**attempt))
+    return None
+
 
 def utctime():
     """Returns the current time string in ISO 8601 with timezone UTC+0, e.g.
@@ -50,6 +243,59 @@ def add_fields(parser, fields, required=True):
             store_missing=False, required=required, location='json')
 
 
+def get_query_arg(name, default=None, data_type=str):
+    """Returns an argument from the query string of the current request.
+
+    Args:
+        name: Name of the argument as a string.
+        default: Value returned if the argument is absent, is not of
+            data_type, or if there is no request, e.g. when a resource
+            method is called directly.
+        data_type: Function converting the argument string to its type.
+    """
+    if not flask.has_request_context():
+        return default
+    return flask.request.args.get(name, default, type=data_type)
+
+
+def wants_ndjson():
+    """Returns whether the current request asks for a newline-delimited JSON
+    response, with 'stream=ndjson' in the query string or NDJSON_MIMETYPE
+    preferred over 'application/json' in the Accept header."""
+    if not flask.has_request_context():
+        return False
+    if get_query_arg('stream') == 'ndjson':
+        return True
+    return flask.request.accept_mimetypes.best_match(
+        ['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def stream_ndjson(pages):
+    """Returns a response streaming entities as newline-delimited JSON, one
+    entity per line.
+
+    The first page is retrieved before returning, so that errors retrieving
+    it can still be reported with an error code. The other pages are
+    retrieved as the response is sent, within the context of the request,
+    so that only one page is held in memory at once.
+
+    Args:
+        pages: Iterator of lists of entities, e.g. from
+            BaseDatabase.iterate_pages.
+
+    Returns:
+        A streamed flask Response.
+    """
+    first_page = next(pages, [])
+
+    def generate():
+        for page in itertools.chain([first_page], pages):
+            yield ''.join(json.dumps(entity) + '\n' for entity in page)
+
+    return flask.Response(flask.stream_with_context(generate()),
+                          mimetype=NDJSON_MIMETYPE)
+
+
 def setup_logging():
     """Connects the default logger to Google Cloud Logging.
 
@@ -58,3 +304,74 @@ def setup_logging():
     client = google.cloud.logging.Client()
     client.get_default_handler()
     client.setup_logging()
+
+
+def get_client_pool():
+    """Returns the pool of Datastore clients of this process, creating it on
+    first use.
+
+    Credentials are discovered once, when the pool is created, and shared by
+    all its clients. The clients record the Datastore calls they make, see
+    metrics.InstrumentedClient. If the DATASTORE_EMULATOR_HOST environment
+    variable is set, no credentials are needed.
+
+    If configs.DATASTORE_BACKEND is 'memory', the clients are instead
+    MemoryClient objects sharing the entities stored in this process.
+    """
+    global _CLIENT_POOL
+    if _CLIENT_POOL:
+        return _CLIENT_POOL
+    with _CLIENT_POOL_LOCK:
+        if _CLIENT_POOL:
+            return _CLIENT_POOL
+        if configs.DATASTORE_BACKEND == 'memory':
+            store = memory_datastore.MemoryStore()
+            _CLIENT_POOL = client_pool.ClientPool(
+                functools.partial(memory_datastore.MemoryClient,
+                                  project=configs.PROJECT_ID,
+                                  namespace=configs.DASHBOARD_NAMESPACE,
+                                  store=store))
+        else:
+            credentials = None
+            if not os.environ.get('DATASTORE_EMULATOR_HOST'):
+                credentials, _ = google.auth.default(
+                    scopes=datastore.Client.SCOPE)
+            _CLIENT_POOL = client_pool.ClientPool(
+                functools.partial(metrics.InstrumentedClient,
+                                  project=configs.PROJECT_ID,
+                                  namespace=configs.DASHBOARD_NAMESPACE,
+                                  credentials=credentials))
+        return _CLIENT_POOL
+
+
+def create_datastore_client():
+    """Returns a datastore Client for the dashboard project and namespace.
+
+    Within a request, the client is checked out of a pool shared by the
+    threads of the worker and kept for the whole request, so all the
+    resources and databases of the request share it. It is returned to the
+    pool by release_datastore_client when the request ends. Outside of a
+    request, a client is taken from the pool and never returned. See
+    get_client_pool.
+
+    If the DATASTORE_EMULATOR_HOST environment variable is set, the client
+    talks to the Datastore emulator at that host.
+    """
+    if not flask.has_app_context():
+        return get_client_pool().acquire()
+    if 'datastore_client' not in flask.g:
+        flask.g.datastore_client = get_client_pool().acquire()
+    return flask.g.datastore_client
+
+
+def release_datastore_client(exception=None):
+    """Returns the client checked out by the current request, if any, to
+    the pool. Registered to run when the app context of a request ends.
+
+    Args:
+        exception: The exception that ended the request, if any. Unused.
+    """
+    del exception
+    client = flask.g.pop('datastore_client', None)
+    if client:
+        get_client_pool().release(client)
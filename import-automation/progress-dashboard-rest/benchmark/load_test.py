@@ -0,0 +1,343 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Load test of the dashboard API with a mix of requests.
+
+The app is created with create_app(logging=False) and served in this
+process by a threaded server, against the Datastore emulator at
+DATASTORE_EMULATOR_HOST, or one started by the load test if it is not set.
+With --backend=memory, the app uses the in-memory Datastore backend instead
+and no emulator is needed. With --url, an already running API is loaded
+instead.
+
+Concurrent clients send --requests requests in total, each an operation
+picked at random according to --mix, with a fixed seed so that runs are
+reproducible. The throughput, the error rate, and the p50 and p99
+latencies are printed overall and by operation. Any exception raised by an
+operation, e.g. an HTTP error, a reset connection, or a timeout, counts as
+an error. The load test fails if the overall error rate is higher than
+--max_error_rate, 0 by default, and, with --max_p99_ms, if the overall p99
+latency is higher, so that it can gate changes.
+
+In the progress-dashboard-rest directory:
+
+    python3 -m benchmark.load_test --concurrency=16 --requests=2000
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+from werkzeug import serving
+
+from benchmark import log_posts
+
+# Default weights of the operations, roughly those of an import posting its
+# logs while operators watch it.
+DEFAULT_MIX = 'create_attempt=1,post_log=6,list_logs=2,list_attempts=1'
+
+# Number of attempts created before the load starts, to post logs to.
+_NUM_INITIAL_ATTEMPTS = 8
+
+
+class Operations:
+    """Operations of the load test against a dashboard API.
+
+    Attributes:
+        url: Base URL of the dashboard API.
+        attempt_ids: IDs of the import attempts created so far.
+    """
+    def __init__(self, url):
+        """Constructs an Operations."""
+        self.url = url
+        self.attempt_ids = []
+        self._lock = threading.Lock()
+
+    def create_attempt(self, rng):
+        """Creates an import attempt."""
+        del rng  # unused
+        attempt_id = uuid.uuid4().hex
+        log_posts.request('PUT', '{}/import/{}'.format(self.url, attempt_id),
+                          {'import_name': 'load-test'})
+        with self._lock:
+            self.attempt_ids.append(attempt_id)
+
+    def _attempt_id(self, rng):
+        with self._lock:
+            return rng.choice(self.attempt_ids)
+
+    def post_log(self, rng):
+        """Posts a log to a random import attempt."""
+        log_posts.request(
+            'POST', '{}/import/{}/logs'.format(self.url, self._attempt_id(rng)),
+            {
+                'level': 'info',
+                'message': 'load test log'
+            })
+
+    def list_logs(self, rng):
+        """Lists the first page of logs of a random import attempt."""
+        log_posts.request(
+            'GET', '{}/import/{}/logs?limit=100'.format(self.url,
+                                                        self._attempt_id(rng)))
+
+    def list_attempts(self, rng):
+        """Lists the first page of import attempts of the load test."""
+        del rng  # unused
+        log_posts.request('GET', '{}/imports?limit=100'.format(self.url),
+                          {'import_name': 'load-test'})
+
+
+def parse_mix(mix):
+    """Parses a mix of operations, e.g. 'post_log=3,list_logs=1', into a
+    dict from operation name to weight.
+
+    Raises:
+        ValueError: The mix is malformed or has an unknown operation.
+    """
+    weights = {}
+    for item in mix.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if not hasattr(Operations, name) or name.startswith('_'):
+            raise ValueError('Unknown operation {}'.format(name))
+        try:
+            weights[name] = float(weight)
+        except ValueError:
+            raise ValueError('Weight of {} is not a number: {!r}'.format(
+                name, weight)) from None
+        if weights[name] < 0:
+            raise ValueError('Weight of {} is negative'.format(name))
+    if not any(weights.values()):
+        raise ValueError('No operation has a positive weight')
+    return weights
+
+
+def _summarize(latencies, errors, elapsed):
+    """Returns the throughput and latency percentiles of requests."""
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'error_rate': errors / len(latencies) if latencies else 0,
+        'requests_per_second': len(latencies) / elapsed if elapsed else 0,
+        'p50_ms': log_posts.percentile(latencies, 0.5) * 1000,
+        'p99_ms': log_posts.percentile(latencies, 0.99) * 1000,
+    }
+
+
+def run(url, num_requests, concurrency, weights, seed=0):
+    """Sends num_requests requests from concurrency threads.
+
+    Args:
+        url: Base URL of the dashboard API.
+        num_requests: Number of requests to send.
+        concurrency: Number of concurrent clients.
+        weights: Dict from operation name to weight, see parse_mix.
+        seed: Seed of the random choices of operations.
+
+    Returns:
+        Dict with the summary of all the requests under 'overall' and of
+        the requests of each operation under its name. A summary has the
+        number of requests and errors, the fraction of requests that
+        failed, the throughput in requests per second, and the p50 and p99
+        latencies in milliseconds.
+    """
+    operations = Operations(url)
+    for _ in range(_NUM_INITIAL_ATTEMPTS):
+        operations.create_attempt(None)
+    names = sorted(weights)
+    name_weights = [weights[name] for name in names]
+
+    def client(index, count):
+        rng = random.Random(seed * 1000003 + index)
+        results = []
+        for name in rng.choices(names, weights=name_weights, k=count):
+            start = time.perf_counter()
+            try:
+                getattr(operations, name)(rng)
+                failed = False
+            except Exception:  # pylint: disable=broad-except
+                # Any failure, not only HTTP errors, is counted rather than
+                # ending the run.
+                failed = True
+            results.append((name, time.perf_counter() - start, failed))
+        return results
+
+    counts = [
+        num_requests // concurrency + (index < num_requests % concurrency)
+        for index in range(concurrency)
+    ]
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as executor:
+        results = executor.map(client, range(concurrency), counts)
+        results = [result for client_results in results
+                   for result in client_results]
+    elapsed = time.perf_counter() - start
+
+    latencies = collections.defaultdict(list)
+    errors = collections.Counter()
+    for name, latency, failed in results:
+        latencies[name].append(latency)
+        errors[name] += failed
+    summary = {
+        'overall':
+            _summarize([latency for _, latency, _ in results],
+                       sum(errors.values()), elapsed)
+    }
+    for name in names:
+        summary[name] = _summarize(latencies[name], errors[name], elapsed)
+    return summary
+
+
+def check_gates(summary, max_error_rate=0, max_p99_ms=None):
+    """Returns the reasons why a run fails its gates, as a list of strings,
+    empty if it passes.
+
+    Args:
+        summary: Summary of the run returned by run.
+        max_error_rate: Highest fraction of the requests allowed to fail.
+        max_p99_ms: Highest overall p99 latency allowed in milliseconds, or
+            None for no limit.
+    """
+    overall = summary['overall']
+    failures = []
+    if overall['error_rate'] > max_error_rate:
+        failures.append('error rate {:.4f} above {}'.format(
+            overall['error_rate'], max_error_rate))
+    if max_p99_ms and overall['p99_ms'] > max_p99_ms:
+        failures.append('p99 latency above {} ms'.format(max_p99_ms))
+    return failures
+
+
+def start_emulator(port):
+    """Starts the Datastore emulator on a port, points the Datastore clients
+    at it, and returns its process."""
+    command = [
+        'gcloud', 'beta', 'emulators', 'datastore', 'start',
+        '--no-store-on-disk', '--consistency=1.0',
+        '--host-port=localhost:{}'.format(port)
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.PIPE)
+    for line in process.stderr:
+        if b'Dev App Server is now running' in line:
+            break
+    else:
+        raise RuntimeError('The Datastore emulator failed to start')
+    # Keeps reading the output, so that the emulator never blocks on it.
+    threading.Thread(target=process.stderr.read, daemon=True).start()
+    os.environ['DATASTORE_EMULATOR_HOST'] = 'localhost:{}'.format(port)
+    return process
+
+
+class _QuietRequestHandler(serving.WSGIRequestHandler):
+    """Request handler that does not log every request."""
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def serve():
+    """Serves the dashboard API in a background thread of this process and
+    returns the server and its base URL."""
+    # Imported here so that the clients are created after the environment
+    # is set up.
+    from app import main  # pylint: disable=import-outside-toplevel
+    app = main.create_app(logging=False)
+    main.create_api(app)
+    server = serving.make_server('localhost', 0, app, threaded=True,
+                                 request_handler=_QuietRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, 'http://localhost:{}'.format(server.server_port)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--url',
+                        help='Base URL of a running dashboard API. If '
+                        'absent, the API is served by this process.')
+    parser.add_argument('--backend', choices=('datastore', 'memory'),
+                        default='datastore',
+                        help='Datastore backend of the API served by this '
+                        'process.')
+    parser.add_argument('--emulator_port', type=int, default=8081,
+                        help='Port of the Datastore emulator started if '
+                        'DATASTORE_EMULATOR_HOST is not set.')
+    parser.add_argument('--requests', type=int, default=1000,
+                        help='Number of requests to send.')
+    parser.add_argument('--concurrency', type=int, default=16,
+                        help='Number of concurrent clients.')
+    parser.add_argument('--mix', default=DEFAULT_MIX,
+                        help='Comma-separated weights of the operations.')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the random choices of operations.')
+    parser.add_argument('--max_p99_ms', type=float,
+                        help='Fail if the overall p99 latency in '
+                        'milliseconds is higher.')
+    parser.add_argument('--max_error_rate', type=float, default=0,
+                        help='Fail if the overall fraction of requests '
+                        'that failed is higher.')
+    parser.add_argument('--output',
+                        help='Path to write the results to as JSON.')
+    args = parser.parse_args()
+    try:
+        weights = parse_mix(args.mix)
+    except ValueError as error:
+        parser.error('--mix: {}'.format(error))
+
+    emulator = None
+    server = None
+    url = args.url
+    try:
+        if not url:
+            os.environ['DASHBOARD_DATASTORE_BACKEND'] = args.backend
+            if (args.backend == 'datastore' and
+                    'DATASTORE_EMULATOR_HOST' not in os.environ):
+                emulator = start_emulator(args.emulator_port)
+            server, url = serve()
+        summary = run(url, args.requests, args.concurrency, weights,
+                      args.seed)
+    finally:
+        if server:
+            server.shutdown()
+        if emulator:
+            emulator.terminate()
+
+    for name, result in summary.items():
+        print('{name:>14}: {requests} requests, {errors} errors, '
+              '{requests_per_second:.1f} requests/s, p50 {p50_ms:.1f} ms, '
+              'p99 {p99_ms:.1f} ms'.format(name=name, **result))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(summary, output, indent=2, sort_keys=True)
+    failures = check_gates(summary, args.max_error_rate, args.max_p99_ms)
+    for failure in failures:
+        print(failure)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
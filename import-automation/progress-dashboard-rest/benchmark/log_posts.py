@@ -0,0 +1,132 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmarks concurrent log posts to a running dashboard API.
+
+An import attempt is created, then logs are posted to
+'/import/<attempt_id>/logs' from a number of concurrent clients, and the
+throughput and latency percentiles are printed. With --batch_size, logs
+are posted to '/import/<attempt_id>/logs/batch' that many at a time.
+
+To benchmark against a local Datastore emulator, in the
+progress-dashboard-rest directory:
+
+    gcloud beta emulators datastore start --no-store-on-disk &
+    $(gcloud beta emulators datastore env-init)
+    gunicorn -c gunicorn.conf.py app.main:FLASK_APP &
+    python3 -m benchmark.log_posts --url=http://localhost:8080
+"""
+
+import argparse
+import concurrent.futures
+import json
+import time
+import urllib.request
+import uuid
+
+
+def request(method, url, body=None):
+    """Sends a JSON request and returns the decoded JSON response."""
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method,
+                                 headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req) as response:
+        return json.loads(response.read())
+
+
+def percentile(sorted_values, fraction):
+    """Returns the value at fraction of a sorted list, e.g. 0.99 for p99."""
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def post_log(url, attempt_id, index):
+    """Posts a log and returns the latency of the request in seconds."""
+    start = time.perf_counter()
+    request('POST', '{}/import/{}/logs'.format(url, attempt_id), {
+        'level': 'info',
+        'message': 'benchmark log {}'.format(index)
+    })
+    return time.perf_counter() - start
+
+
+def post_log_batch(url, attempt_id, start_index, batch_size):
+    """Posts a batch of logs and returns the latency of the request in
+    seconds."""
+    start = time.perf_counter()
+    request('POST', '{}/import/{}/logs/batch'.format(url, attempt_id), [{
+        'level': 'info',
+        'message': 'benchmark log {}'.format(index)
+    } for index in range(start_index, start_index + batch_size)])
+    return time.perf_counter() - start
+
+
+def run(url, num_logs, concurrency, batch_size=0):
+    """Posts num_logs logs to a new import attempt from concurrency threads.
+
+    Args:
+        url: Base URL of the dashboard API.
+        num_logs: Number of logs to post.
+        concurrency: Number of concurrent clients.
+        batch_size: Number of logs per request to the batch endpoint. 0 to
+            post the logs one at a time.
+
+    Returns:
+        Dict with the throughput in requests and logs per second and the
+        p50 and p99 latencies of the requests in milliseconds.
+    """
+    attempt_id = uuid.uuid4().hex
+    request('PUT', '{}/import/{}'.format(url, attempt_id),
+            {'import_name': 'benchmark'})
+    if batch_size:
+        starts = range(0, num_logs, batch_size)
+        post = lambda index: post_log_batch(
+            url, attempt_id, index, min(batch_size, num_logs - index))
+    else:
+        starts = range(num_logs)
+        post = lambda index: post_log(url, attempt_id, index)
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as executor:
+        latencies = sorted(executor.map(post, starts))
+    elapsed = time.perf_counter() - start
+    return {
+        'requests_per_second': len(starts) / elapsed,
+        'logs_per_second': num_logs / elapsed,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--url', default='http://localhost:8080',
+                        help='Base URL of the dashboard API.')
+    parser.add_argument('--logs', type=int, default=1000,
+                        help='Number of logs to post.')
+    parser.add_argument('--concurrency', type=int, default=32,
+                        help='Number of concurrent clients.')
+    parser.add_argument('--batch_size', type=int, default=0,
+                        help='Number of logs per request to the batch '
+                        'endpoint. 0 to post logs one at a time.')
+    args = parser.parse_args()
+    result = run(args.url, args.logs, args.concurrency, args.batch_size)
+    print('{requests_per_second:.1f} requests/s, {logs_per_second:.1f} '
+          'logs/s, p50 {p50_ms:.1f} ms, p99 {p99_ms:.1f} ms'.format(**result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Gunicorn configuration of the dashboard API.
+
+Requests spend most of their time waiting on Datastore, so each worker
+process serves requests on a pool of threads. While a thread waits on the
+network, the others keep serving. Each request uses a Datastore client
+checked out of a pool shared by the threads of its worker, see
+app.utils.create_datastore_client.
+
+Each worker creates its own Datastore clients on first use, never sharing
+them with the master or other workers, see app.utils.get_client_pool.
+
+The number of workers and threads per worker can be set with the
+DASHBOARD_WORKERS and DASHBOARD_THREADS environment variables.
+
+A request tailing logs holds its thread for up to
+app.resource.import_log.TAIL_TIMEOUT seconds. Each worker serves at most
+DASHBOARD_MAX_TAILS such requests at once, 4 by default, so that the other
+threads keep serving the rest of the API. Keep it well below
+DASHBOARD_THREADS.
+"""
+
+import os
+
+bind = ':' + os.environ.get('PORT', '8080')
+worker_class = 'gthread'
+workers = int(os.environ.get('DASHBOARD_WORKERS', '2'))
+threads = int(os.environ.get('DASHBOARD_THREADS', '16'))
@@ -118,3 +118,92 @@ class BaseDatabaseTest(unittest.TestCase):
         self.assertIn(entity_1, retrieved)
         self.assertIn(entity_2, retrieved)
         self.assertEqual(2, len(retrieved))
+
+    def test_filter_page(self):
+        """Tests that filter_page pages through the entities that pass
+        the filter."""
+        for i in range(5):
+            entity = self.database.get(make_new=True)
+            entity.update({'import_name': 'paged', 'pr_number': i})
+            self.database.save(entity)
+
+        retrieved = []
+        cursor = None
+        for _ in range(3):
+            page, cursor = self.database.filter_page(
+                {'import_name': 'paged'}, limit=2, cursor=cursor)
+            self.assertLessEqual(len(page), 2)
+            retrieved.extend(page)
+        self.assertEqual(list(range(5)),
+                         sorted(entity['pr_number'] for entity in retrieved))
+
+    def test_iterate_pages(self):
+        """Tests that iterate_pages yields all the entities that pass the
+        filter, a page at a time."""
+        for i in range(5):
+            entity = self.database.get(make_new=True)
+            entity.update({'import_name': 'iterated', 'pr_number': i})
+            self.database.save(entity)
+
+        pages = list(self.database.iterate_pages({'import_name': 'iterated'},
+                                                 limit=2))
+        self.assertEqual([2, 2, 1], [len(page) for page in pages])
+        self.assertEqual(list(range(5)),
+                         sorted(entity['pr_number']
+                                for page in pages for entity in page))
+
+    def test_filter_page_projection(self):
+        """Tests that filter_page only retrieves the projected fields, or
+        only the keys."""
+        entity = self.database.get(make_new=True)
+        entity.update({'import_name': 'projected', 'pr_number': 1})
+        self.database.save(entity)
+
+        page, _ = self.database.filter_page({'import_name': 'projected'},
+                                            projection=['pr_number'])
+        self.assertEqual(
+            {'pr_number': 1, self.id_field: entity[self.id_field]},
+            dict(page[0]))
+
+        page, _ = self.database.filter_page({'import_name': 'projected'},
+                                            keys_only=True)
+        self.assertEqual({self.id_field: entity[self.id_field]},
+                         dict(page[0]))
+
+    def test_save_multi_then_get_multi(self):
+        """Tests that entities saved in a batch can be retrieved in a batch,
+        in the order of the IDs, with None for IDs that do not exist."""
+        entities = [self.database.get(make_new=True) for _ in range(3)]
+        for i, entity in enumerate(entities):
+            entity['pr_number'] = i
+        self.database.save_multi(entities)
+
+        ids = [entity[self.id_field] for entity in entities]
+        retrieved = self.database.get_multi(
+            [ids[2], 'does-not-exist', ids[0], ids[1]])
+        self.assertEqual([entities[2], None, entities[0], entities[1]],
+                         retrieved)
+
+    def test_get_multi_after_save(self):
+        """Tests that get_multi does not return entities cached before they
+        were saved again."""
+        entity = self.database.get(make_new=True)
+        entity['pr_number'] = 0
+        self.database.save(entity)
+        entity_id = entity[self.id_field]
+        self.database.get_multi([entity_id])
+
+        entity['pr_number'] = 1
+        self.database.save_multi([entity])
+        self.assertEqual(1,
+                         self.database.get_multi([entity_id])[0]['pr_number'])
+
+    def test_save_multi_partial_key(self):
+        """Tests that save_multi saves nothing if an entity has a partial
+        key."""
+        entity = self.database.get(make_new=True)
+        partial = datastore.Entity(
+            datastore.Key('namespace', project='project'))
+        self.assertRaises(ValueError, self.database.save_multi,
+                          [entity, partial])
+        self.assertIsNone(self.database.get(entity[self.id_field]))
@@ -0,0 +1,149 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for cache.py.
+"""
+
+import fnmatch
+import unittest
+from unittest import mock
+
+from app.service import cache
+
+
+class FakeClock:
+    """Clock whose time only changes when set."""
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRedis:
+    """Redis client storing keys in a dict, without expiration."""
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, px=None):
+        del px
+        self.data[key] = value
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def scan_iter(self, match):
+        return [key for key in list(self.data) if fnmatch.fnmatch(key, match)]
+
+    def dbsize(self):
+        return len(self.data)
+
+
+class LRUCacheTest(unittest.TestCase):
+    """Tests for LRUCache."""
+
+    def setUp(self):
+        """Test setup that runs before every test."""
+        self.clock = FakeClock()
+        self.cache = cache.LRUCache(max_size=2, ttl=10, clock=self.clock)
+
+    def test_set_then_get(self):
+        """Tests that a value set can be got, as a copy."""
+        value = {'foo': ['bar']}
+        self.cache.set('key', value)
+        value['foo'].append('baz')
+        got = self.cache.get('key')
+        self.assertEqual({'foo': ['bar']}, got)
+        got['foo'].append('baz')
+        self.assertEqual({'foo': ['bar']}, self.cache.get('key'))
+
+    def test_expired(self):
+        """Tests that entries expire after the time to live."""
+        self.cache.set('key', 'value')
+        self.clock.now = 9
+        self.assertEqual('value', self.cache.get('key'))
+        self.clock.now = 10
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(0, self.cache.size())
+
+    def test_evicts_least_recently_used(self):
+        """Tests that the least recently used entry is evicted when the
+        cache is full."""
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.assertEqual(1, self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(3, self.cache.get('c'))
+
+    def test_delete(self):
+        """Tests that deleted entries are absent."""
+        self.cache.set('key', 'value')
+        self.cache.delete('key')
+        self.cache.delete('absent')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_stats(self):
+        """Tests that hits, misses, and evictions are counted."""
+        self.cache.set('a', 1)
+        self.cache.get('a')
+        self.cache.get('b')
+        self.cache.get('a')
+        self.cache.set('b', 2)
+        self.cache.set('c', 3)
+        self.assertEqual(
+            {
+                'hits': 2,
+                'misses': 1,
+                'evictions': 1,
+                'hit_rate': 2 / 3,
+                'size': 2
+            }, self.cache.stats.to_dict(self.cache.size()))
+
+
+class RedisCacheTest(unittest.TestCase):
+    """Tests for RedisCache using a FakeRedis."""
+
+    def setUp(self):
+        """Test setup that runs before every test."""
+        self.client = FakeRedis()
+        redis = mock.Mock()
+        redis.Redis.from_url.return_value = self.client
+        with mock.patch.object(cache, 'redis', redis):
+            self.cache = cache.RedisCache('redis://localhost:6379/0',
+                                          ttl=10,
+                                          prefix='dashboard')
+
+    def test_set_then_get(self):
+        """Tests that a value set can be got under the prefix."""
+        self.cache.set('key', {'foo': 'bar'})
+        self.assertEqual({'foo': 'bar'}, self.cache.get('key'))
+        self.assertIn('dashboard:key', self.client.data)
+
+    def test_size_counts_prefix_only(self):
+        """Tests that size and clear only count and remove the entries of
+        the cache, not the other keys of the database."""
+        self.client.set('other', b'value')
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.assertEqual(2, self.cache.size())
+        self.cache.clear()
+        self.assertEqual(0, self.cache.size())
+        self.assertEqual(1, self.client.dbsize())
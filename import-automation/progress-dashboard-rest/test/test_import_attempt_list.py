@@ -16,14 +16,18 @@
 Tests for import_attempt_list.py.
 """
 
+import http
 import unittest
 from unittest import mock
 
+import flask
+
 from test import utils
 from app.resource import import_attempt_list
 from app.resource import system_run_list
 from app.model import system_run_model
 from app.model import import_attempt_model
+from app import utils as app_utils
 
 _ATTEMPT = import_attempt_model.ImportAttemptModel
 _RUN = system_run_model.SystemRunModel
@@ -99,3 +103,13 @@ class ImportAttemptListTest(unittest.TestCase):
         posted = self.resource.post()
         self.assertNotEqual(to_post[_ATTEMPT.attempt_id],
                             posted[_ATTEMPT.attempt_id])
+
+    def test_list_limit_not_positive(self):
+        """Tests that listing import attempts with a limit less than 1
+        returns BAD_REQUEST."""
+        for limit in ('0', '-1'):
+            with flask.Flask(__name__).test_request_context(
+                    '/imports', query_string={'limit': limit}):
+                self.assertEqual(
+                    (app_utils.LIMIT_ERROR, http.HTTPStatus.BAD_REQUEST),
+                    import_attempt_list.list_page(self.resource.database, {}))
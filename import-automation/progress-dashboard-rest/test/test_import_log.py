@@ -16,17 +16,31 @@
 Tests for import_log.py.
 """
 
+import threading
 import unittest
 from unittest import mock
 
+import flask
+
 from app.resource import import_attempt, import_log
 from app.service import import_attempt_database_dict
+from app.service import memory_datastore
 from app import utils
 
 
 PARSE_ARGS = 'flask_restful.reqparse.RequestParser.parse_args'
 IMPORT_ATTEMPT_DATABASE = 'app.resource.import_attempt' \
                           '.import_attempt_database.ImportAttemptDatabase'
+CREATE_DATASTORE_CLIENT = 'app.utils.create_datastore_client'
+
+
+def _use_memory_client(test):
+    """Makes the resources of a test store the logs in a MemoryClient with
+    an empty store, instead of a pooled Datastore client."""
+    client = memory_datastore.MemoryClient()
+    patcher = mock.patch(CREATE_DATASTORE_CLIENT, lambda: client)
+    patcher.start()
+    test.addCleanup(patcher.stop)
 
 
 @mock.patch(IMPORT_ATTEMPT_DATABASE,
@@ -35,8 +49,9 @@ class ImportLogTest(unittest.TestCase):
     """Tests for ImportLog."""
 
     def setUp(self):
-        """Clears the database before every test."""
+        """Clears the databases before every test."""
         import_attempt_database_dict.ImportAttemptDatabaseDict.reset()
+        _use_memory_client(self)
 
     @mock.patch(PARSE_ARGS)
     def test_post_then_get(self, parse_args):
@@ -58,8 +73,15 @@ class ImportLogTest(unittest.TestCase):
 
         logs = log_api.get(attempt_id)
         self.assertEqual(2, len(logs))
-        self.assertIn(log_0, logs)
-        self.assertIn(log_1, logs)
+        self.assertEqual([log_0[field] for field in ('level', 'message')],
+                         [logs[0][field] for field in ('level', 'message')])
+        self.assertEqual(log_1, {
+            field: logs[1][field]
+            for field in ('level', 'message', 'time_logged')
+        })
+        self.assertEqual([attempt_id] * 2,
+                         [log['attempt_id'] for log in logs])
+        self.assertEqual([1, 2], [log['sequence'] for log in logs])
 
     @mock.patch(PARSE_ARGS)
     def test_log_level_not_allowed(self, parse_args):
@@ -80,6 +102,19 @@ class ImportLogTest(unittest.TestCase):
         _, err = log_api.get('9999')
         self.assertEqual(404, err)
 
+    @mock.patch(PARSE_ARGS, lambda self: {'import_name': 'name'})
+    def test_get_limit_not_positive(self):
+        """Tests that querying the logs of an attempt with a limit less than
+        1 returns BAD REQUEST."""
+        attempt_api = import_attempt.ImportAttemptByID()
+        attempt_api.put('0')
+        log_api = import_log.ImportLog()
+        for limit in ('0', '-1'):
+            with flask.Flask(__name__).test_request_context(
+                    '/import/0/logs', query_string={'limit': limit}):
+                _, err = log_api.get('0')
+            self.assertEqual(400, err)
+
     @mock.patch(PARSE_ARGS, lambda self: {'import_name': 'name'})
     def test_get_empty(self):
         """Tests that querying the logs of an attempt that does not have any
@@ -90,3 +125,144 @@ class ImportLogTest(unittest.TestCase):
         log_api = import_log.ImportLog()
         logs = log_api.get(attempt_id)
         self.assertEqual([], logs)
+
+
+class ValidateLogsTest(unittest.TestCase):
+    """Tests for validate_logs."""
+
+    def test_valid(self):
+        """Tests that well-formed logs with allowed levels are valid."""
+        logs = [
+            {'level': 'info', 'message': 'first'},
+            {'level': 'severe', 'message': 'second',
+             'time_logged': utils.utctime()}
+        ]
+        self.assertIsNone(import_log.validate_logs(logs))
+
+    def test_not_a_list(self):
+        """Tests that a body that is not a non-empty list returns
+        BAD REQUEST."""
+        for body in (None, {}, [], {'level': 'info', 'message': 'message'}):
+            _, err = import_log.validate_logs(body)
+            self.assertEqual(400, err)
+
+    def test_malformed(self):
+        """Tests that logs without level or message return BAD REQUEST
+        with the indexes of the logs."""
+        logs = [{'level': 'info', 'message': 'ok'}, {'level': 'info'}, 'log']
+        message, err = import_log.validate_logs(logs)
+        self.assertEqual(400, err)
+        self.assertIn('[1, 2]', message)
+
+    def test_level_not_allowed(self):
+        """Tests that logs with levels that are not allowed return
+        FORBIDDEN."""
+        logs = [{'level': 'info', 'message': 'ok'},
+                {'level': 'nooooo', 'message': 'message'}]
+        message, err = import_log.validate_logs(logs)
+        self.assertEqual(403, err)
+        self.assertIn('[1]', message)
+
+    def test_too_many(self):
+        """Tests that batches larger than the maximum batch size are
+        rejected."""
+        logs = [{'level': 'info', 'message': 'ok'}] * 500
+        _, err = import_log.validate_logs(logs)
+        self.assertEqual(413, err)
+
+
+class TailLogsTest(unittest.TestCase):
+    """Tests for tail_logs."""
+
+    def setUp(self):
+        """Creates a log database with two logs before every test."""
+        self.logs = [{'sequence': 1}, {'sequence': 2}]
+        self.log_database = mock.Mock()
+        self.log_database.count.side_effect = lambda _: len(self.logs)
+        self.log_database.list.side_effect = (
+            lambda _, since: self.logs[since:])
+        self.now = 0
+
+    def _sleep(self, seconds):
+        self.now += seconds
+
+    def _tail(self, since, timeout):
+        return import_log.tail_logs(self.log_database, 'attempt', since,
+                                    timeout, clock=lambda: self.now,
+                                    sleep=self._sleep)
+
+    def test_existing_logs(self):
+        """Tests that logs already posted after since are returned first."""
+        pages = self._tail(since=1, timeout=0)
+        self.assertEqual([{'sequence': 2}], next(pages))
+        self.assertEqual([], list(pages))
+
+    def test_new_logs(self):
+        """Tests that logs posted while waiting are returned, and that the
+        logs are only listed when there are new ones."""
+        pages = self._tail(since=2, timeout=10)
+        self.assertEqual([], next(pages))
+        self.assertEqual([], next(pages))
+        self.logs.append({'sequence': 3})
+        self.assertEqual([{'sequence': 3}], next(pages))
+        self.assertEqual(1, self.log_database.list.call_count)
+
+    def test_timeout(self):
+        """Tests that waiting stops after the timeout."""
+        pages = list(self._tail(since=2, timeout=3))
+        self.assertEqual([[], [], []], pages)
+        self.assertEqual(3, self.now)
+
+
+class ImportLogTailTest(unittest.TestCase):
+    """Tests for ImportLogTail."""
+
+    @mock.patch(PARSE_ARGS, lambda self: {'import_name': 'name'})
+    def setUp(self):
+        """Creates an attempt before every test."""
+        self.tails = threading.BoundedSemaphore(1)
+        self.log_database = mock.Mock()
+        self.log_database.count.return_value = 0
+        # Class decorators only patch the tests, not setUp.
+        for patcher in (
+                mock.patch(
+                    IMPORT_ATTEMPT_DATABASE,
+                    import_attempt_database_dict.ImportAttemptDatabaseDict),
+                mock.patch(
+                    'app.resource.import_log.import_log_database'
+                    '.ImportLogDatabase', lambda client: self.log_database),
+                mock.patch.object(import_log, '_TAILS', self.tails)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        import_attempt_database_dict.ImportAttemptDatabaseDict.reset()
+        _use_memory_client(self)
+        import_attempt.ImportAttemptByID().put('0')
+
+    def _get(self, **headers):
+        """Tails the logs of the attempt without waiting for new ones."""
+        tail_api = import_log.ImportLogTail()
+        with flask.Flask(__name__).test_request_context(
+                '/import/0/logs/tail', query_string={'timeout': 0},
+                headers=headers):
+            return tail_api.get('0')
+
+    def test_too_many_tails(self):
+        """Tests that tails past the limit of the worker return
+        SERVICE UNAVAILABLE with a Retry-After header."""
+        self.tails.acquire()
+        _, err, headers = self._get()
+        self.assertEqual(503, err)
+        self.assertEqual(str(import_log.TAILS_RETRY_AFTER),
+                         headers['Retry-After'])
+
+    def test_releases_tails(self):
+        """Tests that a long poll ends its tail when it returns, and an
+        event stream when the response is closed."""
+        self.assertEqual([], self._get())
+        self.assertTrue(self.tails.acquire(blocking=False))
+        self.tails.release()
+
+        response = self._get(Accept=import_log.EVENT_STREAM_MIMETYPE)
+        self.assertFalse(self.tails.acquire(blocking=False))
+        response.close()
+        self.assertTrue(self.tails.acquire(blocking=False))
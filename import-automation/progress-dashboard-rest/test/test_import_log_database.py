@@ -0,0 +1,211 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for import_log_database.py.
+
+The Datastore emulator must be installed. See
+https://cloud.google.com/datastore/docs/tools/datastore-emulator#before_you_begin
+for requirements.
+"""
+
+import itertools
+import threading
+import unittest
+from unittest import mock
+
+from google.cloud import datastore
+
+from app.model import import_attempt_model
+from app.model import import_log_model
+from app.service import import_attempt_database
+from app.service import import_log_database
+from app.service import memory_datastore
+from test import utils
+
+_ATTEMPT = import_attempt_model.ImportAttemptModel
+_MODEL = import_log_model.ImportLogModel
+
+
+class ImportLogDatabaseTest(unittest.TestCase):
+    """Tests for ImportLogDatabase."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.emulator = utils.start_emulator()
+
+    @classmethod
+    def tearDownClass(cls):
+        utils.terminate_emulator(cls.emulator)
+
+    @mock.patch('app.utils.create_datastore_client',
+                utils.create_test_datastore_client)
+    def setUp(self):
+        """Test setup that runs before every test."""
+        self.database = import_log_database.ImportLogDatabase()
+
+    def test_append_then_list(self):
+        """Tests that appended logs are listed in order with their
+        sequences."""
+        self.database.append('attempt-0', [{_MODEL.message: 'first'}])
+        self.database.append('attempt-0', [{_MODEL.message: 'second'},
+                                           {_MODEL.message: 'third'}])
+        self.database.append('attempt-1', [{_MODEL.message: 'other'}])
+
+        logs = self.database.list('attempt-0')
+        self.assertEqual(['first', 'second', 'third'],
+                         [log[_MODEL.message] for log in logs])
+        self.assertEqual([1, 2, 3], [log[_MODEL.sequence] for log in logs])
+        for log in logs:
+            self.assertEqual('attempt-0', log[_MODEL.attempt_id])
+
+    def test_list_pages(self):
+        """Tests that since and limit page through the logs."""
+        self.database.append('attempt-0', [{_MODEL.message: str(i)}
+                                           for i in range(5)])
+        first = self.database.list('attempt-0', limit=2)
+        self.assertEqual([1, 2], [log[_MODEL.sequence] for log in first])
+        second = self.database.list('attempt-0', since=2, limit=2)
+        self.assertEqual([3, 4], [log[_MODEL.sequence] for log in second])
+        last = self.database.list('attempt-0', since=4)
+        self.assertEqual([5], [log[_MODEL.sequence] for log in last])
+
+    def test_list_empty(self):
+        """Tests that an attempt without logs has an empty list of logs."""
+        self.assertEqual([], self.database.list('does-not-exist'))
+
+    def test_iterate_pages(self):
+        """Tests that iterate_pages yields all the logs after since, a page
+        at a time."""
+        self.database.append('attempt-0', [{_MODEL.message: str(i)}
+                                           for i in range(5)])
+        pages = list(self.database.iterate_pages('attempt-0', since=1,
+                                                 limit=2))
+        self.assertEqual([[2, 3], [4, 5]],
+                         [[log[_MODEL.sequence] for log in page]
+                          for page in pages])
+
+
+class ImportLogDatabaseMemoryTest(unittest.TestCase):
+    """Tests for ImportLogDatabase using a MemoryClient."""
+
+    def setUp(self):
+        """Creates databases with an empty store before every test."""
+        self.client = memory_datastore.MemoryClient()
+        self.database = import_log_database.ImportLogDatabase(self.client)
+
+    def test_concurrent_appends(self):
+        """Tests that concurrent appends to the same attempt all succeed,
+        each with its own sequence."""
+        num_threads = 16
+        num_appends = 20
+        errors = []
+
+        def append(thread):
+            try:
+                for i in range(num_appends):
+                    self.database.append(
+                        'attempt-0',
+                        [{_MODEL.message: '{}-{}'.format(thread, i)}])
+            except Exception as err:  # pylint: disable=broad-except
+                errors.append(err)
+
+        threads = [
+            threading.Thread(target=append, args=(thread,))
+            for thread in range(num_threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([], errors)
+        total = num_threads * num_appends
+        self.assertEqual(total, self.database.count('attempt-0'))
+        logs = list(itertools.chain.from_iterable(
+            self.database.iterate_pages('attempt-0')))
+        self.assertEqual(list(range(1, total + 1)),
+                         [log[_MODEL.sequence] for log in logs])
+
+    def test_limit_not_positive(self):
+        """Tests that listing logs with a limit less than 1 raises
+        ValueError."""
+        self.assertRaises(ValueError, self.database.list, 'attempt-0',
+                          limit=0)
+        self.assertRaises(ValueError, list,
+                          self.database.iterate_pages('attempt-0', limit=-1))
+
+    def test_concurrent_batches(self):
+        """Tests that concurrent batches appended to the same attempt are
+        each appended whole, in consecutive sequences."""
+        num_threads = 8
+        batch_size = 50
+        errors = []
+
+        def append(thread):
+            try:
+                self.database.append('attempt-0', [{
+                    _MODEL.message: str(thread)
+                } for _ in range(batch_size)])
+            except Exception as err:  # pylint: disable=broad-except
+                errors.append(err)
+
+        threads = [
+            threading.Thread(target=append, args=(thread,))
+            for thread in range(num_threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([], errors)
+        logs = list(itertools.chain.from_iterable(
+            self.database.iterate_pages('attempt-0')))
+        self.assertEqual(num_threads * batch_size, len(logs))
+        for start in range(0, len(logs), batch_size):
+            batch = logs[start:start + batch_size]
+            self.assertEqual(1, len(set(log[_MODEL.message] for log in batch)))
+
+    def test_migrate_embedded_logs(self):
+        """Tests that the logs embedded in an attempt are moved to log
+        entities ahead of the logs appended after them."""
+        attempt_database = import_attempt_database.ImportAttemptDatabase(
+            self.client)
+        attempt_database.cache = None
+        attempt = attempt_database.get(make_new=True)
+        embedded = []
+        for i in range(import_log_database.MAX_BATCH_SIZE + 1):
+            log = datastore.Entity(exclude_from_indexes=(_MODEL.message,))
+            log.update({_MODEL.level: 'info', _MODEL.message: str(i)})
+            embedded.append(log)
+        attempt[_ATTEMPT.logs] = embedded
+        attempt_database.save(attempt)
+        attempt_id = attempt[_ATTEMPT.attempt_id]
+
+        self.assertEqual(
+            len(embedded),
+            self.database.migrate_embedded_logs(attempt_database, attempt_id))
+        self.assertEqual(
+            0,
+            self.database.migrate_embedded_logs(attempt_database, attempt_id))
+        self.assertFalse(attempt_database.get(attempt_id)[_ATTEMPT.logs])
+
+        self.database.append(attempt_id, [{_MODEL.message: 'new'}])
+        logs = list(itertools.chain.from_iterable(
+            self.database.iterate_pages(attempt_id)))
+        self.assertEqual([str(i) for i in range(len(embedded))] + ['new'],
+                         [log[_MODEL.message] for log in logs])
+        self.assertEqual(list(range(1, len(embedded) + 2)),
+                         [log[_MODEL.sequence] for log in logs])
@@ -0,0 +1,233 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for import_stats_database.py.
+
+The Datastore emulator must be installed. See
+https://cloud.google.com/datastore/docs/tools/datastore-emulator#before_you_begin
+for requirements.
+"""
+
+import unittest
+from unittest import mock
+
+from app.model import import_attempt_model
+from app.model import system_run_model
+from app.service import import_attempt_database
+from app.service import import_stats_database
+from app.service import memory_datastore
+from app.service import system_run_database
+from test import utils
+
+_ATTEMPT = import_attempt_model.ImportAttemptModel
+_RUN = system_run_model.SystemRunModel
+
+
+class ImportStatsDatabaseTest(unittest.TestCase):
+    """Tests for ImportStatsDatabase."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.emulator = utils.start_emulator()
+
+    @classmethod
+    def tearDownClass(cls):
+        utils.terminate_emulator(cls.emulator)
+
+    @mock.patch('app.utils.create_datastore_client',
+                utils.create_test_datastore_client)
+    def setUp(self):
+        """Test setup that runs before every test."""
+        self.database = import_stats_database.ImportStatsDatabase()
+
+    def test_record_run(self):
+        """Tests that the system runs are counted by status."""
+        created = {_RUN.status: 'created'}
+        self.database.record_run(None, created)
+        self.database.record_run(None, created)
+        self.database.record_run(created, {_RUN.status: 'failed'})
+        self.assertEqual({'statuses': {'created': 1, 'failed': 1}},
+                         self.database.get_system_run_stats())
+
+    def test_record_attempt(self):
+        """Tests that the attempts are counted by status and import, and
+        that the durations of the completed ones are averaged."""
+        created = {
+            _ATTEMPT.import_name: 'cpi-u',
+            _ATTEMPT.status: 'created',
+            _ATTEMPT.time_created: '2020-07-01T00:00:00+00:00'
+        }
+        failed = dict(created)
+        failed[_ATTEMPT.status] = 'failed'
+        failed[_ATTEMPT.time_completed] = '2020-07-01T00:01:00+00:00'
+        other = dict(created)
+        other[_ATTEMPT.import_name] = 'cpi-w'
+        self.database.record_attempt(None, created)
+        self.database.record_attempt(created, failed)
+        self.database.record_attempt(None, other)
+
+        self.assertEqual(
+            {
+                'statuses': {
+                    'created': 1,
+                    'failed': 1
+                },
+                'completed': 1,
+                'average_duration_seconds': 60
+            }, self.database.get_import_stats())
+        self.assertEqual(
+            {
+                'statuses': {
+                    'failed': 1
+                },
+                'completed': 1,
+                'average_duration_seconds': 60
+            }, self.database.get_import_stats('cpi-u'))
+        self.assertEqual({'created': 1},
+                         self.database.get_import_stats('cpi-w')['statuses'])
+
+    def test_record_attempt_renamed(self):
+        """Tests that an attempt whose import_name changes moves to the
+        counter of its new import."""
+        attempt = {_ATTEMPT.import_name: 'ppi', _ATTEMPT.status: 'created'}
+        renamed = {_ATTEMPT.import_name: 'c-ppi', _ATTEMPT.status: 'created'}
+        self.database.record_attempt(None, attempt)
+        self.database.record_attempt(attempt, renamed)
+        self.assertEqual({}, self.database.get_import_stats('ppi')['statuses'])
+        self.assertEqual({'created': 1},
+                         self.database.get_import_stats('c-ppi')['statuses'])
+
+
+class ImportStatsDatabaseMemoryTest(unittest.TestCase):
+    """Tests for ImportStatsDatabase, and for the recording of the runs and
+    attempts saved by SystemRunDatabase and ImportAttemptDatabase, using a
+    MemoryClient."""
+
+    def setUp(self):
+        """Creates databases with an empty store before every test."""
+        self.client = memory_datastore.MemoryClient()
+        self.database = import_stats_database.ImportStatsDatabase(self.client)
+        self.run_database = system_run_database.SystemRunDatabase(self.client)
+        self.attempt_database = import_attempt_database.ImportAttemptDatabase(
+            self.client)
+
+    def _put_before_stats(self, database, fields):
+        """Stores an entity without recording it, like the runs and attempts
+        saved before the statistics were recorded."""
+        entity = database.get(make_new=True)
+        entity.update(fields)
+        self.client.put(entity)
+        return entity
+
+    def test_save_records(self):
+        """Tests that the runs and attempts saved are counted, once, when
+        they are created and when they are modified."""
+        run = self.run_database.get(make_new=True)
+        run[_RUN.status] = 'created'
+        self.run_database.save(run)
+        run[_RUN.status] = 'succeeded'
+        self.run_database.save(run)
+        self.run_database.save(run)
+
+        attempt = self.attempt_database.get(make_new=True)
+        attempt.update({
+            _ATTEMPT.import_name: 'cpi-u',
+            _ATTEMPT.status: 'succeeded',
+            _ATTEMPT.time_created: '2020-07-01T00:00:00+00:00',
+            _ATTEMPT.time_completed: '2020-07-01T00:00:30+00:00'
+        })
+        with self.attempt_database.transaction():
+            self.attempt_database.save(attempt)
+
+        self.assertEqual({'statuses': {'succeeded': 1}},
+                         self.database.get_system_run_stats())
+        self.assertEqual(
+            {
+                'statuses': {
+                    'succeeded': 1
+                },
+                'completed': 1,
+                'average_duration_seconds': 30
+            }, self.database.get_import_stats('cpi-u'))
+
+    @mock.patch('random.randrange', mock.Mock(return_value=0))
+    def test_same_shard_in_transaction(self):
+        """Tests that the attempts saved in one transaction are all counted
+        when their counts are added to the same shard."""
+        with self.attempt_database.transaction():
+            for status in ('created', 'failed'):
+                attempt = self.attempt_database.get(make_new=True)
+                attempt.update({
+                    _ATTEMPT.import_name: 'cpi-u',
+                    _ATTEMPT.status: status
+                })
+                self.attempt_database.save(attempt)
+        self.assertEqual({'created': 1, 'failed': 1},
+                         self.database.get_import_stats('cpi-u')['statuses'])
+        shard = self.client.get(self.client.key(
+            import_stats_database.ImportStatsDatabase.kind, 'imports#0'))
+        self.assertEqual({'status:created': 1, 'status:failed': 1}, shard)
+
+    def test_run_created_before_stats(self):
+        """Tests that a run created before the statistics were recorded and
+        then patched from created to succeeded is not served with a
+        negative count, and is counted once the counters are rebuilt."""
+        self._put_before_stats(self.run_database, {_RUN.status: 'created'})
+        run = self._put_before_stats(self.run_database, {
+            _RUN.status: 'created',
+            _RUN.repo_name: 'data'
+        })
+        run[_RUN.status] = 'succeeded'
+        self.run_database.save(run)
+        self.assertEqual({'statuses': {'succeeded': 1}},
+                         self.database.get_system_run_stats())
+
+        self.database.rebuild(self.run_database, self.attempt_database)
+        self.assertEqual({'statuses': {'created': 1, 'succeeded': 1}},
+                         self.database.get_system_run_stats())
+        run[_RUN.status] = 'failed'
+        self.run_database.save(run)
+        self.assertEqual({'statuses': {'created': 1, 'failed': 1}},
+                         self.database.get_system_run_stats())
+
+    def test_rebuild_attempts(self):
+        """Tests that rebuilding the counters counts the attempts stored, by
+        import, and drops the counters of the imports without attempts."""
+        self._put_before_stats(self.attempt_database, {
+            _ATTEMPT.import_name: 'cpi-u',
+            _ATTEMPT.status: 'failed',
+            _ATTEMPT.time_created: '2020-07-01T00:00:00+00:00',
+            _ATTEMPT.time_completed: '2020-07-01T00:01:00+00:00'
+        })
+        self.database.record_attempt(None, {
+            _ATTEMPT.import_name: 'deleted',
+            _ATTEMPT.status: 'created'
+        })
+
+        self.assertEqual(2, self.database.rebuild(self.run_database,
+                                                  self.attempt_database))
+        expected = {
+            'statuses': {
+                'failed': 1
+            },
+            'completed': 1,
+            'average_duration_seconds': 60
+        }
+        self.assertEqual(expected, self.database.get_import_stats())
+        self.assertEqual(expected, self.database.get_import_stats('cpi-u'))
+        self.assertEqual({}, self.database.get_import_stats('deleted')
+                         ['statuses'])
+        self.assertEqual({'statuses': {}},
+                         self.database.get_system_run_stats())
@@ -0,0 +1,107 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for benchmark/load_test.py.
+"""
+
+import unittest
+
+from benchmark import load_test
+
+
+def _summary(error_rate=0, p99_ms=10):
+    """Returns the summary of a run with the overall error rate and p99
+    latency."""
+    return {'overall': {'error_rate': error_rate, 'p99_ms': p99_ms}}
+
+
+class ParseMixTest(unittest.TestCase):
+    """Tests for parse_mix."""
+
+    def test_parse(self):
+        """Tests that the weights are parsed by operation."""
+        self.assertEqual({
+            'post_log': 3,
+            'list_logs': 0.5
+        }, load_test.parse_mix('post_log=3, list_logs=0.5'))
+
+    def test_default_mix(self):
+        """Tests that the default mix is valid."""
+        self.assertEqual(4, len(load_test.parse_mix(load_test.DEFAULT_MIX)))
+
+    def test_malformed(self):
+        """Tests that unknown operations and weights that are missing, not
+        numbers, or negative are rejected."""
+        for mix in ('delete_all=1', '_attempt_id=1', 'post_log=',
+                    'post_log', 'post_log=often', 'post_log=-1',
+                    'post_log=0'):
+            with self.subTest(mix=mix):
+                self.assertRaises(ValueError, load_test.parse_mix, mix)
+
+
+class SummarizeTest(unittest.TestCase):
+    """Tests for _summarize."""
+
+    def test_summarize(self):
+        """Tests the throughput, error rate, and percentiles."""
+        summary = load_test._summarize([0.004, 0.001, 0.003, 0.002], 1, 2)
+        self.assertEqual(4, summary['requests'])
+        self.assertEqual(1, summary['errors'])
+        self.assertEqual(0.25, summary['error_rate'])
+        self.assertEqual(2, summary['requests_per_second'])
+        self.assertAlmostEqual(3, summary['p50_ms'])
+        self.assertAlmostEqual(4, summary['p99_ms'])
+
+    def test_no_requests(self):
+        """Tests that an operation without requests has rates of zero."""
+        self.assertEqual(
+            {
+                'requests': 0,
+                'errors': 0,
+                'error_rate': 0,
+                'requests_per_second': 0,
+                'p50_ms': 0,
+                'p99_ms': 0
+            }, load_test._summarize([], 0, 0))
+
+
+class CheckGatesTest(unittest.TestCase):
+    """Tests for check_gates."""
+
+    def test_pass(self):
+        """Tests that a run within the limits passes."""
+        self.assertEqual([], load_test.check_gates(_summary()))
+        self.assertEqual([],
+                         load_test.check_gates(_summary(0.01, 10),
+                                               max_error_rate=0.01,
+                                               max_p99_ms=10))
+
+    def test_error_rate(self):
+        """Tests that a run fails if its error rate is above the limit,
+        0 by default."""
+        self.assertEqual(1, len(load_test.check_gates(_summary(0.001))))
+        self.assertEqual(
+            1,
+            len(load_test.check_gates(_summary(0.02), max_error_rate=0.01)))
+
+    def test_p99(self):
+        """Tests that a run fails if its p99 latency is above the limit,
+        if any, and reports both failures."""
+        self.assertEqual(
+            1, len(load_test.check_gates(_summary(p99_ms=11), max_p99_ms=10)))
+        self.assertEqual(
+            2,
+            len(load_test.check_gates(_summary(0.5, 11), max_p99_ms=10)))
+
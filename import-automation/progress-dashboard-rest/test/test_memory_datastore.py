@@ -0,0 +1,199 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for memory_datastore.py.
+"""
+
+import unittest
+from unittest import mock
+
+from google.api_core import exceptions
+from google.cloud import datastore
+
+from app.service import base_database
+from app.service import cache
+from app.service import memory_datastore
+
+
+class MemoryClientTest(unittest.TestCase):
+    """Tests for MemoryClient."""
+
+    def setUp(self):
+        """Creates a client with an empty store before every test."""
+        self.client = memory_datastore.MemoryClient(namespace='namespace')
+
+    def _put(self, name, **fields):
+        entity = datastore.Entity(self.client.key('kind', name))
+        entity.update(fields)
+        self.client.put(entity)
+        return entity
+
+    def test_put_then_get(self):
+        """Tests that entities are saved and retrieved as copies."""
+        entity = self._put('a', foo=['bar'])
+        entity['foo'].append('baz')
+        retrieved = self.client.get(self.client.key('kind', 'a'))
+        self.assertEqual({'foo': ['bar']}, retrieved)
+        self.assertEqual('namespace', retrieved.key.namespace)
+        self.assertIsNone(self.client.get(self.client.key('kind', 'b')))
+
+    def test_put_partial_key(self):
+        """Tests that entities with a partial key are given an ID."""
+        entity = datastore.Entity(self.client.key('kind'))
+        self.client.put(entity)
+        self.assertFalse(entity.key.is_partial)
+        self.assertEqual(entity, self.client.get(entity.key))
+
+    def test_query(self):
+        """Tests equality filters, orders, and pages of queries."""
+        for i in range(5):
+            self._put(str(i), group='even' if i % 2 == 0 else 'odd', number=i)
+        query = self.client.query(kind='kind')
+        query.add_filter('group', '=', 'even')
+        query.order = ['-number']
+        iterator = query.fetch(limit=2)
+        self.assertEqual([4, 2], [entity['number']
+                                  for entity in next(iterator.pages)])
+        iterator = query.fetch(limit=2, start_cursor=iterator.next_page_token)
+        self.assertEqual([0], [entity['number'] for entity in iterator])
+        self.assertIsNone(iterator.next_page_token)
+
+    def test_query_ancestor_and_key(self):
+        """Tests ancestor queries and key filters."""
+        parent = self.client.key('parent', 'p')
+        for i in range(1, 4):
+            self.client.put(
+                datastore.Entity(self.client.key('child', i, parent=parent)))
+        self._put('other')
+        query = self.client.query(kind='child', ancestor=parent)
+        query.add_filter('__key__', '>',
+                         self.client.key('child', 1, parent=parent))
+        query.order = ['__key__']
+        self.assertEqual([2, 3], [entity.key.id for entity in query.fetch()])
+
+    def test_query_projection(self):
+        """Tests projections and keys only queries."""
+        self._put('a', foo=1, bar=2)
+        query = self.client.query(kind='kind', projection=['foo'])
+        self.assertEqual([{'foo': 1}], list(query.fetch()))
+        query = self.client.query(kind='kind')
+        query.keys_only()
+        self.assertEqual([{}], list(query.fetch()))
+
+    def test_transaction(self):
+        """Tests that writes in a transaction are only visible once it
+        commits, and discarded if it fails."""
+        key = self.client.key('kind', 'a')
+        with self.client.transaction():
+            self._put('a', foo=1)
+            self.assertIsNone(self.client.get(key))
+        self.assertEqual({'foo': 1}, self.client.get(key))
+
+        with self.assertRaises(ValueError):
+            with self.client.transaction():
+                self._put('a', foo=2)
+                raise ValueError()
+        self.assertEqual({'foo': 1}, self.client.get(key))
+        self.assertIsNone(self.client.current_transaction)
+
+    def test_transaction_conflict(self):
+        """Tests that a transaction fails if an entity it read is committed
+        by another one before it commits."""
+        key = self.client.key('kind', 'a')
+        self._put('a', count=0)
+        with self.assertRaises(exceptions.Aborted):
+            with self.client.transaction():
+                entity = self.client.get(key)
+                self._put('a', count=10)
+                other = memory_datastore.MemoryClient(
+                    namespace='namespace', store=self.client.store)
+                other_entity = datastore.Entity(key)
+                other_entity['count'] = 5
+                other.put(other_entity)
+                entity['count'] += 1
+                self.client.put(entity)
+        self.assertEqual({'count': 5}, self.client.get(key))
+
+
+class BaseDatabaseMemoryTest(unittest.TestCase):
+    """Tests for BaseDatabase using a MemoryClient."""
+
+    def setUp(self):
+        """Creates a database with an empty store before every test."""
+        self.database = base_database.BaseDatabase(
+            'kind', memory_datastore.MemoryClient(), 'entity_id', cache=None)
+
+    def test_cache_argument(self):
+        """Tests that a database uses the cache shared by the process by
+        default, and no cache if cache is None."""
+        client = memory_datastore.MemoryClient()
+        self.assertIs(cache.get_default_cache(),
+                      base_database.BaseDatabase('kind', client).cache)
+        self.assertIsNone(self.database.cache)
+
+    def test_save_then_get(self):
+        """Tests that a new entity can be saved and then retrieved, alone
+        or in a batch."""
+        entity = self.database.get(make_new=True)
+        entity['foo'] = 'bar'
+        self.database.save(entity)
+        entity_id = entity['entity_id']
+        self.assertEqual(entity, self.database.get(entity_id))
+        self.assertEqual([entity, None],
+                         self.database.get_multi([entity_id, 'absent']))
+
+    def test_save_multi_batches(self):
+        """Tests that save_multi writes at most _MAX_PUT_BATCH_SIZE entities
+        per batch and invalidates the cache entry of every entity."""
+        client = memory_datastore.MemoryClient()
+        database = base_database.BaseDatabase(
+            'kind', client, 'entity_id', cache=cache.LRUCache(1000, 60))
+        entities = [database.get(make_new=True) for _ in range(501)]
+        database.save_multi(entities)
+        ids = [entity['entity_id'] for entity in entities]
+        database.get_multi(ids)
+
+        for entity in entities:
+            entity['pr_number'] = 1
+        with mock.patch.object(client, 'put_multi',
+                               wraps=client.put_multi) as put_multi:
+            database.save_multi(entities)
+        self.assertEqual([500, 1], [len(call.args[0])
+                                    for call in put_multi.call_args_list])
+        self.assertEqual([1] * 501, [entity['pr_number'] for entity in
+                                     database.get_multi(ids)])
+
+    def test_filter_pages(self):
+        """Tests that filter and iterate_pages return the entities that
+        pass the filter."""
+        entities = []
+        for i in range(5):
+            entity = self.database.get(make_new=True)
+            entity.update({'import_name': 'name', 'pr_number': i % 2})
+            entities.append(entity)
+        self.database.save_multi(entities)
+        self.assertEqual(3, len(self.database.filter({'pr_number': 0})))
+        pages = list(self.database.iterate_pages({'import_name': 'name'},
+                                                 limit=2))
+        self.assertEqual([2, 2, 1], [len(page) for page in pages])
+
+    def test_transaction(self):
+        """Tests that entities saved in a transaction are saved when it
+        commits."""
+        with self.database.transaction():
+            entity = self.database.get(make_new=True)
+            self.database.save(entity)
+            self.assertIsNone(self.database.get(entity['entity_id']))
+        self.assertEqual(entity, self.database.get(entity['entity_id']))
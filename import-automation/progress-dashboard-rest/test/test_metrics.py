@@ -0,0 +1,87 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for metrics.py.
+"""
+
+import unittest
+from unittest import mock
+
+import flask
+from google.api_core import exceptions
+
+from app import metrics
+
+
+class HistogramTest(unittest.TestCase):
+    """Tests for Histogram."""
+
+    def test_render(self):
+        """Tests that a histogram is rendered with cumulative buckets."""
+        histogram = metrics.Histogram('latency', 'Latency.', (1, 2),
+                                      ('endpoint',))
+        histogram.observe(0.5, '/a')
+        histogram.observe(1.5, '/a')
+        histogram.observe(3, '/a')
+        self.assertEqual([
+            '# HELP latency Latency.', '# TYPE latency histogram',
+            'latency_bucket{endpoint="/a",le="1"} 1',
+            'latency_bucket{endpoint="/a",le="2"} 2',
+            'latency_bucket{endpoint="/a",le="+Inf"} 3',
+            'latency_sum{endpoint="/a"} 5.0', 'latency_count{endpoint="/a"} 3'
+        ], histogram.render())
+
+
+class MiddlewareTest(unittest.TestCase):
+    """Tests for the metrics recorded by init_app."""
+
+    def setUp(self):
+        """Creates an app whose endpoint makes two Datastore calls before
+        every test."""
+        self.app = flask.Flask(__name__)
+        metrics.init_app(self.app)
+        self.api = mock.Mock()
+        self.api.commit.side_effect = exceptions.Aborted('conflict')
+
+        # pylint: disable=protected-access
+        api = metrics._InstrumentedAPI(self.api)
+
+        @self.app.route('/items/<item_id>')
+        def get_item(item_id):
+            api.lookup()
+            with self.assertRaises(exceptions.Aborted):
+                api.commit()
+            return item_id
+
+    def test_records_request(self):
+        """Tests that the latency and Datastore calls of a request are
+        recorded by endpoint, and that conflicts are counted."""
+        endpoint = '/items/<item_id>'
+        before = metrics.REQUEST_DURATION.count(endpoint, 'GET', 200)
+        conflicts = metrics.TRANSACTION_CONFLICTS.value(endpoint)
+        client = self.app.test_client()
+        self.assertEqual(b'0', client.get('/items/0').data)
+        self.assertEqual(b'1', client.get('/items/1').data)
+
+        self.assertEqual(2 + before,
+                         metrics.REQUEST_DURATION.count(endpoint, 'GET', 200))
+        self.assertEqual(2 + conflicts,
+                         metrics.TRANSACTION_CONFLICTS.value(endpoint))
+        text = client.get('/metrics').data.decode()
+        self.assertIn(
+            'dashboard_datastore_rpcs_per_request_bucket'
+            '{endpoint="/items/<item_id>",le="2"} 2', text)
+        self.assertIn('dashboard_datastore_rpc_duration_seconds_count'
+                      '{method="lookup"}', text)
@@ -17,14 +17,21 @@ Tests for utils.py.
 """
 
 from datetime import datetime
+import os
 import unittest
 from unittest import mock
 
 from flask_restful import reqparse
+from google.api_core import exceptions
+from google.cloud import datastore
 
+from app import metrics
 from app import utils
 from app import main
+from app.service import base_database
+from app.service import cache
 from app.service import import_attempt_database_dict
+from app.service import memory_datastore
 
 IMPORT_ATTEMPT_DATABASE = 'app.resource.import_attempt' \
                           '.import_attempt_database.ImportAttemptDatabase'
@@ -110,3 +117,101 @@ class RequestParserAddFieldsTest(unittest.TestCase):
         with main.app.test_request_context(json=with_pr_and_logs):
             args = parser.parse_args()
             self.assertEqual(with_pr_and_logs, args)
+
+
+@mock.patch.dict(os.environ, {'DATASTORE_EMULATOR_HOST': 'localhost:8081'})
+class ClientPoolTest(unittest.TestCase):
+    """Tests for get_client_pool."""
+
+    def test_shared(self):
+        """Tests that the pool is created once and shared."""
+        self.assertIs(utils.get_client_pool(), utils.get_client_pool())
+
+    def test_forked(self):
+        """Tests that a forked process creates its own pool."""
+        pool = utils.get_client_pool()
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            forked_pool = utils.get_client_pool()
+            os.write(write_fd, b'1' if forked_pool is not pool else b'0')
+            os._exit(0)  # pylint: disable=protected-access
+        os.close(write_fd)
+        os.waitpid(pid, 0)
+        with os.fdopen(read_fd, 'rb') as reader:
+            self.assertEqual(b'1', reader.read())
+        self.assertIs(pool, utils.get_client_pool())
+
+
+class RunInTransactionTest(unittest.TestCase):
+    """Tests for run_in_transaction."""
+
+    def setUp(self):
+        """Creates a client with an empty store before every test."""
+        self.client = memory_datastore.MemoryClient()
+        self.key = self.client.key('kind', 'name')
+        self.client.put(datastore.Entity(self.key))
+        self.delays = []
+
+    def _increment_with_conflicts(self, num_conflicts):
+        """Returns a function incrementing a counter in a transaction, whose
+        first num_conflicts calls conflict with a concurrent write."""
+        calls = []
+
+        def increment():
+            calls.append(None)
+            entity = self.client.get(self.key)
+            if len(calls) <= num_conflicts:
+                other = memory_datastore.MemoryClient(store=self.client.store)
+                other.put(datastore.Entity(self.key))
+            entity['count'] = entity.get('count', 0) + 1
+            self.client.put(entity)
+            return len(calls)
+
+        return increment
+
+    def test_retries(self):
+        """Tests that a conflicting transaction is retried after a
+        delay, and that the retries are counted."""
+        retries = metrics.TRANSACTION_RETRIES.value('none')
+        self.assertEqual(
+            3,
+            utils.run_in_transaction(self.client,
+                                     self._increment_with_conflicts(2),
+                                     sleep=self.delays.append))
+        self.assertEqual(2, len(self.delays))
+        self.assertEqual({'count': 1}, self.client.get(self.key))
+        self.assertEqual(2 + retries, metrics.TRANSACTION_RETRIES.value('none'))
+
+    def test_gives_up(self):
+        """Tests that the conflict is raised after the last attempt."""
+        with self.assertRaises(exceptions.Aborted):
+            utils.run_in_transaction(self.client,
+                                     self._increment_with_conflicts(3),
+                                     attempts=3,
+                                     sleep=self.delays.append)
+        self.assertEqual(2, len(self.delays))
+
+    def test_invalidates_after_commit(self):
+        """Tests that the cache entries of the entities saved in the
+        transaction are deleted once it is committed, even if a concurrent
+        request cached them again before the commit."""
+        shared_cache = cache.LRUCache(10, 60)
+        database = base_database.BaseDatabase(
+            'kind', self.client, 'entity_id', cache=shared_cache)
+        concurrent = base_database.BaseDatabase(
+            'kind', memory_datastore.MemoryClient(store=self.client.store),
+            'entity_id', cache=shared_cache)
+        entity = database.get(make_new=True)
+        entity['pr_number'] = 0
+        database.save(entity)
+        entity_id = entity['entity_id']
+
+        def save():
+            entity['pr_number'] = 1
+            database.save(entity)
+            self.assertEqual(0, concurrent.get(entity_id)['pr_number'])
+
+        utils.run_in_transaction(self.client, save)
+        self.assertEqual(1, database.get(entity_id)['pr_number'])
@@ -0,0 +1,348 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Preprocessing shared by the imports of The COVID Tracking Project's
+historic data.
+
+Each import is a Job that downloads a daily CSV from the project's API and
+writes the cleaned CSV and the template MCF (TMCF) of its directory. The
+columns of the cleaned CSV are defined once by COLUMN_MAPPING.
+
+The source CSV is read in chunks as it is downloaded, and each chunk is
+renamed and transformed column by column. Statistics are checked to be
+numbers and written as they are in the source, so the output does not depend
+on how the source is split into chunks. Only empty cells are missing values;
+others, such as "N/A", fail the check rather than being dropped.
+
+With --incremental, only the rows that are new or revised since the previous
+run are written, to a new <table>_delta_<UTC time of the run>.csv instead of
+<table>.csv, so that no delta is lost if a consumer misses a run. Consumers
+apply the deltas in the order of their names and delete them. Emitted rows
+are tracked in a Watermark saved to <table>_watermark.json, see Watermark.
+
+Usage, to run both imports in one process:
+
+    python3 covid_tracking.py [--incremental]
+"""
+
+import collections
+import concurrent.futures
+import csv
+import datetime
+import json
+import os
+import sys
+
+from absl import app
+from absl import flags
+import pandas as pd
+
+# Allows importing the util package from the root of the repo.
+sys.path.insert(
+    1, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..'))
+
+from util import fetcher  # pylint: disable=wrong-import-position
+
+FLAGS = flags.FLAGS
+flags.DEFINE_boolean(
+    'incremental', False,
+    'Write only the rows new or revised since the previous incremental run, '
+    'to a new <table>_delta_<UTC time of the run>.csv.')
+
+# Statistical variables of the cleaned CSVs and the source columns they are
+# read from, in the order of the cleaned CSVs.
+COLUMN_MAPPING = [
+    ('CumulativeCount_MedicalTest_COVID_19', 'totalTestResults'),
+    ('CumulativeCount_MedicalTest_COVID_19_Positive', 'positive'),
+    ('CumulativeCount_MedicalTest_COVID_19_Negative', 'negative'),
+    ('Count_MedicalTest_COVID_19_Pending', 'pending'),
+    ('CumulativeCount_MedicalConditionIncident_COVID_19_PatientRecovered',
+     'recovered'),
+    ('CumulativeCount_MedicalConditionIncident_COVID_19_PatientDeceased',
+     'death'),
+    ('Count_MedicalConditionIncident_COVID_19_PatientHospitalized',
+     'hospitalizedCurrently'),
+    ('CumulativeCount_MedicalConditionIncident_COVID_19_PatientHospitalized',
+     'hospitalizedCumulative'),
+    ('Count_MedicalConditionIncident_COVID_19_PatientInICU', 'inIcuCurrently'),
+    ('CumulativeCount_MedicalConditionIncident_COVID_19_PatientInICU',
+     'inIcuCumulative'),
+    ('Count_MedicalConditionIncident_COVID_19_PatientOnVentilator',
+     'onVentilatorCurrently'),
+    ('CumulativeCount_MedicalConditionIncident_COVID_19_PatientOnVentilator',
+     'onVentilatorCumulative'),
+]
+
+STAT_VARS = [stat_var for stat_var, _ in COLUMN_MAPPING]
+
+# Number of rows of the source CSV processed at a time.
+CHUNK_SIZE = 10000
+
+# Number of days before the newest date of a place for which revisions of
+# its rows are still detected. Older rows are assumed final.
+REVISION_DAYS = 30
+
+# GeoId of the rows of the imports that are not by state.
+_US_GEO_ID = 'dcid:country/USA'
+
+# An import. table is the name of the cleaned CSV and TMCF, written to
+# directory. by_state is True if the source has a row per state and date,
+# and False if it has a row per date for the whole US.
+Job = collections.namedtuple('Job', ['table', 'url', 'directory', 'by_state'])
+
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+STATES = Job('COVIDTracking_States',
+             'https://covidtracking.com/api/v1/states/daily.csv',
+             os.path.join(_ROOT, 'historic_state_data'), True)
+US = Job('COVIDTracking_US', 'https://covidtracking.com/api/v1/us/daily.csv',
+         os.path.join(_ROOT, 'historic_us_data'), False)
+
+_TMCF_TEMPLATE = """
+Node: E:{table}->E{index}
+typeOf: dcs:StatVarObservation
+variableMeasured: dcs:{stat_var}
+measurementMethod: dcs:CovidTrackingProject
+observationAbout: {observation_about}
+observationDate: C:{table}->Date
+value: C:{table}->{stat_var}
+"""
+
+
+def output_columns(job):
+    """Returns the columns of the cleaned CSV of job."""
+    if job.by_state:
+        return ['Date', 'GeoId'] + STAT_VARS
+    return ['Date'] + STAT_VARS
+
+
+def _check_numbers(values):
+    """Returns values, a Series of strings, unchanged. Raises ValueError if
+    some are not numbers."""
+    pd.to_numeric(values)
+    return values
+
+
+def transform(chunk, by_state):
+    """Returns the rows of the cleaned CSV for a chunk of the source CSV.
+
+    Args:
+        chunk: DataFrame of source rows, with all columns as strings.
+        by_state: See Job.
+    """
+    date = chunk['date']
+    data = {
+        'Date': date.str[:4] + '-' + date.str[4:6] + '-' + date.str[6:],
+    }
+    if by_state:
+        data['GeoId'] = 'dcid:geoId/' + chunk['fips']
+    for stat_var, source_column in COLUMN_MAPPING:
+        data[stat_var] = _check_numbers(chunk[source_column])
+    return pd.DataFrame(data)
+
+
+class Watermark(object):
+    """Tracks the rows of a cleaned CSV emitted by previous runs.
+
+    For each place, the newest date emitted is recorded along with a hash of
+    the content of each row emitted in the REVISION_DAYS up to it. A row is
+    emitted again if it is newer than the newest date of its place, or if it
+    is within REVISION_DAYS of it and its hash changed. The state saved is
+    therefore bounded by the number of places, whatever the history.
+
+    Rows are hashed as the strings written to the cleaned CSV, which are
+    those of the source, so hashes do not depend on how the source is split
+    into chunks.
+    """
+
+    def __init__(self, places=None, revision_days=REVISION_DAYS):
+        """
+        Args:
+            places: Dict from GeoId to a dict with the newest date emitted
+                in "date" and a dict from date to row hash in "hashes".
+            revision_days: See REVISION_DAYS.
+        """
+        self.places = places or {}
+        self._revision_days = revision_days
+        # Rows are compared to the state of the previous run, not to the
+        # rows selected so far in this one.
+        self._cutoffs = {
+            geo_id: self._cutoff(place['date'])
+            for geo_id, place in self.places.items()
+        }
+
+    @classmethod
+    def load(cls, path, revision_days=REVISION_DAYS):
+        """Returns the Watermark saved at path, or an empty one if there is
+        none."""
+        if not os.path.exists(path):
+            return cls(revision_days=revision_days)
+        with open(path) as f:
+            return cls(json.load(f), revision_days)
+
+    def save(self, path):
+        """Saves the Watermark to path, replacing it atomically."""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.places, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def _cutoff(self, date):
+        """Returns the first date revisions are detected at for a place
+        whose newest date is date."""
+        return (pd.Timestamp(date) -
+                pd.Timedelta(days=self._revision_days)).strftime('%Y-%m-%d')
+
+    def select(self, rows, geo_ids):
+        """Returns a boolean Series of the rows that are new or revised, and
+        records them as emitted.
+
+        Args:
+            rows: DataFrame of cleaned rows, as returned by transform.
+            geo_ids: Series of the GeoIds of rows.
+        """
+        dates = rows['Date']
+        hashes = pd.util.hash_pandas_object(rows.fillna(''),
+                                            index=False).map('{:016x}'.format)
+        cutoffs = geo_ids.map(self._cutoffs).fillna('')
+        previous = pd.Series([
+            self.places.get(geo_id, {}).get('hashes', {}).get(date)
+            for geo_id, date in zip(geo_ids, dates)
+        ],
+                             index=rows.index,
+                             dtype=object)
+        selected = (dates >= cutoffs) & (hashes != previous)
+        for geo_id, date, row_hash in zip(geo_ids[selected], dates[selected],
+                                          hashes[selected]):
+            place = self.places.setdefault(geo_id, {'date': date, 'hashes': {}})
+            place['date'] = max(place['date'], date)
+            place['hashes'][date] = row_hash
+        return selected
+
+    def prune(self):
+        """Drops the hashes of the rows too old to be revised."""
+        for place in self.places.values():
+            cutoff = self._cutoff(place['date'])
+            place['hashes'] = {
+                date: row_hash
+                for date, row_hash in place['hashes'].items()
+                if date >= cutoff
+            }
+
+
+def preprocess(job, source, output_path, chunk_size=CHUNK_SIZE, watermark=None):
+    """Writes the cleaned CSV of job.
+
+    Args:
+        job: Job to write the CSV of.
+        source: Binary file object of the source CSV.
+        output_path: Path to write the cleaned CSV to.
+        chunk_size: Number of source rows to process at a time.
+        watermark: If given, the Watermark of the rows emitted by previous
+            runs. Only the rows it selects are written, and it is updated
+            with them.
+
+    Returns:
+        Number of rows written.
+    """
+    source_columns = ['date'] + [column for _, column in COLUMN_MAPPING]
+    if job.by_state:
+        source_columns.append('fips')
+    num_rows = 0
+    with open(output_path, 'w', newline='') as out:
+        writer = csv.writer(out, lineterminator='\n')
+        writer.writerow(output_columns(job))
+        for chunk in pd.read_csv(source,
+                                 usecols=source_columns,
+                                 dtype=str,
+                                 keep_default_na=False,
+                                 na_values=[''],
+                                 chunksize=chunk_size):
+            rows = transform(chunk, job.by_state)
+            if watermark is not None:
+                if job.by_state:
+                    geo_ids = rows['GeoId']
+                else:
+                    geo_ids = pd.Series(_US_GEO_ID, index=rows.index)
+                rows = rows[watermark.select(rows, geo_ids)]
+            writer.writerows(
+                rows.fillna('').itertuples(index=False, name=None))
+            num_rows += len(rows)
+    if watermark is not None:
+        watermark.prune()
+    return num_rows
+
+
+def tmcf(job):
+    """Returns the TMCF of job, with a node per statistical variable."""
+    if job.by_state:
+        observation_about = 'C:%s->GeoId' % job.table
+    else:
+        observation_about = 'dcid:country/USA'
+    return ''.join(
+        _TMCF_TEMPLATE.format(table=job.table,
+                              index=index,
+                              stat_var=stat_var,
+                              observation_about=observation_about)
+        for index, stat_var in enumerate(STAT_VARS))
+
+
+def run(job, incremental=False):
+    """Downloads the source of job and writes its cleaned CSV and TMCF.
+
+    Args:
+        job: Job to run.
+        incremental: If True, write only the rows new or revised since the
+            previous incremental run to a new
+            <table>_delta_<YYYYMMDDTHHMMSSffffff>.csv, named after the UTC
+            time of the run, and update <table>_watermark.json. The
+            watermark is only saved once the delta is fully written, so a
+            failed run is simply retried.
+
+    Returns:
+        Number of rows written to the cleaned CSV.
+    """
+    watermark = None
+    output_path = os.path.join(job.directory, job.table + '.csv')
+    watermark_path = os.path.join(job.directory, job.table + '_watermark.json')
+    if incremental:
+        watermark = Watermark.load(watermark_path)
+        output_path = os.path.join(
+            job.directory, '%s_delta_%s.csv' %
+            (job.table,
+             datetime.datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')))
+    with fetcher.stream(job.url) as source:
+        num_rows = preprocess(job, source, output_path, watermark=watermark)
+    if watermark is not None:
+        watermark.save(watermark_path)
+    with open(os.path.join(job.directory, job.table + '.tmcf'), 'w',
+              newline='') as f_out:
+        f_out.write(tmcf(job))
+    return num_rows
+
+
+def run_all(jobs, incremental=False):
+    """Runs jobs concurrently, overlapping their downloads."""
+    with concurrent.futures.ThreadPoolExecutor(len(jobs)) as executor:
+        results = executor.map(lambda job: run(job, incremental), jobs)
+        for job, num_rows in zip(jobs, results):
+            print('%s: wrote %d rows.' % (job.table, num_rows))
+
+
+def main(argv):
+    del argv  # unused
+    run_all([STATES, US], FLAGS.incremental)
+
+
+if __name__ == '__main__':
+    app.run(main)
@@ -12,9 +12,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import functools
 import unittest
+import io
 import os
+import sys
 import filecmp
+import tempfile
+from unittest import mock
+
+import pandas as pd
+
+# Allows importing covid_tracking from the parent directory.
+sys.path.insert(
+    1, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import covid_tracking  # pylint: disable=wrong-import-position
+
+_MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 
 class PreprocessCSVTest(unittest.TestCase):
@@ -51,5 +66,152 @@ value: C:COVIDTracking_States->{stat_var}
 
         self.assertTrue(same)
 
+    def test_tmcf_matches_checked_in(self):
+        with open(os.path.join(_MODULE_DIR, 'COVIDTracking_States.tmcf')) as f:
+            self.assertEqual(f.read(), covid_tracking.tmcf(covid_tracking.STATES))
+
+    def test_preprocess(self):
+        source_columns = ['date', 'state', 'fips'] + [
+            column for _, column in covid_tracking.COLUMN_MAPPING]
+        rows = ['20200707,AK,02,131420,1184,130236,,560,17,25,,,,1,',
+                '20200707,AL,01,461364,45785,415579,,22082,1033,1073,2961,,'
+                '858,,479']
+        source = io.BytesIO(
+            ('\n'.join([','.join(source_columns)] + rows) + '\n').encode())
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_path = os.path.join(tmp_dir, 'output.csv')
+            num_rows = covid_tracking.preprocess(covid_tracking.STATES,
+                                                 source,
+                                                 output_path,
+                                                 chunk_size=1)
+            with open(output_path) as f:
+                output = f.read()
+        self.assertEqual(2, num_rows)
+        with open(os.path.join(_MODULE_DIR, 'COVIDTracking_States.csv')) as f:
+            expected = ''.join(f.readline() for _ in range(3))
+        self.assertEqual(expected, output)
+
+    def test_preprocess_does_not_depend_on_chunks(self):
+        source_columns = ['date', 'fips'] + [
+            column for _, column in covid_tracking.COLUMN_MAPPING]
+        values = [['5'] * len(covid_tracking.COLUMN_MAPPING),
+                  ['5.5'] + [''] * (len(covid_tracking.COLUMN_MAPPING) - 1)]
+        source = ('\n'.join([','.join(source_columns)] + [
+            ','.join(['2020070%d' % day, '02'] + row)
+            for day, row in enumerate(values, start=1)
+        ]) + '\n').encode()
+        outputs = []
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_path = os.path.join(tmp_dir, 'output.csv')
+            for chunk_size in (1, 2):
+                covid_tracking.preprocess(covid_tracking.STATES,
+                                          io.BytesIO(source),
+                                          output_path,
+                                          chunk_size=chunk_size)
+                with open(output_path) as f:
+                    outputs.append(f.read())
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertIn('dcid:geoId/02,5,5,', outputs[0])
+
+    def test_transform_rejects_non_numbers(self):
+        chunk = pd.DataFrame(
+            {column: ['1'] for _, column in covid_tracking.COLUMN_MAPPING})
+        chunk['date'] = ['20200707']
+        chunk['positive'] = ['N/A']
+        with self.assertRaises(ValueError):
+            covid_tracking.transform(chunk, by_state=False)
+
+    def test_preprocess_rejects_non_numbers(self):
+        source_columns = ['date'] + [
+            column for _, column in covid_tracking.COLUMN_MAPPING]
+        for value in ('N/A', 'NA', 'null', 'nan'):
+            row = ['20200707', value] + [''] * (
+                len(covid_tracking.COLUMN_MAPPING) - 1)
+            source = io.BytesIO(('\n'.join(
+                [','.join(source_columns), ','.join(row)]) + '\n').encode())
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                with self.assertRaises(ValueError):
+                    covid_tracking.preprocess(
+                        covid_tracking.US, source,
+                        os.path.join(tmp_dir, 'output.csv'))
+
+
+class WatermarkTest(unittest.TestCase):
+
+    def _rows(self, values):
+        """Returns cleaned rows of AK with a date and a first statistic."""
+        rows = pd.DataFrame({
+            'Date': [date for date, _ in values],
+            'GeoId': 'dcid:geoId/02',
+        })
+        for stat_var in covid_tracking.STAT_VARS:
+            rows[stat_var] = [value for _, value in values]
+        return rows
+
+    def _select(self, watermark, values):
+        rows = self._rows(values)
+        selected = watermark.select(rows, rows['GeoId'])
+        return list(rows['Date'][selected])
+
+    def test_select(self):
+        watermark = covid_tracking.Watermark(revision_days=2)
+        history = [('2020-07-07', 5), ('2020-07-06', 4), ('2020-07-01', 1)]
+        self.assertEqual(['2020-07-07', '2020-07-06', '2020-07-01'],
+                         self._select(watermark, history))
+        watermark.prune()
+        self.assertEqual('2020-07-07', watermark.places['dcid:geoId/02']['date'])
+        self.assertEqual(['2020-07-06', '2020-07-07'],
+                         sorted(watermark.places['dcid:geoId/02']['hashes']))
+
+        # Next run: a new date, a revision in the window, and a revision too
+        # old to be detected.
+        watermark = covid_tracking.Watermark(watermark.places, revision_days=2)
+        history = [('2020-07-08', 6), ('2020-07-07', 5), ('2020-07-06', 40),
+                   ('2020-07-01', 10)]
+        self.assertEqual(['2020-07-08', '2020-07-06'],
+                         self._select(watermark, history))
+
+    def test_save_and_load(self):
+        watermark = covid_tracking.Watermark()
+        self._select(watermark, [('2020-07-07', 5)])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'watermark.json')
+            watermark.save(path)
+            loaded = covid_tracking.Watermark.load(path)
+        self.assertEqual(watermark.places, loaded.places)
+        self.assertEqual([], self._select(loaded, [('2020-07-07', 5)]))
+
+    def test_incremental_runs(self):
+        source_columns = ['date', 'fips'] + [
+            column for _, column in covid_tracking.COLUMN_MAPPING]
+        rows = [
+            ','.join(['2020070%d' % day, '02', value] +
+                     [''] * (len(covid_tracking.COLUMN_MAPPING) - 1))
+            for day, value in ((1, '5'), (2, '5.5'))
+        ]
+        source = ('\n'.join([','.join(source_columns)] + rows) +
+                  '\n').encode()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            job = covid_tracking.Job('Table', 'http://example.com/daily.csv',
+                                     tmp_dir, True)
+            stream = lambda url: io.BytesIO(source)
+            with mock.patch.object(covid_tracking.fetcher, 'stream', stream):
+                self.assertEqual(2, covid_tracking.run(job, incremental=True))
+                # The rows are unchanged, so none is emitted again, even
+                # though the source is split into chunks differently.
+                with mock.patch.object(
+                        covid_tracking, 'preprocess',
+                        functools.partial(covid_tracking.preprocess,
+                                          chunk_size=1)):
+                    self.assertEqual(0,
+                                     covid_tracking.run(job, incremental=True))
+            deltas = sorted(name for name in os.listdir(tmp_dir)
+                            if name.startswith('Table_delta_'))
+            # Each run writes its own delta.
+            self.assertEqual(2, len(deltas))
+            with open(os.path.join(tmp_dir, deltas[0])) as f:
+                self.assertEqual(3, len(f.readlines()))
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
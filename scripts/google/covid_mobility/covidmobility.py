@@ -17,8 +17,8 @@ path.insert(1, '../../../')
 
 from os import remove, path as ospath
 from csv import DictReader
-from urllib.request import urlopen
 
+import util.fetcher as fetcher
 import util.name_to_alpha2 as name_to_alpha2
 import util.alpha2_to_dcid as alpha2_to_dcid
 import util.county_to_dcid as county_to_dcid
@@ -153,7 +153,7 @@ def _download_data(url: str, download_as: str) -> None:
     """
 
     # Request data from url.
-    data: str = urlopen(url).read().decode('utf-8')
+    data: str = fetcher.fetch(url).decode('utf-8')
 
     # Store the data as a download_as.
     with open(download_as, 'w+') as input_file:
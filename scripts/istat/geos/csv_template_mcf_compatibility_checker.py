@@ -12,7 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""test functions for the template mcf"""
+"""test functions for the template mcf
+
+To check all the template mcfs of the repo, including the values of the
+columns, see util/tmcf_csv_checker.py.
+"""
 
 import pandas as pd
 
@@ -23,10 +27,10 @@ def test_col_names(csv_path, tmcf_path):
     with open(tmcf_path, "r") as file:
         for line in file:
             if " C:" in line:
-                col_name = line[:-1].split("->")[1]
-            assert col_name in cols
+                col_name = line.rstrip("\n").split("->")[1]
+                assert col_name in cols
 
 if __name__ == "__main__":
-    test_col_names("ISTAT_region.csv", "ISTAT_region.tmcf")
-    test_col_names("ISTAT_province.csv", "ISTAT_province.tmcf")
-    test_col_names("ISTAT_municipal.csv", "ISTAT_municipal.tmcf")
+    test_col_names("./cleaned/ISTAT_region.csv", "ISTAT_region.tmcf")
+    test_col_names("./cleaned/ISTAT_province.csv", "ISTAT_province.tmcf")
+    test_col_names("./cleaned/ISTAT_municipal.csv", "ISTAT_municipal.tmcf")
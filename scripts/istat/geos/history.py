@@ -0,0 +1,153 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Build the history of the ISTAT municipal codes from yearly snapshots.
+   ISTAT publishes the list of codes every year, and municipalities are
+   merged, split and renamed between the snapshots. All the snapshots are
+   processed together, producing:
+   - ./cleaned/ISTAT_municipal_history.csv: one row per interval in which a
+     municipal code had the same name and NUTS3. "Valid To" is the first
+     snapshot date the interval no longer holds, empty if it still does.
+   - ./cleaned/ISTAT_municipal_changes_<date>.csv: for each snapshot, only
+     the municipalities added, changed or removed since the previous one.
+
+   Usage:
+   python3 history.py raw/Elenco-codici-statistici-e-denominazioni-al-01_01_2019_it.csv \
+       raw/Elenco-codici-statistici-e-denominazioni-al-01_01_2020_it.csv
+
+   The date of a snapshot is read from its file name, e.g. "al-01_01_2020".
+   Snapshots must be in the layout expected by preprocess.translate, or be
+   the "_en.csv" files it saves.
+"""
+
+import re
+import sys
+
+import pandas as pd
+
+import preprocess
+
+CODE = "Municipal Code"
+NAME = "Municipal Name"
+NUTS3 = "NUTS3"
+VINTAGE = "Vintage"
+VALID_FROM = "Valid From"
+VALID_TO = "Valid To"
+CHANGE = "Change"
+
+def snapshot_date(file_path):
+    """return the date of the snapshot in file_path as "YYYY-MM-DD" """
+    match = re.search(r"al-(\d\d)_(\d\d)_(\d{4})", file_path)
+    if not match:
+        raise ValueError("no snapshot date found in " + file_path)
+    day, month, year = match.groups()
+    return "{}-{}-{}".format(year, month, day)
+
+def load_snapshot(file_path):
+    """load the municipal code, name and NUTS3 of a snapshot
+
+    Names are read as is, since some of them, such as "None", would
+    otherwise be read as missing values.
+    """
+    if file_path.endswith("_en.csv"):
+        data = pd.read_csv(file_path, keep_default_na=False)
+    else:
+        data = preprocess.translate(file_path, keep_default_na=False)
+    data = data.rename(columns=preprocess.COLUMNS_RENAME)
+    data = data[[CODE, NAME, NUTS3]].drop_duplicates()
+    data[VINTAGE] = snapshot_date(file_path)
+    return data
+
+def _differs(values, previous_values):
+    """compare two columns element-wise, with missing values equal"""
+    return (values != previous_values) & ~(values.isna() &
+                                           previous_values.isna())
+
+def build_history(snapshots):
+    """build the validity intervals of the municipal codes
+
+    Args:
+        snapshots: list of DataFrames returned by load_snapshot.
+
+    Returns:
+        DataFrame with a row per interval in which a code had the same name
+        and NUTS3, with the columns of a snapshot and VALID_FROM, VALID_TO
+        instead of VINTAGE.
+    """
+    data = pd.concat(snapshots, ignore_index=True)
+    vintages = sorted(data[VINTAGE].unique())
+    data["vintage_index"] = data[VINTAGE].map(
+        {vintage: index for index, vintage in enumerate(vintages)})
+    data = data.sort_values([CODE, "vintage_index"], ignore_index=True)
+
+    # A new interval starts at the first snapshot of a code, when its name or
+    # NUTS3 changes, or when it comes back after missing from a snapshot.
+    previous = data.groupby(CODE).shift()
+    starts = (previous["vintage_index"].isna() |
+              _differs(data[NAME], previous[NAME]) |
+              _differs(data[NUTS3], previous[NUTS3]) |
+              (data["vintage_index"] != previous["vintage_index"] + 1))
+    history = data.groupby(starts.cumsum()).agg(
+        {CODE: "first", NAME: "first", NUTS3: "first", VINTAGE: "first",
+         "vintage_index": "last"})
+    history = history.rename(columns={VINTAGE: VALID_FROM})
+    # Intervals that still hold in the latest snapshot have no end.
+    next_vintages = pd.Series(vintages[1:] + [None])
+    history[VALID_TO] = history["vintage_index"].map(next_vintages)
+    return history.drop(columns="vintage_index").reset_index(drop=True)
+
+def diff_snapshots(history):
+    """list what changed in each snapshot
+
+    Args:
+        history: DataFrame returned by build_history.
+
+    Returns:
+        DataFrame of the municipalities that were added, changed or removed,
+        with the snapshot date in VINTAGE and the kind of change in CHANGE.
+        Removed municipalities keep the name and NUTS3 they had last.
+    """
+    started = history.assign(**{VINTAGE: history[VALID_FROM]})
+    ended = history[history[VALID_TO].notna()]
+    ended = ended.assign(**{VINTAGE: ended[VALID_TO]})
+    keys = [CODE, VINTAGE]
+    started[CHANGE] = started.merge(
+        ended[keys], on=keys, how="left", indicator=True)["_merge"].map(
+            {"both": "changed", "left_only": "added"}).values
+    removed = ended.merge(started[keys], on=keys, how="left", indicator=True)
+    removed = removed[removed["_merge"] == "left_only"].drop(
+        columns="_merge").assign(**{CHANGE: "removed"})
+    changes = pd.concat([started, removed], ignore_index=True)
+    changes = changes[[VINTAGE, CHANGE, CODE, NAME, NUTS3]]
+    return changes.sort_values([VINTAGE, CODE], ignore_index=True)
+
+def format_codes(data):
+    """format the code and NUTS3 columns as in ISTAT_municipal.csv"""
+    data = data.copy()
+    data[CODE] = data[CODE].astype(str).str.zfill(6)
+    data[NUTS3] = "dcid:nuts/" + data[NUTS3]
+    return data
+
+def main(file_paths):
+    """build and save the history and the changes of the snapshots"""
+    history = build_history([load_snapshot(path) for path in file_paths])
+    format_codes(history).to_csv("./cleaned/ISTAT_municipal_history.csv",
+                                 index=False)
+    for vintage, changes in format_codes(diff_snapshots(history)).groupby(
+            VINTAGE):
+        changes.drop(columns=VINTAGE).to_csv(
+            "./cleaned/ISTAT_municipal_changes_{}.csv".format(vintage),
+            index=False)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
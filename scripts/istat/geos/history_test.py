@@ -0,0 +1,112 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''Test for history.py.
+Run "python3 history_test.py"
+'''
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+import history
+
+
+def make_snapshot(vintage, rows):
+    """make a snapshot from (code, name, NUTS3) tuples"""
+    data = pd.DataFrame(rows, columns=[history.CODE, history.NAME,
+                                       history.NUTS3])
+    data[history.VINTAGE] = vintage
+    return data
+
+
+class HistoryTest(unittest.TestCase):
+
+    def test_snapshot_date(self):
+        self.assertEqual(
+            "2020-01-01",
+            history.snapshot_date(
+                "raw/Elenco-codici-statistici-e-denominazioni-al-01_01_2020"
+                "_en.csv"))
+        with self.assertRaises(ValueError):
+            history.snapshot_date("raw/codici.csv")
+
+    def test_load_snapshot_keeps_none_name(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(
+                tmp_dir, "Elenco-codici-al-01_01_2020_en.csv")
+            pd.DataFrame({
+                "Common Code numeric format": [1168, 1001],
+                "Name in Italian": ["None", "Agliè"],
+                "NUTS3": ["ITC11", "ITC11"],
+            }).to_csv(file_path, index=False)
+            snapshot = history.load_snapshot(file_path)
+        self.assertEqual(["None", "Agliè"], list(snapshot[history.NAME]))
+        self.assertEqual(["2020-01-01"] * 2, list(snapshot[history.VINTAGE]))
+
+    def test_unchanged_vintages(self):
+        rows = [(1168, "None", "ITC11"), (1001, "Agliè", "ITC11")]
+        history_df = history.build_history([
+            make_snapshot("2019-01-01", rows),
+            make_snapshot("2020-01-01", rows)
+        ])
+        self.assertEqual(2, len(history_df))
+        self.assertTrue((history_df[history.VALID_FROM] == "2019-01-01").all())
+        self.assertTrue(history_df[history.VALID_TO].isna().all())
+        changes = history.diff_snapshots(history_df)
+        self.assertEqual(["added", "added"], list(changes[history.CHANGE]))
+        self.assertEqual(["2019-01-01"] * 2, list(changes[history.VINTAGE]))
+
+    def test_missing_names_are_equal(self):
+        rows = [(1168, None, "ITC11")]
+        history_df = history.build_history([
+            make_snapshot("2019-01-01", rows),
+            make_snapshot("2020-01-01", rows)
+        ])
+        self.assertEqual(1, len(history_df))
+
+    def test_rename(self):
+        history_df = history.build_history([
+            make_snapshot("2019-01-01", [(1001, "Aglie", "ITC11")]),
+            make_snapshot("2020-01-01", [(1001, "Agliè", "ITC11")])
+        ])
+        self.assertEqual(["Aglie", "Agliè"], list(history_df[history.NAME]))
+        self.assertEqual("2020-01-01", history_df[history.VALID_TO][0])
+        self.assertTrue(pd.isna(history_df[history.VALID_TO][1]))
+        changes = history.diff_snapshots(history_df)
+        renamed = changes[changes[history.VINTAGE] == "2020-01-01"]
+        self.assertEqual(["changed"], list(renamed[history.CHANGE]))
+        self.assertEqual(["Agliè"], list(renamed[history.NAME]))
+
+    def test_removal(self):
+        history_df = history.build_history([
+            make_snapshot("2019-01-01", [(1001, "Agliè", "ITC11"),
+                                         (1002, "Airasca", "ITC11")]),
+            make_snapshot("2020-01-01", [(1001, "Agliè", "ITC11")])
+        ])
+        changes = history.diff_snapshots(history_df)
+        removed = changes[changes[history.VINTAGE] == "2020-01-01"]
+        self.assertEqual(["removed"], list(removed[history.CHANGE]))
+        self.assertEqual([1002], list(removed[history.CODE]))
+        self.assertEqual(["Airasca"], list(removed[history.NAME]))
+
+    def test_format_codes(self):
+        formatted = history.format_codes(
+            make_snapshot("2020-01-01", [(1168, "None", "ITC11")]))
+        self.assertEqual(["001168"], list(formatted[history.CODE]))
+        self.assertEqual(["dcid:nuts/ITC11"], list(formatted[history.NUTS3]))
+
+
+if __name__ == '__main__':
+    unittest.main()
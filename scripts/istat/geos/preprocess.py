@@ -16,34 +16,46 @@
    respectively.
 """
 
+import argparse
 import zipfile
 import io
 import os
-import requests
+import sys
 import pandas as pd
 
+# Allows importing the util package from the root of the repo.
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '../../..'))
+from util import fetcher
+
 
 URL = "https://www.istat.it/storage/codici-unita-amministrative/"+\
     "Elenco-codici-statistici-e-denominazioni-delle-unita-territoriali.zip"
 
 def download(url):
-    """download and extract the csv file to ./raw/xx"""
-    response = requests.get(url)
-    file_zip = zipfile.ZipFile(io.BytesIO(response.content))
-    file_zip.extractall("./raw/temp")
-    folder_name = os.listdir("./raw/temp")[0]
-    folder = os.path.join("./raw/temp", folder_name)
-    files = [file for file in os.listdir(folder) if file[-4:] == ".csv"]
+    """download the zip file and open the csv file in it without extracting
+
+    Returns:
+        Tuple of the name of the csv file and the csv file, as a binary
+        file object streamed from the zip file.
+    """
+    file_zip = zipfile.ZipFile(io.BytesIO(fetcher.fetch(url)))
+    files = [file for file in file_zip.namelist() if file[-4:] == ".csv"]
     if len(files) != 1:
         raise Exception("0 or more than 1 files found")
-    file_name = files[0]
-    os.rename(os.path.join(folder, file_name), "./raw/"+file_name[:-4]+"_it.csv")
-    os.system("rm -rf ./raw/temp")
-    return "./raw/"+file_name[:-4]+"_it.csv"
-
-def translate(file_path):
-    """tranlate the column names to English based on Google translate"""
-    data = pd.read_csv(file_path, sep=';', encoding='cp1252')
+    return os.path.basename(files[0]), file_zip.open(files[0])
+
+def translate(csv_file, file_path_en=None, keep_default_na=True):
+    """tranlate the column names to English based on Google translate
+
+    Args:
+        csv_file: path or binary file object of the Italian csv file.
+        file_path_en: if set, the translated csv is also saved there.
+        keep_default_na: if False, strings such as "NA" or "None" are kept
+            as is instead of being read as missing values.
+    """
+    data = pd.read_csv(csv_file, sep=';', encoding='cp1252',
+                       keep_default_na=keep_default_na)
     data.columns = ["Region Code", "Supra-municipal territorial unit"+\
         "code (valid for statistical purposes)", "Province Code (Historic) (1)",  \
         "Municipality progress (2)", "Common alphanumeric format code", \
@@ -57,55 +69,86 @@ def translate(file_path):
         "Numerical Common Code with 103 provinces (from 1995 to 2005)", \
         "Cadastral code of the municipality", \
         "Legal population 2011 (09/10/2011)", "NUTS1", "NUTS2(3)", "NUTS3"]
-    file_path_en = file_path.replace('_it.csv', '_en.csv')
-    data.to_csv(file_path_en, encoding='utf-8', index=False)
+    if file_path_en:
+        data.to_csv(file_path_en, encoding='utf-8', index=False)
     return data
 
+# Corrections of some of the mismatch of NUTS code and names, keyed by NUTS3.
+# e.g. some areas with NUTS code: "ITG2A", province code "91" has the
+# province name of : "Nuoro". However, the correct name of "ITG2A" should be
+# "Ogliastra". We rename it to "Ogliastra". The reason why we assume the
+# NUTS code is right and the name is wrong, but not the oppositte way, is that
+# if it's the opposite way, areas such as "Ogliastra" will be missing.
+PROVINCE_CORRECTIONS = pd.DataFrame(
+    [("ITG2A", 91, "OG", "Ogliastra"), ("ITG28", 95, "OR", "Oristano"),
+     ("ITG27", 92, "CA", "Cargliari"), ("ITG29", 90, "OT", "Olbia-Tempio")],
+    columns=["NUTS3", "Province Code", "Province Abbreviation",
+             "Province name"]).set_index("NUTS3")
+
+# Corrections of region names, keyed by NUTS2
+REGION_NAME_CORRECTIONS = {"ITH1": "Provincia Autonoma di Bolzano/Bozen",
+                           "ITH2": "Provincia Autonoma di Trento"}
+
+REGION_COLUMNS = ["Region Code", "NUTS2", "Region name"]
+PROVINCE_COLUMNS = ["Province Code", "NUTS3", "Province name",
+                    "Province Abbreviation"]
+MUNICIPAL_COLUMNS = ["Municipal Code", "Municipal Name", "NUTS3"]
+
+# Short names of the translated columns used by the import
+COLUMNS_RENAME = {"Province Code (Historic) (1)": "Province Code",\
+    "Name of the supra-municipal territorial unit (valid for statistical purposes)":\
+    "Province name", "Automotive abbreviation":"Province Abbreviation",\
+    "NUTS2(3)":"NUTS2", "Common Code numeric format":"Municipal Code", \
+    "Name in Italian":"Municipal Name"}
+
 def preprocess(data):
     """"preprocess the csv file for importing into Data Commons"""
-    columns_rename = {"Province Code (Historic) (1)": "Province Code",\
-        "Name of the supra-municipal territorial unit (valid for statistical purposes)":\
-        "Province name", "Automotive abbreviation":"Province Abbreviation",\
-        "NUTS2(3)":"NUTS2", "Common Code numeric format":"Municipal Code", \
-        "Name in Italian":"Municipal Name"}
-    data = data.rename(columns=columns_rename)
-
-    # correct some of the mismatch of NUTS code and names
-    # e.g. some areas with NUTS code: "ITG2A", province code "91" has the
-    # province name of : "Nuoro". However, the correct name of "ITG2A" should be
-    # "Ogliastra". We rename it to "Ogliastra". The reason why we assume the
-    # NUTS code is right and the name is wrong, but not the oppositte way, is that
-    # if it's the opposite way, areas such as "Ogliastra" will be missing.
-    
-    reorg = [("ITG2A", 91, "OG", "Ogliastra"), ("ITG28", 95, "OR", "Oristano"),\
-            ("ITG27", 92, "CA", "Cargliari"), ("ITG29", 90, "OT", "Olbia-Tempio")]
-    for (nuts3, province_code, province_abbrev, province_name) in reorg:
-        data.loc[data[data["NUTS3"] == nuts3].index, "Province Code"] = province_code
-        data.loc[data[data["NUTS3"] == nuts3].index, "Province Abbreviation"] = province_abbrev
-        data.loc[data[data["NUTS3"] == nuts3].index, "Province name"] = province_name
-    data.loc[data[data["Province name"] == "Napoli"].index, "Province Abbreviation"] = "NA"
-
-    region_data = data[["Region Code", "NUTS2", "Region name"]].drop_duplicates()
+    data = data.rename(columns=COLUMNS_RENAME)
+
+    # Apply all the NUTS3 corrections with a single indexed update.
+    corrected = data["NUTS3"].isin(PROVINCE_CORRECTIONS.index)
+    correction_columns = list(PROVINCE_CORRECTIONS.columns)
+    data.loc[corrected, correction_columns] = PROVINCE_CORRECTIONS.loc[
+        data.loc[corrected, "NUTS3"], correction_columns].values
+    # "NA" is read as missing, so the abbreviation of Napoli is restored.
+    data.loc[data["Province name"] == "Napoli", "Province Abbreviation"] = "NA"
+
+    # Every province belongs to a single region, so both levels are derived
+    # from one pass over the distinct provinces rather than over all the
+    # municipalities.
+    province_level = data[REGION_COLUMNS + PROVINCE_COLUMNS].drop_duplicates()
+
+    region_data = province_level[REGION_COLUMNS].drop_duplicates()
+    region_data["Region name"] = region_data["NUTS2"].map(
+        REGION_NAME_CORRECTIONS).fillna(region_data["Region name"])
     region_data["NUTS2"] = "nuts/" + region_data["NUTS2"]
     region_data["Region Code"] = region_data["Region Code"].astype(str).str.zfill(2)
-    region_data.loc[region_data[region_data["NUTS2"] == "nuts/ITH1"].index, "Region name"] = \
-        "Provincia Autonoma di Bolzano/Bozen"
-    region_data.loc[region_data[region_data["NUTS2"] == "nuts/ITH2"].index, "Region name"]\
-        = "Provincia Autonoma di Trento"
     region_data.to_csv("./cleaned/ISTAT_region.csv", index=False)
 
-    province_data = data[["Province Code", "NUTS3", "Province name", \
-        "Province Abbreviation"]].drop_duplicates()
+    province_data = province_level[PROVINCE_COLUMNS].drop_duplicates()
     province_data["NUTS3"] = "nuts/" + province_data["NUTS3"]
     province_data["Province Code"] = province_data["Province Code"].astype(str).str.zfill(3)
     province_data.to_csv("./cleaned/ISTAT_province.csv", index=False)
 
-    municipal_data = data[["Municipal Code", "Municipal Name", "NUTS3"]].drop_duplicates()
+    municipal_data = data[MUNICIPAL_COLUMNS].drop_duplicates()
     municipal_data["NUTS3"] = "dcid:nuts/" + municipal_data["NUTS3"]
     municipal_data["Municipal Code"] = municipal_data["Municipal Code"].astype(str).str.zfill(6)
     municipal_data.to_csv("./cleaned/ISTAT_municipal.csv", index=False)
 
 if __name__ == "__main__":
-    FILE_PATH_IT = download(URL)
-    data = translate(FILE_PATH_IT)
+    PARSER = argparse.ArgumentParser(description=__doc__)
+    PARSER.add_argument("--save_raw", action="store_true",
+                        help="also save the Italian and the translated "
+                        "English csv files to ./raw")
+    ARGS = PARSER.parse_args()
+    FILE_NAME, CSV_FILE = download(URL)
+    with CSV_FILE:
+        if ARGS.save_raw:
+            RAW_CSV = CSV_FILE.read()
+            with open("./raw/"+FILE_NAME[:-4]+"_it.csv", "wb") as file_it:
+                file_it.write(RAW_CSV)
+            data = translate(io.BytesIO(RAW_CSV),
+                             "./raw/"+FILE_NAME[:-4]+"_en.csv")
+        else:
+            data = translate(CSV_FILE)
     preprocess(data)
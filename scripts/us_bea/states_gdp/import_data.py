@@ -19,15 +19,31 @@ measurement methods of GDP per quarter per US state from the years 2005-2019.
     Typical usage:
 
     python3 import_data.py
+
+    To also write the cleaned data as Parquet, with typed columns:
+
+    python3 import_data.py --parquet
 """
 import io
+import os
+import sys
 import zipfile
 import csv
 import re
-from urllib.request import urlopen
 from absl import app
+from absl import flags
 import pandas as pd
 
+# Allows importing the util package from the root of the repo.
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '../../..'))
+from util import fetcher
+
+FLAGS = flags.FLAGS
+flags.DEFINE_boolean("parquet", False,
+                     "Whether to also save the cleaned data as Parquet next "
+                     "to the CSV.")
+
 # Suppress annoying pandas DF copy warnings.
 pd.options.mode.chained_assignment = None # default='warn'
 
@@ -79,12 +95,9 @@ class StateGDPDataLoader:
             zip_link = self._ZIP_LINK
         if file is None:
             file = self._STATE_QUARTERLY_GDP_FILE
-        # Open zip file from link.
-        resp = urlopen(zip_link)
-
-        # Read the file, interpret it as bytes, and create a ZipFile instance
-        # from it for easy handling.
-        zip_file = zipfile.ZipFile(io.BytesIO(resp.read()))
+        # Read the file from link, interpret it as bytes, and create a ZipFile
+        # instance from it for easy handling.
+        zip_file = zipfile.ZipFile(io.BytesIO(fetcher.fetch(zip_link)))
 
         # Open the specific desired file (CSV) from the folder, and decode it.
         # This results in a string representation of the file. Interpret that
@@ -162,9 +175,15 @@ class StateGDPDataLoader:
         fips_code = fips_code.replace(" ", "")
         return "geoId/" + fips_code[:2]
 
-    def save_csv(self, filename='states_gdp.csv'):
+    def save_csv(self, filename='states_gdp.csv', parquet=False):
         """Saves instance data frame to specified CSV file.
 
+        Args:
+            filename: Path of the CSV file to write.
+            parquet: Whether to also save the data frame, with its column
+                types, to a Parquet file with the same name as the CSV file
+                but the ".parquet" extension. Requires pyarrow.
+
         Raises:
             ValueError: The instance clean_df data frame has not been
             initialized. This is probably caused by not having called
@@ -175,6 +194,24 @@ class StateGDPDataLoader:
                              "check you are calling process_data before "
                              "save_csv.")
         self.clean_df.to_csv(filename)
+        if parquet:
+            self.clean_df.to_parquet(os.path.splitext(filename)[0] +
+                                     ".parquet")
+
+    @staticmethod
+    def load_parquet(filename='states_gdp.parquet'):
+        """Loads a data frame saved by save_csv(parquet=True).
+
+        The column types are stored in the file, so no CSV parsing or type
+        inference takes place.
+
+        Args:
+            filename: Path of the Parquet file to read.
+
+        Returns:
+            The saved data frame.
+        """
+        return pd.read_parquet(filename)
 
 
 def main(argv):
@@ -182,7 +219,7 @@ def main(argv):
     loader = StateGDPDataLoader()
     loader.download_data()
     loader.process_data()
-    loader.save_csv()
+    loader.save_csv(parquet=FLAGS.parquet)
 
 
 if __name__ == '__main__':
@@ -19,16 +19,19 @@ nodes for the data schema.
     Typical usage:
 
     python3 import_industry_data_and_gen_mcf.py
+
+    To also write the cleaned data as Parquet, with typed columns:
+
+    python3 import_industry_data_and_gen_mcf.py --parquet
 """
-from urllib.request import urlopen
-import io
-import zipfile
-import csv
 import re
 from absl import app
+from absl import flags
 import pandas as pd
 import import_data
 
+FLAGS = flags.FLAGS
+
 # Suppress annoying pandas DF copy warnings.
 pd.options.mode.chained_assignment = None # default='warn'
 
@@ -37,8 +40,21 @@ class StateGDPIndustryDataLoader(import_data.StateGDPDataLoader):
 
     Attributes:
         df: DataFrame (DF) with the cleaned data.
+        missing_df: DataFrame with the datapoints BEA did not publish, with
+            the reason they are missing, e.g. "DisclosureAvoidance".
     """
     _STATE_QUARTERLY_INDUSTRY_GDP_FILE = "SQGDP2__ALL_AREAS_2005_2020.csv"
+    # Markers BEA uses in place of values, mapped to the reason they are
+    # missing.
+    _MISSING_REASONS = {
+        '(D)': 'DisclosureAvoidance',
+        '(NA)': 'NotAvailable'
+    }
+
+    def __init__(self):
+        """Initializes instance, assigning member data frames to None."""
+        super().__init__()
+        self.missing_df = None
 
     def download_data(self):
         """Downloads ZIP file, extracts the desired CSV, and puts it into a data
@@ -84,42 +100,66 @@ class StateGDPIndustryDataLoader(import_data.StateGDPDataLoader):
 
         df = df[df['IndustryClassification'] != "..."]
 
-        df['NAICS'] = df['IndustryClassification'].apply(self._convert_industry_class)
-        df['value'] = df['value'].apply(self._value_converter)
+        df['NAICS'] = self._convert_industry_class(df['IndustryClassification'])
+        df['value'], df['MissingReason'] = self._convert_values(df['value'])
+
+        # Keep suppressed datapoints around so that they can be reported on,
+        # then drop them along with any other missing values.
+        self.missing_df = df[df['MissingReason'].notna()].drop(
+            ["GeoFIPS", "IndustryClassification", "value"], axis=1)
         df = df[df['value'] >= 0]
 
         # Convert from millions of current USD to current USD.
         df['value'] *= 1000000
-        self.clean_df = df.drop(["GeoFIPS", "IndustryClassification"], axis=1)
+        self.clean_df = df.drop(["GeoFIPS", "IndustryClassification",
+                                 "MissingReason"], axis=1)
 
-    @staticmethod
-    def _value_converter(val):
-        """Converts value to float type, and filters out missing values. Missing
-        values are marked by a letter enclosed in parentheses, e.g., "(D)".
+    @classmethod
+    def _convert_values(cls, values):
+        """Converts a column of values to float type, and tags missing values.
+
+        Missing values are marked by a letter enclosed in parentheses, e.g.,
+        "(D)". Known markers are kept as a categorical missing reason, see
+        _MISSING_REASONS; any other value that cannot be parsed is NaN with no
+        reason.
+
+        Args:
+            values: Series of raw values, as strings or numbers.
+
+        Returns:
+            Tuple of the float Series of values, with NaN for missing values,
+            and the categorical Series of missing reasons.
         """
-        try:
-            return float(val)
-        except ValueError:
-            return -1
+        numeric = pd.to_numeric(values, errors='coerce').astype(float)
+        codes = values[numeric.isna()].astype(str).str.strip()
+        reasons = codes.map(cls._MISSING_REASONS).reindex(values.index)
+        reasons = reasons.astype(
+            pd.CategoricalDtype(cls._MISSING_REASONS.values()))
+        return numeric, reasons
 
     @staticmethod
-    def _convert_industry_class(naics_code):
+    def _convert_industry_class(naics_codes):
         """Filters out aggregate NAICS codes and assigns them their Data
         Commons codes.
+
+        Args:
+            naics_codes: Series of raw industry classifications, e.g. "31-33".
         """
-        if isinstance(naics_code, str):
-            naics_code = naics_code.replace("-", "_").replace(",", "&")
-        return f"dcs:USStateQuarterlyIndustryGDP_NAICS_{naics_code}"
+        naics_codes = naics_codes.astype(str).str.replace(
+            "-", "_", regex=False).str.replace(",", "&", regex=False)
+        return "dcs:USStateQuarterlyIndustryGDP_NAICS_" + naics_codes
 
-    def save_csv(self, filename='states_industry_gdp.csv'):
+    def save_csv(self, filename='states_industry_gdp.csv', parquet=False):
         """Saves instance data frame to specified CSV file.
 
+        See StateGDPDataLoader.save_csv.
+
         Raises:
             ValueError: The instance clean_df data frame has not been
             initialized. This is probably caused by not having called
             process_data.
         """
-        super().save_csv(filename)
+        super().save_csv(filename, parquet)
 
     def generate_mcf(self):
         """Generates MCF StatVars for each industry code."""
@@ -142,7 +182,7 @@ def main(_):
     loader = StateGDPIndustryDataLoader()
     loader.download_data()
     loader.process_data()
-    loader.save_csv()
+    loader.save_csv(parquet=FLAGS.parquet)
     loader.generate_mcf()
 
 
@@ -18,6 +18,8 @@ Tests the import_data.py script.
 
     python3 test_import.py
 """
+import os
+import tempfile
 import unittest
 import pandas as pd
 import import_data
@@ -66,6 +68,18 @@ class USStateQuarterlyGDPImportTest(unittest.TestCase):
         loader.process_data(raw_df)
         pd.testing.assert_frame_equal(clean_df, loader.clean_df)
 
+    def test_parquet_round_trip(self):
+        """Tests that the cleaned data saved as Parquet loads back as is."""
+        raw_df = pd.read_csv(TEST_DATA_DIR + "test_tiny_raw.csv", index_col=0)
+        loader = import_data.StateGDPDataLoader()
+        loader.process_data(raw_df)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            csv_path = os.path.join(tmp_dir, "states_gdp.csv")
+            loader.save_csv(csv_path, parquet=True)
+            loaded = import_data.StateGDPDataLoader.load_parquet(
+                os.path.join(tmp_dir, "states_gdp.parquet"))
+            pd.testing.assert_frame_equal(loader.clean_df, loaded)
+
 class USStateQuarterlyPerIndustryImportTest(unittest.TestCase):
     def test_data_processing_tiny(self):
         """Tests end-to-end data cleaning on a tiny example."""
@@ -79,14 +93,34 @@ class USStateQuarterlyPerIndustryImportTest(unittest.TestCase):
 
     def test_value_converter(self):
         """Tests value converter function that cleans out empty datapoints."""
-        val_conv_fn = import_industry_data_and_gen_mcf.StateGDPIndustryDataLoader._value_converter
-        self.assertEqual(val_conv_fn("(D)"), -1)
-        self.assertEqual(val_conv_fn("(E)"), -1)
-        self.assertEqual(val_conv_fn("356785)"), -1)
-        self.assertEqual(val_conv_fn("35678.735"), 35678.735)
-        self.assertEqual(val_conv_fn(5), 5)
-        self.assertEqual(val_conv_fn(35678.735), 35678.735)
-        self.assertEqual(val_conv_fn(""), -1)
+        val_conv_fn = import_industry_data_and_gen_mcf.StateGDPIndustryDataLoader._convert_values
+        raw = pd.Series(["(D)", "(E)", "356785)", "35678.735", 5, 35678.735,
+                         "", " (NA)"])
+        values, reasons = val_conv_fn(raw)
+        pd.testing.assert_series_equal(
+            values,
+            pd.Series([None, None, None, 35678.735, 5, 35678.735, None, None],
+                      dtype=float))
+        self.assertEqual(reasons[0], "DisclosureAvoidance")
+        self.assertEqual(reasons[7], "NotAvailable")
+        self.assertTrue(reasons[1:7].isna().all())
+
+    def test_missing_values_kept(self):
+        """Tests that suppressed datapoints are kept with their reason."""
+        raw_df = pd.read_csv(TEST_DATA_DIR + "test_industry_tiny_raw.csv",
+                             index_col=0)
+        raw_df["2005:Q1"] = raw_df["2005:Q1"].astype(object)
+        raw_df.loc[0, "2005:Q1"] = "(D)"
+        loader = import_industry_data_and_gen_mcf.StateGDPIndustryDataLoader()
+        loader.process_data(raw_df)
+        self.assertEqual(1, len(loader.missing_df))
+        missing = loader.missing_df.iloc[0]
+        self.assertEqual("2005-03", missing["Quarter"])
+        self.assertEqual("geoId/44", missing["GeoId"])
+        self.assertEqual("DisclosureAvoidance", missing["MissingReason"])
+        self.assertNotIn("2005-03",
+                         loader.clean_df[loader.clean_df["GeoId"] ==
+                                         "geoId/44"]["Quarter"].tolist())
 
     def test_industry_class(self):
         """Tests industry class converter function that cleans out empty
@@ -94,11 +128,12 @@ class USStateQuarterlyPerIndustryImportTest(unittest.TestCase):
         """
         ind_conv_fn = import_industry_data_and_gen_mcf.StateGDPIndustryDataLoader._convert_industry_class
         prefix = "dcs:USStateQuarterlyIndustryGDP_NAICS_"
-        self.assertEqual(ind_conv_fn("35"), prefix + "35")
-        self.assertEqual(ind_conv_fn("987"), prefix + "987")
-        self.assertEqual(ind_conv_fn("35-37"), prefix + "35_37")
-        self.assertEqual(ind_conv_fn("35-37,40"), prefix + "35_37&40")
-        self.assertEqual(ind_conv_fn("13-97,2,45-78"), prefix + "13_97&2&45_78")
+        converted = ind_conv_fn(pd.Series(
+            ["35", "987", "35-37", "35-37,40", "13-97,2,45-78"]))
+        self.assertEqual(converted.tolist(), [
+            prefix + "35", prefix + "987", prefix + "35_37",
+            prefix + "35_37&40", prefix + "13_97&2&45_78"
+        ])
 
 if __name__ == '__main__':
     unittest.main()
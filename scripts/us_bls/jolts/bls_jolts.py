@@ -22,10 +22,26 @@ Statistical Variables are generated and cleaned CSV is output.
 Download the requirements.txt via pip and execute the file with Python 3.
 
 Dataset being processed: https://download.bls.gov/pub/time.series/jt/
+
+Pass --parquet to also output the cleaned data as Parquet with typed columns.
 """
+import io
+import os
+import sys
+import textwrap
+
 from absl import app
+from absl import flags
 import pandas as pd
-import textwrap
+
+# Allows importing the util package from the root of the repo.
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '../../..'))
+from util import fetcher
+
+FLAGS = flags.FLAGS
+flags.DEFINE_boolean("parquet", False,
+                     "Whether to also output the cleaned data as Parquet.")
 
 # JOLTS dataset contains both NAICS industry codes and BLS jolts aggregations.
 # Existing NAICS Codes are mapped directly while
@@ -61,6 +77,18 @@ _CODE_MAPPINGS = {
  '929000': '929000:State and local government excluding education'  # New Code
 }
 
+_JOLTS_URL = "https://download.bls.gov/pub/time.series/jt/"
+
+def _read_jolts_file(file_name, **kwargs):
+  """Downloads a whitespace separated file of the JOLTS dataset into a df.
+
+  Args:
+    file_name: Name of the file within the dataset, e.g. "jt.series".
+    **kwargs: Additional arguments to pd.read_csv.
+  """
+  data = fetcher.fetch(_JOLTS_URL + file_name)
+  return pd.read_csv(io.BytesIO(data), sep="\\s+", **kwargs)
+
 def generate_cleaned_dataframe():
   """Fetches and combines BLS Jolts data sources.
 
@@ -77,33 +105,19 @@ def generate_cleaned_dataframe():
       'region_code', 'dataelement_code', 'ratelevel_code', 'footnote_codes',
       'begin_year', 'begin_period', 'end_year', 'end_period']
 
-  series_desc = pd.read_csv(
-      "https://download.bls.gov/pub/time.series/jt/jt.series",
-      converters={'industry_code': lambda col: str(col)},
-      sep="\\s+")
+  series_desc = _read_jolts_file(
+      "jt.series", converters={'industry_code': lambda col: str(col)})
   assert len(series_desc.columns) == len(exp_series_columns)
   assert False not in (series_desc.columns == exp_series_columns)
   series_desc = series_desc.set_index("series_id")
 
   # Download various series datapoints
-  job_openings = pd.read_csv(
-      "https://download.bls.gov/pub/time.series/jt/jt.data.2.JobOpenings",
-      sep="\\s+")
-  job_hires = pd.read_csv(
-      "https://download.bls.gov/pub/time.series/jt/jt.data.3.Hires",
-      sep="\\s+")
-  total_seps = pd.read_csv(
-      "https://download.bls.gov/pub/time.series/jt/jt.data.4.TotalSeparations",
-      sep="\\s+")
-  total_quits = pd.read_csv(
-      "https://download.bls.gov/pub/time.series/jt/jt.data.5.Quits",
-      sep="\\s+")
-  total_layoffs = pd.read_csv(
-      "https://download.bls.gov/pub/time.series/jt/jt.data.6.LayoffsDischarges",
-      sep="\\s+")
-  total_other_seps = pd.read_csv(
-      "https://download.bls.gov/pub/time.series/jt/jt.data.7.OtherSeparations",
-      sep="\\s+")
+  job_openings = _read_jolts_file("jt.data.2.JobOpenings")
+  job_hires = _read_jolts_file("jt.data.3.Hires")
+  total_seps = _read_jolts_file("jt.data.4.TotalSeparations")
+  total_quits = _read_jolts_file("jt.data.5.Quits")
+  total_layoffs = _read_jolts_file("jt.data.6.LayoffsDischarges")
+  total_other_seps = _read_jolts_file("jt.data.7.OtherSeparations")
   # Additional information about each dataframe.
   # Tuple Format: Statistical Variable name, Stat Var population,
   #   Stat Var Job Change Type If Relevant, Dataframe for Stat Var.
@@ -240,6 +254,20 @@ def create_statistical_variables(jolts_df, schema_mapping):
                 .replace("{POPULATION}", pop_type)
                 .replace("{JOB_CHANGE_EVENT}", job_change_event))
 
+def load_cleaned_dataframe(path="BLSJolts.parquet"):
+  """Loads the cleaned data output with --parquet.
+
+  The column types are stored in the file, so the data does not have to be
+  parsed again.
+
+  Args:
+    path: Path of the Parquet file to read.
+
+  Returns:
+    The cleaned data as a data frame.
+  """
+  return pd.read_parquet(path)
+
 def main(_):
   """ Executes the downloading, preprocessing, and outputting of
   required MCF and CSV for JOLTS data.
@@ -249,8 +277,12 @@ def main(_):
 
   # Output final cleaned CSV.
   final_columns = ['Date', 'StatisticalVariable', 'Value']
-  jolts_df.loc[:, final_columns].to_csv("BLSJolts.csv",
-                                        index=False, encoding="utf-8")
+  cleaned_df = jolts_df.loc[:, final_columns]
+  cleaned_df.to_csv("BLSJolts.csv", index=False, encoding="utf-8")
+  if FLAGS.parquet:
+    cleaned_df.astype({'Date': str, 'StatisticalVariable': 'category',
+                       'Value': float}).to_parquet("BLSJolts.parquet",
+                                                    index=False)
 
   # Create and output Statistical Variables.
   create_statistical_variables(jolts_df, schema_mapping)
@@ -39,10 +39,28 @@ flags.DEFINE_boolean("mcf", False,
     "instance MCFs.")
 flags.DEFINE_string("path", "FRB_H15.csv",
     "Path to the raw csv containing rates at all maturities.")
+flags.DEFINE_boolean("parquet", False,
+    "Whether or not to also output the csv data as Parquet with typed "
+    "columns.")
+flags.DEFINE_boolean("incremental", False,
+    "Whether or not to only download the observations newer than the last "
+    "date in the existing csv and append them to it.")
+
+import datetime
+import io
+import os
+import shutil
+import sys
+import tempfile
 
 from frozendict import frozendict
 import pandas as pd
 
+# Allows importing the util package from the root of the repo.
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '../../..'))
+from util import fetcher
+
 
 '''
 Maturities for which interest rates are provided by BEA.
@@ -60,24 +78,143 @@ CSV_URL = "https://www.federalreserve.gov/datadownload/Output.aspx?rel=H15&"\
           "series=bf17364827e38702b42a58cf8eaa3f78&lastobs=&from=&to="\
           "&filetype=csv&label=include&layout=seriescolumn&type=package"
 
+# Path of the output csv
+OUTPUT_CSV = "treasury_constant_maturity_rates.csv"
+
+
+# Number of metadata rows, e.g. "Unit:" and "Multiplier:", between the column
+# names and the observations in the raw csv
+H15_HEADER_ROWS = 5
+
+# Name of the column of the raw csv holding rates at a given maturity
+SERIES_NAME_TEMPLATE = "Market yield on U.S. Treasury securities at {}   "\
+                       "constant maturity, quoted on investment basis"
+
+
+def load_h15_csv(path, series=None):
+    '''Loads a package csv downloaded from the H.15 release.
 
-def generate_csv():
+    The raw file is read and parsed once, as strings. The metadata rows are
+    then sliced off the observations, and only the requested series are
+    converted to floats.
+
+    Args:
+        path: Path or URL of the raw csv.
+        series: Names of the series (columns) to load, as a list of strings.
+            Defaults to the rates at all maturities in MATURITIES.
+
+    Returns:
+        A tuple of two DataFrames, both with one column per series. The first
+        one holds the metadata rows, indexed by their label, e.g. "Unit:".
+        The second one holds the observations, indexed by date.
+    '''
+    if series is None:
+        series = [SERIES_NAME_TEMPLATE.format(maturity)
+                  for maturity in MATURITIES]
+    if "://" in path:
+        raw_csv = io.StringIO(fetcher.fetch(path).decode("utf-8"))
+    else:
+        raw_csv = path
+
+    raw_df = pd.read_csv(raw_csv, header=None, dtype=str,
+                         keep_default_na=False)
+    raw_df.columns = raw_df.iloc[0]
+    raw_df = raw_df.set_index("Series Description")[series]
+    raw_df.columns.name = None
+
+    metadata = raw_df.iloc[1:H15_HEADER_ROWS + 1]
+    data = raw_df.iloc[H15_HEADER_ROWS + 1:]
+    data = data.replace("ND", "").apply(pd.to_numeric)
+    data.index = pd.to_datetime(data.index, format="%Y-%m-%d")
+    data.index.name = "date"
+    return metadata, data
+
+
+def generate_csv(parquet=False):
     '''Generates the csv containing the data portion of the constant
-    maturity rate csv file downloaded from Federal Reserve'''
-
-    out_df = pd.DataFrame()
-    header_rows = 5
-    name_template = "Market yield on U.S. Treasury securities at {}   constant"\
-                    " maturity, quoted on investment basis"
-    
-    in_df = pd.read_csv(CSV_URL, na_values="ND")
-    
-    out_df["date"] = in_df["Series Description"][header_rows:]
-    for maturity in MATURITIES:
-        column_name = name_template.format(maturity)
-        out_df[maturity.title()] = in_df[column_name][header_rows:]
-      
-    out_df.to_csv("treasury_constant_maturity_rates.csv", index=False)
+    maturity rate csv file downloaded from Federal Reserve.
+
+    If parquet is True, the data is also written to
+    "treasury_constant_maturity_rates.parquet" with a date column and float
+    rate columns.
+
+    Returns:
+        Number of rows written.
+    '''
+
+    _, out_df = load_h15_csv(CSV_URL)
+    out_df.columns = [maturity.title() for maturity in MATURITIES]
+
+    out_df.to_csv(OUTPUT_CSV, date_format="%Y-%m-%d", float_format="%.2f")
+    if parquet:
+        out_df.reset_index().to_parquet(
+            "treasury_constant_maturity_rates.parquet", index=False)
+    return len(out_df)
+
+
+def append_csv():
+    '''Appends the observations newer than the last date in the existing
+    csv to it, downloading only those observations.
+
+    Falls back to generate_csv if the csv does not exist yet or has no
+    observations. The existing rows and the new ones are written to a
+    temporary file in the same directory, which then replaces the csv, so
+    that the csv is never left partially written.
+
+    Returns:
+        Number of rows appended.
+    '''
+    last_date = _read_last_date(OUTPUT_CSV) \
+        if os.path.exists(OUTPUT_CSV) else None
+    if last_date is None:
+        return generate_csv()
+
+    from_date = last_date + datetime.timedelta(days=1)
+    url = CSV_URL.replace("from=", "from=" + from_date.strftime("%m/%d/%Y"))
+    _, new_df = load_h15_csv(url)
+    new_df.columns = [maturity.title() for maturity in MATURITIES]
+    new_df = new_df[new_df.index > last_date]
+    if new_df.empty:
+        return 0
+
+    rows = new_df.to_csv(header=False, date_format="%Y-%m-%d",
+                         float_format="%.2f")
+    out_dir = os.path.dirname(os.path.abspath(OUTPUT_CSV))
+    with tempfile.NamedTemporaryFile("w", dir=out_dir, suffix=".csv",
+                                     delete=False) as out_f:
+        try:
+            with open(OUTPUT_CSV) as in_f:
+                shutil.copyfileobj(in_f, out_f)
+            out_f.write(rows)
+            out_f.flush()
+            os.fsync(out_f.fileno())
+        except BaseException:
+            out_f.close()
+            os.remove(out_f.name)
+            raise
+    shutil.copymode(OUTPUT_CSV, out_f.name)
+    os.replace(out_f.name, OUTPUT_CSV)
+    return len(new_df)
+
+
+def _read_last_date(path):
+    '''Returns the date of the last row of the csv at path as a Timestamp,
+    reading only the end of the file. Returns None if the csv has no
+    rows.'''
+    with open(path, "rb") as csv_f:
+        csv_f.seek(0, os.SEEK_END)
+        csv_f.seek(max(0, csv_f.tell() - 4096))
+        last_line = csv_f.read().rstrip().splitlines()[-1].decode("utf-8")
+    last_date = last_line.split(",")[0]
+    if last_date == "date":
+        return None
+    return pd.Timestamp(last_date)
+
+
+def load_parquet(path="treasury_constant_maturity_rates.parquet"):
+    '''Loads the data written by generate_csv(parquet=True) as a DataFrame
+    with its column types, without parsing the csv.'''
+    return pd.read_parquet(path)
 
 
 def generate_mcf():
@@ -134,8 +271,13 @@ def main(argv):
     # unused
     del argv
 
+    if FLAGS.incremental and FLAGS.parquet:
+        raise app.UsageError("--parquet cannot be used with --incremental.")
     if FLAGS.csv:
-        generate_csv()
+        if FLAGS.incremental:
+            append_csv()
+        else:
+            generate_csv(FLAGS.parquet)
     if FLAGS.mcf:
         generate_mcf()
 
@@ -0,0 +1,256 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Shared layer for downloading the source files of an import.
+
+A Fetcher runs in one of three modes:
+
+-   live: Downloads from the given URL.
+-   record: Downloads from the given URL and saves the response as a fixture.
+-   replay: Never touches the network. Recorded fixtures are served by a
+    FixtureServer on localhost and downloaded from there, so that the whole
+    HTTP path of an importer can be tested and benchmarked offline. The
+    server can be throttled to simulate a slow source.
+
+Fixtures are stored in a directory with one file per URL and an index.json
+mapping each URL to its file.
+
+Importers call the module-level fetch function, or stream for large files
+that should be processed as they are downloaded. Both use a Fetcher
+configured by the environment variables:
+
+-   DC_FETCH_MODE: live (default), record, or replay.
+-   DC_FETCH_FIXTURES_DIR: Fixture directory. Required by record and replay.
+-   DC_FETCH_LATENCY: Seconds to wait before serving each replayed response.
+-   DC_FETCH_BANDWIDTH: Bytes per second replayed responses are served at.
+
+Usage:
+
+    DC_FETCH_MODE=record DC_FETCH_FIXTURES_DIR=/tmp/fixtures python3 import.py
+    DC_FETCH_MODE=replay DC_FETCH_FIXTURES_DIR=/tmp/fixtures python3 import.py
+"""
+
+import hashlib
+import http.server
+import io
+import json
+import os
+import threading
+import time
+import urllib.request
+
+MODES = ('live', 'record', 'replay')
+
+_INDEX_FILE = 'index.json'
+_CHUNK_SIZE = 64 * 1024
+
+
+class FixtureServer(object):
+    """Local HTTP server that serves the fixtures in a directory.
+
+    A fixture is served at /<file name of the fixture>.
+
+    Attributes:
+        fixtures_dir: Directory containing the fixtures.
+        latency: Seconds to wait before sending each response.
+        bandwidth: Bytes per second to send responses at. None means
+            unthrottled.
+    """
+
+    def __init__(self, fixtures_dir, latency=0, bandwidth=None):
+        self.fixtures_dir = fixtures_dir
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """Starts serving on a free localhost port in a daemon thread."""
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            """Serves one fixture per request."""
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                """Sends the fixture named by the request path."""
+                path = os.path.join(server.fixtures_dir,
+                                    os.path.basename(self.path))
+                if not os.path.isfile(path):
+                    self.send_error(404)
+                    return
+                with open(path, 'rb') as fixture:
+                    data = fixture.read()
+                time.sleep(server.latency)
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                for start in range(0, len(data), _CHUNK_SIZE):
+                    chunk = data[start:start + _CHUNK_SIZE]
+                    self.wfile.write(chunk)
+                    if server.bandwidth:
+                        time.sleep(len(chunk) / server.bandwidth)
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                """Silences the per-request logging to stderr."""
+
+        self._server = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                                                       Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops the server if it is running."""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+            self._thread = None
+
+    def url(self, file_name):
+        """Returns the URL the fixture with the file name is served at."""
+        if not self._server:
+            raise ValueError('FixtureServer is not started.')
+        host, port = self._server.server_address
+        return 'http://%s:%d/%s' % (host, port, file_name)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+class Fetcher(object):
+    """Downloads files, recording or replaying them as fixtures.
+
+    See the module docstring for the modes.
+    """
+
+    def __init__(self,
+                 mode='live',
+                 fixtures_dir=None,
+                 latency=0,
+                 bandwidth=None):
+        if mode not in MODES:
+            raise ValueError('Unknown fetch mode %s. Must be one of %s.' %
+                             (mode, ', '.join(MODES)))
+        if mode != 'live' and not fixtures_dir:
+            raise ValueError('fixtures_dir is required in %s mode.' % mode)
+        self._mode = mode
+        self._fixtures_dir = fixtures_dir
+        self._latency = latency
+        self._bandwidth = bandwidth
+        self._server = None
+        self._lock = threading.Lock()
+
+    def fetch(self, url):
+        """Returns the content at the URL as bytes."""
+        if self._mode == 'live':
+            return _download(url)
+        if self._mode == 'record':
+            data = _download(url)
+            self._record(url, data)
+            return data
+        return _download(self._replay_url(url))
+
+    def stream(self, url):
+        """Returns a binary file object reading the content at the URL as it
+        is downloaded. The caller must close it.
+
+        In record mode, the content is downloaded in full first, to be saved.
+        """
+        if self._mode == 'live':
+            return urllib.request.urlopen(url)
+        if self._mode == 'record':
+            return io.BytesIO(self.fetch(url))
+        return urllib.request.urlopen(self._replay_url(url))
+
+    def close(self):
+        """Stops the fixture server, if one was started."""
+        if self._server:
+            self._server.stop()
+            self._server = None
+
+    def _record(self, url, data):
+        """Saves data as the fixture of the URL."""
+        with self._lock:
+            os.makedirs(self._fixtures_dir, exist_ok=True)
+            index = self._read_index()
+            file_name = hashlib.sha256(url.encode('utf-8')).hexdigest()[:16]
+            with open(os.path.join(self._fixtures_dir, file_name),
+                      'wb') as fixture:
+                fixture.write(data)
+            index[url] = file_name
+            with open(os.path.join(self._fixtures_dir, _INDEX_FILE),
+                      'w') as index_file:
+                json.dump(index, index_file, indent=2, sort_keys=True)
+
+    def _replay_url(self, url):
+        """Returns the URL the fixture of url is served at by the fixture
+        server, starting the server if needed."""
+        with self._lock:
+            file_name = self._read_index().get(url)
+            if not file_name:
+                raise ValueError('No fixture recorded for %s in %s.' %
+                                 (url, self._fixtures_dir))
+            if not self._server:
+                self._server = FixtureServer(self._fixtures_dir, self._latency,
+                                             self._bandwidth).start()
+            return self._server.url(file_name)
+
+    def _read_index(self):
+        """Returns the URL to file name mappings of the fixtures."""
+        path = os.path.join(self._fixtures_dir, _INDEX_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as index_file:
+            return json.load(index_file)
+
+
+def _download(url):
+    """Returns the content at the URL as bytes."""
+    with urllib.request.urlopen(url) as response:
+        return response.read()
+
+
+_DEFAULT_FETCHER = None
+
+
+def _default_fetcher():
+    """Returns the Fetcher configured by the environment, creating it on
+    first use. See the module docstring."""
+    global _DEFAULT_FETCHER
+    if not _DEFAULT_FETCHER:
+        bandwidth = os.environ.get('DC_FETCH_BANDWIDTH')
+        _DEFAULT_FETCHER = Fetcher(
+            mode=os.environ.get('DC_FETCH_MODE', 'live'),
+            fixtures_dir=os.environ.get('DC_FETCH_FIXTURES_DIR'),
+            latency=float(os.environ.get('DC_FETCH_LATENCY', 0)),
+            bandwidth=float(bandwidth) if bandwidth else None)
+    return _DEFAULT_FETCHER
+
+
+def fetch(url):
+    """Returns the content at the URL as bytes, using a Fetcher configured
+    by the environment. See the module docstring."""
+    return _default_fetcher().fetch(url)
+
+
+def stream(url):
+    """Returns a binary file object reading the content at the URL as it is
+    downloaded, using a Fetcher configured by the environment. See
+    Fetcher.stream."""
+    return _default_fetcher().stream(url)
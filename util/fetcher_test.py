@@ -0,0 +1,90 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for util.fetcher."""
+
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+
+from __future__ import absolute_import
+import os
+import pathlib
+import tempfile
+import time
+import unittest
+
+from util import fetcher
+
+
+class FetcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.fixtures_dir = os.path.join(self._tmp_dir.name, 'fixtures')
+        self.source = os.path.join(self._tmp_dir.name, 'source.csv')
+        with open(self.source, 'wb') as source_file:
+            source_file.write(b'a,b\n1,2\n')
+        self.url = pathlib.Path(self.source).as_uri()
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def _record(self):
+        recorder = fetcher.Fetcher('record', self.fixtures_dir)
+        self.assertEqual(b'a,b\n1,2\n', recorder.fetch(self.url))
+
+    def test_record_then_replay(self):
+        self._record()
+        # The source is gone, so replay must be served from the fixture.
+        os.remove(self.source)
+        replayer = fetcher.Fetcher('replay', self.fixtures_dir)
+        try:
+            self.assertEqual(b'a,b\n1,2\n', replayer.fetch(self.url))
+        finally:
+            replayer.close()
+
+    def test_stream_replay(self):
+        self._record()
+        replayer = fetcher.Fetcher('replay', self.fixtures_dir)
+        try:
+            with replayer.stream(self.url) as response:
+                self.assertEqual(b'a,b\n', response.readline())
+                self.assertEqual(b'1,2\n', response.read())
+        finally:
+            replayer.close()
+
+    def test_replay_not_recorded(self):
+        replayer = fetcher.Fetcher('replay', self.fixtures_dir)
+        with self.assertRaises(ValueError):
+            replayer.fetch('https://example.com/not-recorded.csv')
+
+    def test_replay_latency(self):
+        self._record()
+        replayer = fetcher.Fetcher('replay', self.fixtures_dir, latency=0.2)
+        try:
+            start = time.time()
+            replayer.fetch(self.url)
+            self.assertGreaterEqual(time.time() - start, 0.2)
+        finally:
+            replayer.close()
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            fetcher.Fetcher('offline', self.fixtures_dir)
+        with self.assertRaises(ValueError):
+            fetcher.Fetcher('replay')
+
+
+if __name__ == '__main__':
+    unittest.main()
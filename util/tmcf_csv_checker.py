@@ -0,0 +1,222 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Checks that template MCFs are compatible with their cleaned CSVs.
+
+Every `C:<table>-><column>` reference of every template MCF (TMCF) under a
+directory is checked against the header of the matching CSV. Values of the
+referenced columns are also type checked on a sample of rows read from the
+start of the CSV, e.g. `value` must be numeric.
+
+The CSV of a TMCF is, in order of preference:
+
+1.  The cleaned_csv paired with it in a manifest.json in its directory.
+2.  The CSV with the same name as the TMCF, in its directory or below.
+
+CSVs are never paired by the table name of the references, which several
+TMCFs of a directory may share, e.g. test fixtures next to the real TMCF.
+TMCFs without a CSV are skipped. Directories are checked in parallel.
+
+Usage:
+
+    python3 -m util.tmcf_csv_checker --root=scripts
+"""
+
+import collections
+import concurrent.futures
+import csv
+import itertools
+import json
+import os
+import re
+import sys
+
+from absl import app
+from absl import flags
+
+FLAGS = flags.FLAGS
+
+ColumnReference = collections.namedtuple(
+    'ColumnReference', ['line_number', 'prop', 'table', 'column'])
+
+_REFERENCE_RE = re.compile(r'C:([^\s,]+?)->([^,]+)')
+_DATE_RE = re.compile(r'\d{4}(-\d{2}(-\d{2})?)?$')
+
+
+def _is_number(value):
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
+
+
+def _is_date(value):
+    return bool(_DATE_RE.match(value))
+
+
+# Checks of the values of the columns referenced by a property. Empty values
+# are always allowed.
+_VALUE_CHECKS = {
+    'value': ('a number', _is_number),
+    'observationDate': ('an ISO 8601 date', _is_date),
+}
+
+
+def parse_tmcf(tmcf_path):
+    """Returns the column references of a TMCF as a list of
+    ColumnReference."""
+    references = []
+    with open(tmcf_path) as tmcf:
+        for line_number, line in enumerate(tmcf, start=1):
+            prop, _, values = line.partition(':')
+            for table, column in _REFERENCE_RE.findall(values):
+                references.append(
+                    ColumnReference(line_number, prop.strip(), table,
+                                    column.strip()))
+    return references
+
+
+def find_csv(tmcf_path):
+    """Returns the path of the CSV of a TMCF, or None if there is none.
+
+    See the module docstring for how the CSV is found.
+    """
+    directory = os.path.dirname(tmcf_path)
+    manifest_path = os.path.join(directory, 'manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+        for spec in manifest.get('import_specifications', []):
+            for inputs in spec.get('import_inputs', []):
+                if inputs.get('template_mcf') == os.path.basename(tmcf_path):
+                    path = os.path.join(directory, inputs['cleaned_csv'])
+                    if os.path.exists(path):
+                        return path
+    name = os.path.splitext(os.path.basename(tmcf_path))[0] + '.csv'
+    for dir_path, _, file_names in sorted(os.walk(directory)):
+        if name in file_names:
+            return os.path.join(dir_path, name)
+    return None
+
+
+def check_template(tmcf_path, csv_path, sample_rows=1000):
+    """Checks a TMCF against a CSV.
+
+    Args:
+        tmcf_path: Path of the TMCF.
+        csv_path: Path of the CSV.
+        sample_rows: Number of rows at the start of the CSV to type check.
+
+    Returns:
+        List of error messages as strings. Empty if the TMCF and the CSV
+        are compatible.
+    """
+    references = parse_tmcf(tmcf_path)
+    with open(csv_path, newline='', encoding='utf-8-sig') as csv_file:
+        reader = csv.reader(csv_file)
+        header = next(reader, [])
+        columns = {column: index for index, column in enumerate(header)}
+
+        errors = []
+        checks = []
+        for ref in references:
+            if ref.column not in columns:
+                errors.append(
+                    '%s:%d: column "%s" not found in %s' %
+                    (tmcf_path, ref.line_number, ref.column, csv_path))
+            elif ref.prop in _VALUE_CHECKS:
+                checks.append((ref, columns[ref.column]) +
+                              _VALUE_CHECKS[ref.prop])
+        if not checks:
+            return errors
+
+        failed = set()
+        for row_number, row in enumerate(itertools.islice(reader, sample_rows),
+                                         start=2):
+            for ref, index, expected, is_valid in checks:
+                if ref in failed or index >= len(row) or not row[index]:
+                    continue
+                if not is_valid(row[index]):
+                    failed.add(ref)
+                    errors.append(
+                        '%s:%d: %s expects %s but %s:%d has "%s" in column '
+                        '"%s"' %
+                        (tmcf_path, ref.line_number, ref.prop, expected,
+                         csv_path, row_number, row[index], ref.column))
+    return errors
+
+
+def check_directory(directory, sample_rows=1000):
+    """Checks all the TMCFs directly in a directory.
+
+    Returns:
+        Tuple of the list of error messages and the list of the TMCFs
+        skipped because they have no CSV.
+    """
+    errors = []
+    skipped = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.tmcf'):
+            continue
+        tmcf_path = os.path.join(directory, name)
+        csv_path = find_csv(tmcf_path)
+        if not csv_path:
+            skipped.append(tmcf_path)
+            continue
+        errors.extend(check_template(tmcf_path, csv_path, sample_rows))
+    return errors, skipped
+
+
+def check_all(root, sample_rows=1000, processes=None):
+    """Checks all the TMCFs under root, one directory per process.
+
+    Returns:
+        See check_directory.
+    """
+    directories = sorted(dir_path for dir_path, _, file_names in os.walk(root)
+                         if any(name.endswith('.tmcf') for name in file_names))
+    errors = []
+    skipped = []
+    with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+        for dir_errors, dir_skipped in executor.map(
+                check_directory, directories, itertools.repeat(sample_rows)):
+            errors.extend(dir_errors)
+            skipped.extend(dir_skipped)
+    return errors, skipped
+
+
+def main(argv):
+    del argv  # unused
+    errors, skipped = check_all(FLAGS.root, FLAGS.sample_rows, FLAGS.processes)
+    for tmcf_path in skipped:
+        print('Skipped %s: no CSV found.' % tmcf_path)
+    for error in errors:
+        print(error)
+    sys.exit(1 if errors else 0)
+
+
+def _define_flags():
+    # Defined here rather than at import, so that the module can be imported
+    # along with other modules defining the same flags, e.g. in tests.
+    flags.DEFINE_string('root', 'scripts', 'Directory to search for TMCFs.')
+    flags.DEFINE_integer('sample_rows', 1000,
+                         'Number of rows of each CSV to type check.')
+    flags.DEFINE_integer(
+        'processes', None,
+        'Number of processes. Defaults to the number of CPUs.')
+
+
+if __name__ == '__main__':
+    _define_flags()
+    app.run(main)
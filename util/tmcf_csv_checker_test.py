@@ -0,0 +1,123 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for util.tmcf_csv_checker."""
+
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+
+from __future__ import absolute_import
+import os
+import tempfile
+import unittest
+
+from util import tmcf_csv_checker
+
+TMCF = """Node: E:Table->E0
+typeOf: dcs:StatVarObservation
+variableMeasured: dcs:Count_Person
+observationAbout: C:Table->Geo Id
+observationDate: C:Table->Date
+value: C:Table->Count
+"""
+
+
+class TMCFCSVCheckerTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.dir = self._tmp_dir.name
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def _write(self, name, content):
+        path = os.path.join(self.dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as out:
+            out.write(content)
+        return path
+
+    def test_parse_tmcf(self):
+        tmcf_path = self._write('Table.tmcf', TMCF)
+        refs = tmcf_csv_checker.parse_tmcf(tmcf_path)
+        self.assertEqual([(4, 'observationAbout', 'Table', 'Geo Id'),
+                          (5, 'observationDate', 'Table', 'Date'),
+                          (6, 'value', 'Table', 'Count')], refs)
+
+    def test_compatible(self):
+        tmcf_path = self._write('Table.tmcf', TMCF)
+        csv_path = self._write(
+            'Table.csv', 'Geo Id,Date,Count\ngeoId/06,2020-01,5\n'
+            'geoId/07,2020-02,\n')
+        self.assertEqual([],
+                         tmcf_csv_checker.check_template(tmcf_path, csv_path))
+
+    def test_missing_column(self):
+        tmcf_path = self._write('Table.tmcf', TMCF)
+        csv_path = self._write('Table.csv', 'Geo Id,Count\ngeoId/06,5\n')
+        errors = tmcf_csv_checker.check_template(tmcf_path, csv_path)
+        self.assertEqual(1, len(errors))
+        self.assertIn('"Date" not found', errors[0])
+
+    def test_bad_values(self):
+        tmcf_path = self._write('Table.tmcf', TMCF)
+        csv_path = self._write(
+            'Table.csv', 'Geo Id,Date,Count\ngeoId/06,2020-01,5\n'
+            'geoId/06,Jan 2020,(D)\ngeoId/06,2020-03,(D)\n')
+        errors = tmcf_csv_checker.check_template(tmcf_path, csv_path)
+        # Only the first bad value of each column is reported.
+        self.assertEqual(2, len(errors))
+        self.assertIn('Table.csv:3 has "Jan 2020"', errors[0])
+        self.assertIn('Table.csv:3 has "(D)"', errors[1])
+
+    def test_bad_values_past_sample(self):
+        tmcf_path = self._write('Table.tmcf', TMCF)
+        csv_path = self._write(
+            'Table.csv', 'Geo Id,Date,Count\ngeoId/06,2020-01,5\n'
+            'geoId/06,2020-02,(D)\n')
+        self.assertEqual([],
+                         tmcf_csv_checker.check_template(tmcf_path,
+                                                         csv_path,
+                                                         sample_rows=1))
+
+    def test_find_csv(self):
+        tmcf_path = self._write('Other.tmcf', TMCF)
+        # CSVs are not paired by table name.
+        self._write('Table.csv', '')
+        self.assertIsNone(tmcf_csv_checker.find_csv(tmcf_path))
+        by_name = self._write('cleaned/Other.csv', '')
+        self.assertEqual(by_name, tmcf_csv_checker.find_csv(tmcf_path))
+        by_manifest = self._write('Manifest.csv', '')
+        self._write(
+            'manifest.json', '{"import_specifications": [{"import_inputs": '
+            '[{"template_mcf": "Other.tmcf", '
+            '"cleaned_csv": "Manifest.csv"}]}]}')
+        self.assertEqual(by_manifest, tmcf_csv_checker.find_csv(tmcf_path))
+
+    def test_check_all(self):
+        self._write('a/Table.tmcf', TMCF)
+        self._write('a/Table.csv', 'Geo Id,Count\ngeoId/06,5\n')
+        self._write('a/test_expected.tmcf', TMCF)
+        self._write('b/Table.tmcf', TMCF)
+        errors, skipped = tmcf_csv_checker.check_all(self.dir, processes=2)
+        self.assertEqual(1, len(errors))
+        self.assertEqual([
+            os.path.join(self.dir, 'a', 'test_expected.tmcf'),
+            os.path.join(self.dir, 'b', 'Table.tmcf')
+        ], skipped)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,357 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Expands a template MCF (TMCF) and its CSV into instance MCF.
+
+Each row of the CSV gets one node per `Node: E:<table>-><entity>` of the
+TMCF. In the node of a row:
+
+-   `C:<table>-><column>` is replaced by the value of the column in the row.
+-   `E:<table>-><entity>` is replaced by a reference to the node of the
+    entity for the same row.
+-   Constant values are copied as is.
+
+Nodes are named `<table>_<entity>_R<row>`, with rows numbered from 1, and
+referenced as `l:<table>_<entity>_R<row>`. Properties whose column is empty
+in a row are dropped, as are StatVarObservations left without a value and
+the properties referencing dropped nodes.
+
+Column values that already have a namespace prefix are written as is, as
+are numbers for the properties in NUMERIC_PROPERTIES, such as `value`. Other
+values are written as references (`dcid:<value>`) for the properties in
+REFERENCE_PROPERTIES, and quoted otherwise, even if they look like numbers,
+e.g. codes with leading zeros such as `"001001"` or years such as `"2020"`.
+
+The TMCF is compiled once. Rows are expanded in batches, in parallel across
+processes, and written in order to files sharded by ShardingWriter.
+
+This is meant for previewing and benchmarking imports locally. It does not
+validate the output against the schema.
+
+Usage:
+
+    python3 -m util.tmcf_expander \\
+        --tmcf=scripts/us_bls/jolts/BLSJolts.tmcf \\
+        --csv=scripts/us_bls/jolts/BLSJolts.csv \\
+        --output=/tmp/BLSJolts
+"""
+
+import collections
+import csv
+import functools
+import itertools
+import multiprocessing
+import re
+
+from absl import app
+from absl import flags
+
+from util import sharding_writer
+
+FLAGS = flags.FLAGS
+
+# Properties whose values are references to other nodes.
+REFERENCE_PROPERTIES = frozenset([
+    'typeOf', 'variableMeasured', 'observationAbout', 'measurementMethod',
+    'unit', 'containedInPlace', 'populationType', 'measuredProperty', 'statType'
+])
+# Properties whose values are numbers, written unquoted when they parse as
+# one.
+NUMERIC_PROPERTIES = frozenset(
+    ['value', 'scalingFactor', 'marginOfError', 'stdError', 'sampleSize'])
+
+# A property of a compiled node. kind is one of _CONSTANT, _COLUMN and
+# _ENTITY, and value respectively the formatted line, the index of the
+# column and the index of the referenced node.
+Property = collections.namedtuple('Property', ['name', 'kind', 'value'])
+
+_CONSTANT = 0
+_COLUMN = 1
+_ENTITY = 2
+
+_REFERENCE_RE = re.compile(r'^([CE]):([^\s]+?)->(.+)$')
+_PREFIX_RE = re.compile(r'^[A-Za-z]+:')
+
+
+def _is_number(value):
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
+
+
+@functools.lru_cache(maxsize=65536)
+def format_value(prop, value):
+    """Returns the MCF representation of a column value of a property.
+
+    Cached, as most columns other than values repeat a few values.
+    """
+    if _PREFIX_RE.match(value):
+        return value
+    if prop in REFERENCE_PROPERTIES:
+        return 'dcid:' + value
+    if prop in NUMERIC_PROPERTIES and _is_number(value):
+        return value
+    return '"%s"' % value.replace('"', '\\"')
+
+
+class Template(object):
+    """A TMCF compiled against the header of its CSV.
+
+    Attributes:
+        table: Name of the table the TMCF refers to.
+        entities: Names of the entities, in the order of the TMCF.
+    """
+
+    def __init__(self, tmcf, header):
+        """Compiles the TMCF.
+
+        Args:
+            tmcf: Content of the TMCF as a string.
+            header: List of the column names of the CSV.
+
+        Raises:
+            ValueError: The TMCF is malformed, refers to more than one table,
+                or to a column or entity that does not exist.
+        """
+        self.table = None
+        self.entities = []
+        nodes = []
+        for block in re.split(r'\n\s*\n', tmcf.strip()):
+            lines = [line.strip() for line in block.split('\n')]
+            lines = [line for line in lines if line and line[0] != '#']
+            if not lines:
+                continue
+            name, value = self._split(lines[0])
+            if name != 'Node':
+                raise ValueError('Node does not start with Node: %s' % block)
+            self.entities.append(self._parse_reference(value, 'E'))
+            nodes.append([self._split(line) for line in lines[1:]])
+
+        columns = {column: index for index, column in enumerate(header)}
+        entities = {entity: index for index, entity in enumerate(self.entities)}
+        node_properties = []
+        for lines in nodes:
+            properties = []
+            for name, value in lines:
+                match = _REFERENCE_RE.match(value)
+                if not match:
+                    properties.append(
+                        Property(name, _CONSTANT, '%s: %s\n' % (name, value)))
+                elif match.group(1) == 'C':
+                    column = self._parse_reference(value, 'C')
+                    if column not in columns:
+                        raise ValueError('Column %s not in the CSV header.' %
+                                         column)
+                    properties.append(Property(name, _COLUMN, columns[column]))
+                else:
+                    entity = self._parse_reference(value, 'E')
+                    if entity not in entities:
+                        raise ValueError('Entity %s not in the TMCF.' % entity)
+                    properties.append(Property(name, _ENTITY, entities[entity]))
+            node_properties.append(properties)
+
+        # Each node is compiled into the column it cannot be written
+        # without, or None, and a list of operations. Consecutive constant
+        # lines are merged into a single operation.
+        self._compiled = []
+        for properties in node_properties:
+            required = None
+            if any(prop.kind == _CONSTANT and prop.name == 'typeOf' and
+                   prop.value.rstrip().endswith('StatVarObservation')
+                   for prop in properties):
+                values = [prop for prop in properties if prop.name == 'value']
+                if values and values[0].kind == _COLUMN:
+                    required = values[0].value
+            operations = []
+            for prop in properties:
+                if prop.kind == _CONSTANT:
+                    if operations and operations[-1][0] == _CONSTANT:
+                        operations[-1] = (_CONSTANT,
+                                          operations[-1][1] + prop.value, None)
+                    else:
+                        operations.append((_CONSTANT, prop.value, None))
+                elif prop.kind == _COLUMN:
+                    operations.append((_COLUMN, prop.name, prop.value))
+                else:
+                    operations.append(
+                        (_ENTITY, '%s: l:%s_%s_R' %
+                         (prop.name, self.table, self.entities[prop.value]),
+                         prop.value))
+            self._compiled.append((required, operations))
+        self._num_columns = len(header)
+
+    @staticmethod
+    def _split(line):
+        """Splits a line of the TMCF into a property and a value."""
+        name, sep, value = line.partition(':')
+        if not sep:
+            raise ValueError('Line is not <property>: <value>: %s' % line)
+        return name.strip(), value.strip()
+
+    def _parse_reference(self, value, kind):
+        """Returns the column or entity of a C: or E: reference."""
+        match = _REFERENCE_RE.match(value)
+        if not match or match.group(1) != kind:
+            raise ValueError('Expected %s:<table>-><name>, got %s' %
+                             (kind, value))
+        if self.table is None:
+            self.table = match.group(2)
+        elif match.group(2) != self.table:
+            raise ValueError('TMCF refers to tables %s and %s.' %
+                             (self.table, match.group(2)))
+        return match.group(3).strip()
+
+    def expand(self, rows, first_row=1):
+        """Returns the instance MCF of rows as a string.
+
+        Args:
+            rows: List of rows, each a list of column values.
+            first_row: Number of the first row, used in the node names.
+        """
+        out = []
+        append = out.append
+        names = [
+            'Node: %s_%s_R' % (self.table, entity) for entity in self.entities
+        ]
+        compiled = self._compiled
+        padding = [''] * self._num_columns
+        for row_number, row in enumerate(rows, start=first_row):
+            suffix = str(row_number)
+            if len(row) < self._num_columns:
+                row = row + padding[len(row):]
+            kept = [
+                required is None or row[required] != ''
+                for required, _ in compiled
+            ]
+            for index, (_, operations) in enumerate(compiled):
+                if not kept[index]:
+                    continue
+                append(names[index] + suffix + '\n')
+                for kind, text, arg in operations:
+                    if kind == _CONSTANT:
+                        append(text)
+                    elif kind == _COLUMN:
+                        value = row[arg]
+                        if value:
+                            append(text + ': ' + format_value(text, value) +
+                                   '\n')
+                    elif kept[arg]:
+                        append(text + suffix + '\n')
+                append('\n')
+        return ''.join(out)
+
+
+# Template of the worker processes, set by _init_worker.
+_WORKER_TEMPLATE = None
+
+
+def _init_worker(tmcf, header):
+    global _WORKER_TEMPLATE
+    _WORKER_TEMPLATE = Template(tmcf, header)
+
+
+def _expand_batch(batch):
+    first_row, rows = batch
+    return len(rows), _WORKER_TEMPLATE.expand(rows, first_row)
+
+
+def _batches(reader, batch_size):
+    """Yields tuples of the number of the first row and the rows of each
+    batch of rows from reader."""
+    first_row = 1
+    while True:
+        rows = list(itertools.islice(reader, batch_size))
+        if not rows:
+            return
+        yield first_row, rows
+        first_row += len(rows)
+
+
+def expand_file(tmcf_path,
+                csv_path,
+                output_base,
+                batch_size=10000,
+                processes=None,
+                shard_size=104857600):
+    """Expands a TMCF and its CSV into sharded instance MCF files.
+
+    Args:
+        tmcf_path: Path of the TMCF.
+        csv_path: Path of the CSV.
+        output_base: Base path of the output, see ShardingWriter.
+        batch_size: Number of rows expanded at a time by a process.
+        processes: Number of processes. Defaults to the number of CPUs.
+            1 expands in the current process.
+        shard_size: Size in bytes above which output shards roll over.
+
+    Returns:
+        Number of rows expanded.
+    """
+    with open(tmcf_path) as tmcf_file:
+        tmcf = tmcf_file.read()
+    writer = sharding_writer.ShardingWriter(output_base, shard_size=shard_size)
+    num_rows = 0
+    try:
+        with open(csv_path, newline='', encoding='utf-8-sig') as csv_file:
+            reader = csv.reader(csv_file)
+            header = next(reader, [])
+            batches = _batches(reader, batch_size)
+            if processes == 1:
+                template = Template(tmcf, header)
+                for first_row, rows in batches:
+                    writer.Write(template.expand(rows, first_row))
+                    num_rows += len(rows)
+            else:
+                # Validate the TMCF before starting the workers.
+                Template(tmcf, header)
+                with multiprocessing.Pool(processes, _init_worker,
+                                          (tmcf, header)) as pool:
+                    # imap keeps the output in the order of the rows.
+                    for batch_rows, mcf in pool.imap(_expand_batch, batches):
+                        writer.Write(mcf)
+                        num_rows += batch_rows
+    finally:
+        # Flushes and closes the shards written so far, even on failure.
+        writer.Close()
+    return num_rows
+
+
+def main(argv):
+    del argv  # unused
+    num_rows = expand_file(FLAGS.tmcf, FLAGS.csv, FLAGS.output,
+                           FLAGS.batch_size, FLAGS.processes, FLAGS.shard_size)
+    print('Expanded %d rows.' % num_rows)
+
+
+def _define_flags():
+    # Defined here rather than at import, so that the module can be imported
+    # along with other modules defining the same flags, e.g. in tests.
+    flags.DEFINE_string('tmcf', None, 'Path of the TMCF.')
+    flags.DEFINE_string('csv', None, 'Path of the CSV.')
+    flags.DEFINE_string(
+        'output', None,
+        'Base path of the output, written to <output>_<shard>.mcf.')
+    flags.DEFINE_integer('batch_size', 10000, 'Number of rows per batch.')
+    flags.DEFINE_integer(
+        'processes', None,
+        'Number of processes. Defaults to the number of CPUs.')
+    flags.DEFINE_integer('shard_size', 104857600,
+                         'Size in bytes above which output shards roll over.')
+    flags.mark_flags_as_required(['tmcf', 'csv', 'output'])
+
+
+if __name__ == '__main__':
+    _define_flags()
+    app.run(main)
@@ -0,0 +1,160 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for util.tmcf_expander."""
+
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+
+from __future__ import absolute_import
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from util import tmcf_expander
+
+TMCF = """Node: E:Jolts->E0
+typeOf: Country
+dcid: C:Jolts->Geo
+
+Node: E:Jolts->E1
+typeOf: dcs:StatVarObservation
+variableMeasured: C:Jolts->StatVar
+observationDate: C:Jolts->Date
+observationAbout: E:Jolts->E0
+value: C:Jolts->Value
+"""
+
+HEADER = ['Geo', 'StatVar', 'Date', 'Value']
+
+EXPECTED_ROW_1 = """Node: Jolts_E0_R1
+typeOf: Country
+dcid: "country/USA"
+
+Node: Jolts_E1_R1
+typeOf: dcs:StatVarObservation
+variableMeasured: dcid:Count_JobOpening
+observationDate: "2020-01"
+observationAbout: l:Jolts_E0_R1
+value: 12
+
+"""
+
+
+class TemplateTest(unittest.TestCase):
+
+    def test_expand(self):
+        template = tmcf_expander.Template(TMCF, HEADER)
+        self.assertEqual('Jolts', template.table)
+        self.assertEqual(['E0', 'E1'], template.entities)
+        self.assertEqual(
+            EXPECTED_ROW_1,
+            template.expand(
+                [['country/USA', 'Count_JobOpening', '2020-01', '12']]))
+
+    def test_empty_values_dropped(self):
+        template = tmcf_expander.Template(TMCF, HEADER)
+        # The observation has no value, so only the country is written.
+        self.assertEqual(
+            'Node: Jolts_E0_R7\ntypeOf: Country\ndcid: "country/USA"\n\n',
+            template.expand([['country/USA', 'Count_JobOpening', '', '']],
+                            first_row=7))
+        # The country has no dcid, and is still referenced.
+        self.assertIn('observationAbout: l:Jolts_E0_R1\n',
+                      template.expand([['', 'Count_JobOpening', '', '1']]))
+
+    def test_format_value(self):
+        self.assertEqual('1.5', tmcf_expander.format_value('value', '1.5'))
+        self.assertEqual(
+            'dcs:Foo', tmcf_expander.format_value('variableMeasured',
+                                                  'dcs:Foo'))
+        self.assertEqual(
+            'dcid:geoId/06',
+            tmcf_expander.format_value('observationAbout', 'geoId/06'))
+        self.assertEqual('"Roma"', tmcf_expander.format_value('name', 'Roma'))
+        # Strings that look like numbers keep their leading zeros.
+        self.assertEqual('"001001"',
+                         tmcf_expander.format_value('istatId', '001001'))
+        self.assertEqual('"2020"',
+                         tmcf_expander.format_value('observationDate', '2020'))
+        self.assertEqual('"1.5"', tmcf_expander.format_value('name', '1.5'))
+
+    def test_invalid_template(self):
+        with self.assertRaises(ValueError):
+            tmcf_expander.Template(TMCF, ['Geo', 'StatVar', 'Date'])
+        with self.assertRaises(ValueError):
+            tmcf_expander.Template(
+                TMCF.replace('About: E:Jolts->E0', 'About: E:Jolts->E2'),
+                HEADER)
+        with self.assertRaises(ValueError):
+            tmcf_expander.Template(TMCF + 'name: C:Other->Geo\n', HEADER)
+
+
+class ExpandFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.tmcf_path = os.path.join(self._tmp_dir.name, 'Jolts.tmcf')
+        with open(self.tmcf_path, 'w') as tmcf_file:
+            tmcf_file.write(TMCF)
+        self.csv_path = os.path.join(self._tmp_dir.name, 'Jolts.csv')
+        with open(self.csv_path, 'w') as csv_file:
+            csv_file.write(','.join(HEADER) + '\n')
+            for month in range(1, 13):
+                csv_file.write('country/USA,Count_JobOpening,2020-%02d,%d\n' %
+                               (month, month))
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def _expand(self, processes):
+        output = os.path.join(self._tmp_dir.name, 'out%d' % processes)
+        self.assertEqual(
+            12,
+            tmcf_expander.expand_file(self.tmcf_path,
+                                      self.csv_path,
+                                      output,
+                                      batch_size=5,
+                                      processes=processes))
+        with open(output + '_0.mcf') as mcf_file:
+            return mcf_file.read()
+
+    def test_parallel_matches_serial(self):
+        serial = self._expand(1)
+        self.assertTrue(
+            serial.startswith(EXPECTED_ROW_1.replace('value: 12', 'value: 1')))
+        self.assertEqual(24, serial.count('Node: '))
+        self.assertEqual(serial, self._expand(2))
+
+    def test_failure_closes_shards(self):
+        output = os.path.join(self._tmp_dir.name, 'out')
+        writer_class = tmcf_expander.sharding_writer.ShardingWriter
+        with mock.patch.object(tmcf_expander.Template, 'expand',
+                               side_effect=[EXPECTED_ROW_1, ValueError]), \
+                mock.patch.object(writer_class, 'Close', autospec=True,
+                                  side_effect=writer_class.Close) as close:
+            with self.assertRaises(ValueError):
+                tmcf_expander.expand_file(self.tmcf_path,
+                                          self.csv_path,
+                                          output,
+                                          batch_size=5,
+                                          processes=1)
+        close.assert_called_once()
+        with open(output + '_0.mcf') as mcf_file:
+            self.assertEqual(EXPECTED_ROW_1, mcf_file.read())
+
+
+if __name__ == '__main__':
+    unittest.main()